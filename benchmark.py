@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""离线压测脚本：使用模拟模型测量吞吐、延迟分位数、CPU时间和峰值内存"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from src.testing.benchmark import (
+    TARGETS, BenchmarkResult, configure_mock_model, generate_corpus, run_benchmarks, write_report
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline benchmark using the mock LLM provider")
+    parser.add_argument("--targets", default=",".join(TARGETS),
+                        help=f"comma separated targets: {', '.join(TARGETS)}")
+    parser.add_argument("--model", default="mock", help="name of the mock model config (default: mock)")
+    parser.add_argument("--images", type=int, default=200, help="number of generated images")
+    parser.add_argument("--size", default="1024x768", help="generated image size, WIDTHxHEIGHT")
+    parser.add_argument("--corpus", help="existing image directory instead of a generated corpus")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the generated corpus and the mock provider")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent requests / workers")
+    parser.add_argument("--batch-size", type=int, default=8, help="images per /classify_batch request")
+    parser.add_argument("--base-url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--cache", action="store_true", help="keep the result cache and dedup enabled")
+    # 模拟厂商的行为，未指定时使用 config.yaml 中的配置
+    parser.add_argument("--latency", type=float, help="mock median latency in seconds")
+    parser.add_argument("--latency-distribution", choices=["constant", "uniform", "exponential", "lognormal"])
+    parser.add_argument("--latency-sigma", type=float, help="mock lognormal shape parameter")
+    parser.add_argument("--error-rate", type=float, help="mock random failure probability")
+    parser.add_argument("--requests-per-minute", type=int, help="mock provider-side rate limit")
+    parser.add_argument("--capacity", type=int, help="mock provider-side concurrency capacity")
+    parser.add_argument("--json", help="write results to this JSON file")
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+    targets = [target.strip() for target in args.targets.split(",") if target.strip()]
+    unknown = [target for target in targets if target not in TARGETS]
+    if unknown:
+        print(f"❌ 未知的压测目标: {', '.join(unknown)}")
+        sys.exit(1)
+
+    mock_options = {
+        name: value
+        for name, value in {
+            "latency": args.latency,
+            "latency_distribution": args.latency_distribution,
+            "latency_sigma": args.latency_sigma,
+            "error_rate": args.error_rate,
+            "requests_per_minute": args.requests_per_minute,
+            "capacity": args.capacity,
+        }.items()
+        if value is not None
+    }
+    if args.base_url is None:
+        configure_mock_model(args.model, seed=args.seed, **mock_options)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus = args.corpus
+        if corpus is None:
+            width, height = (int(value) for value in args.size.lower().split("x"))
+            print(f"🖼️  生成 {args.images} 张 {width}x{height} 测试图片...")
+            generate_corpus(temp_dir, args.images, (width, height), args.seed)
+            corpus = temp_dir
+
+        results = await run_benchmarks(
+            corpus,
+            model_type=args.model,
+            targets=targets,
+            concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            base_url=args.base_url,
+            use_cache=args.cache
+        )
+
+    print(BenchmarkResult.header())
+    for result in results:
+        print(result.format())
+    if args.json:
+        write_report(results, args.json)
+        print(f"📝 结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
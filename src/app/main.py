@@ -1,34 +1,116 @@
 """FastAPI主应用"""
 
-import os
-import uuid
-from pathlib import Path
-from typing import List, Dict, Any, Optional
+import asyncio
+import hmac
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from ..services import ImageClassifier
+from ..services import (
+    ImageClassifier, classifier_registry, close_result_cache, get_job_manager, get_result_cache, shutdown_job_manager
+)
 from ..models import ModelFactory
 from ..utils.config import config_manager
+from ..utils.executor import get_cpu_executor, shutdown_cpu_executor
+from ..utils.http_client import close_http_clients
+from ..utils.metrics import HTTP_IN_FLIGHT, HTTP_REQUEST_SECONDS, STAGE_SECONDS, registry
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时预热分类器和执行池，关闭时释放资源"""
+    get_cpu_executor()
+    for model_type, status in classifier_registry.warm_up().items():
+        logger.info("Model %s warm-up: %s", model_type, status)
+    await get_job_manager().start()
+
+    yield
+
+    await shutdown_job_manager()
+    classifier_registry.clear()
+    # 模型实例持有共享的连接池，关闭连接池前一并丢弃
+    ModelFactory.clear()
+    await close_http_clients()
+    shutdown_cpu_executor()
+    close_result_cache()
+
 
 # 创建FastAPI应用
 app = FastAPI(
     title="Image Classifier",
     description="A PoC for image content classification using multimodal LLMs",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # 静态文件和模板
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# 确保上传目录存在
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+# 上传文件分块读取的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+_UPLOAD_READ_STAGE = STAGE_SECONDS.labels("upload_read")
+
+
+class RequestMetricsMiddleware:
+    """
+    记录HTTP请求延迟和在途请求数，route 标签使用路由模板以避免标签基数膨胀
+
+    纯ASGI中间件：只包装 send，在最后一个响应体（more_body 为False）发出时记录耗时，
+    流式响应按实际发送完成计时，也不会像 BaseHTTPMiddleware 那样额外经过一层响应流转发。
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        status = 500
+        recorded = False
+
+        def record() -> None:
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            HTTP_IN_FLIGHT.dec()
+            path = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], path, str(status)).observe(time.perf_counter() - started)
+
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            # 响应发出之前异常或客户端断开时也要释放在途计数
+            record()
+
+
+app.add_middleware(RequestMetricsMiddleware)
+
 
 # 分类结果数据模型
 class ClassificationResultResponse(BaseModel):
@@ -38,6 +120,34 @@ class ClassificationResultResponse(BaseModel):
     confidence: float
     reasoning: str
     model_used: str
+    status: str = "ok"  # ok / transient_error / error
+    error_type: Optional[str] = None
+
+
+async def _read_upload(file: UploadFile) -> Optional[memoryview]:
+    """
+    分块读取上传文件到单个缓冲区
+
+    已知大小超限的文件不读取任何数据；大小未知时边读边检查，超限立即停止。
+    返回缓冲区的 memoryview，后续校验、哈希和编码都直接使用它而不再复制。
+
+    Returns:
+        Optional[memoryview]: 文件数据，超过大小限制时返回None
+    """
+    max_size = ImageClassifier.get_max_file_size() * 1024 * 1024
+    if file.size is not None and file.size > max_size:
+        return None
+
+    buffer = bytearray()
+    with _UPLOAD_READ_STAGE.time():
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if len(buffer) + len(chunk) > max_size:
+                return None
+            buffer += chunk
+    return memoryview(buffer)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -68,47 +178,32 @@ async def classify_image(
                 detail=f"Unsupported file format. Supported formats: {ImageClassifier.get_supported_formats()}"
             )
 
-        # 读取文件数据
-        file_data = await file.read()
-
-        # 验证文件大小
-        if not ImageClassifier.is_file_size_valid(len(file_data)):
+        # 分块读取文件数据，超过大小限制时立即拒绝
+        file_data = await _read_upload(file)
+        if file_data is None:
             raise HTTPException(
                 status_code=400,
                 detail=f"File too large. Maximum size: {ImageClassifier.get_max_file_size()}MB"
             )
 
-        # 保存文件到临时位置
-        file_id = str(uuid.uuid4())
-        file_extension = Path(file.filename).suffix
-        temp_filename = f"{file_id}{file_extension}"
-        temp_filepath = UPLOAD_DIR / temp_filename
-
-        with open(temp_filepath, "wb") as f:
-            f.write(file_data)
-
-        try:
-            # 创建分类器
-            classifier = ImageClassifier(model)
+        # 获取缓存的分类器
+        classifier = classifier_registry.get(model)
 
-            # 分类图片
-            result = await classifier.classify_image_data(file_data)
-
-            # 构建响应
-            response = ClassificationResultResponse(
-                filename=file.filename,
-                category=result.category,
-                confidence=result.confidence,
-                reasoning=result.reasoning,
-                model_used=classifier.model_type
-            )
+        # 分类图片
+        result = await classifier.classify_image_data(file_data)
 
-            return response
+        # 构建响应
+        response = ClassificationResultResponse(
+            filename=file.filename,
+            category=result.category,
+            confidence=result.confidence,
+            reasoning=result.reasoning,
+            model_used=classifier.model_type,
+            status=result.status,
+            error_type=result.error_type
+        )
 
-        finally:
-            # 清理临时文件
-            if temp_filepath.exists():
-                temp_filepath.unlink()
+        return response
 
     except HTTPException:
         raise
@@ -116,65 +211,190 @@ async def classify_image(
         raise HTTPException(status_code=500, detail=f"Classification failed: {str(e)}")
 
 
-@app.post("/classify_batch")
-async def classify_multiple_images(
-    request: Request,
-    files: List[UploadFile] = File(...),
-    model: Optional[str] = Form(None)
-):
+async def _classify_uploads(files: List[UploadFile], model: Optional[str]) -> List[Dict[str, Any]]:
     """
-    批量分类上传的图片
+    分类一组上传文件（一次模型请求），返回结果或包含 error 字段的错误信息
     """
-    results = []
-    errors = []
-
-    for file in files:
-        try:
+    outcomes: List[Optional[Dict[str, Any]]] = [None] * len(files)
+    images = []
+    try:
+        for index, file in enumerate(files):
             # 验证文件
             if not ImageClassifier.is_supported_format(file.filename):
-                errors.append({
+                outcomes[index] = {
                     "filename": file.filename,
-                    "error": f"Unsupported file format"
-                })
+                    "error": "Unsupported file format"
+                }
                 continue
 
-            # 读取文件数据
-            file_data = await file.read()
-
-            # 验证文件大小
-            if not ImageClassifier.is_file_size_valid(len(file_data)):
-                errors.append({
+            # 分块读取文件数据，超过大小限制时立即拒绝
+            file_data = await _read_upload(file)
+            if file_data is None:
+                outcomes[index] = {
                     "filename": file.filename,
-                    "error": f"File too large"
-                })
+                    "error": "File too large"
+                }
                 continue
+            images.append((index, file_data))
 
-            # 创建分类器
-            classifier = ImageClassifier(model)
+        if images:
+            # 获取缓存的分类器
+            classifier = classifier_registry.get(model)
 
             # 分类图片
-            result = await classifier.classify_image_data(file_data)
-
-            results.append({
-                "filename": file.filename,
-                "category": result.category,
-                "confidence": result.confidence,
-                "reasoning": result.reasoning,
-                "model_used": classifier.model_type
-            })
-
-        except Exception as e:
-            errors.append({
-                "filename": file.filename,
-                "error": str(e)
-            })
+            results = await classifier.classify_images_data([file_data for _, file_data in images])
+
+            for (index, _), result in zip(images, results):
+                outcomes[index] = {
+                    "filename": files[index].filename,
+                    "category": result.category,
+                    "confidence": result.confidence,
+                    "reasoning": result.reasoning,
+                    "model_used": classifier.model_type,
+                    "status": result.status,
+                    "error_type": result.error_type
+                }
+
+    except Exception as e:
+        for index, file in enumerate(files):
+            if outcomes[index] is None:
+                outcomes[index] = {
+                    "filename": file.filename,
+                    "error": str(e)
+                }
+
+    return outcomes
+
+
+async def _iter_batch_results(
+    files: List[UploadFile],
+    model: Optional[str]
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    并发分类上传的文件，按完成顺序产出 (文件下标, 结果)
+
+    每 app.provider_batch_size 个文件打包为一次模型请求。
+    """
+    try:
+        # 启用自适应并发时由模型调用处的限制器动态控制实际并发
+        concurrency = classifier_registry.get(model).get_concurrency_limit()
+    except Exception:
+        # 模型配置错误时由 _classify_uploads 为每个文件返回错误
+        concurrency = config_manager.get_concurrency_limit(model or config_manager.get_app_config().default_model)
+    semaphore = asyncio.Semaphore(concurrency)
+    batch_size = max(1, config_manager.get_app_config().provider_batch_size)
+
+    async def classify(start: int) -> List[Tuple[int, Dict[str, Any]]]:
+        async with semaphore:
+            outcomes = await _classify_uploads(files[start:start + batch_size], model)
+        return list(enumerate(outcomes, start=start))
+
+    tasks = [asyncio.create_task(classify(start)) for start in range(0, len(files), batch_size)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for item in await next_done:
+                yield item
+    finally:
+        # 客户端断开时取消尚未完成的分类，并等待取消完成，避免遗留未回收的任务
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@app.post("/classify_batch")
+async def classify_multiple_images(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    model: Optional[str] = Form(None)
+):
+    """
+    批量分类上传的图片（并发执行，全部完成后返回）
+    """
+    outcomes: List[Optional[Dict[str, Any]]] = [None] * len(files)
+    async for index, outcome in _iter_batch_results(files, model):
+        outcomes[index] = outcome
 
     return JSONResponse({
-        "results": results,
-        "errors": errors
+        "results": [outcome for outcome in outcomes if "error" not in outcome],
+        "errors": [outcome for outcome in outcomes if "error" in outcome]
     })
 
 
+@app.post("/classify_batch/stream")
+async def classify_multiple_images_stream(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    model: Optional[str] = Form(None),
+    format: str = Form("ndjson")
+):
+    """
+    批量分类上传的图片，每完成一张立即推送结果
+
+    format 为 ndjson 时每行一个JSON对象，为 sse 时使用 Server-Sent Events。
+    每条消息包含 type（result / error）、index（上传顺序）和分类结果，最后推送一条 type=done 的消息。
+    """
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="Unsupported stream format. Use 'ndjson' or 'sse'")
+
+    def encode(message: Dict[str, Any]) -> str:
+        data = json.dumps(message, ensure_ascii=False)
+        if format == "sse":
+            return f"event: {message['type']}\ndata: {data}\n\n"
+        return data + "\n"
+
+    async def stream() -> AsyncIterator[str]:
+        completed = 0
+        async for index, outcome in _iter_batch_results(files, model):
+            completed += 1
+            message_type = "error" if "error" in outcome else "result"
+            yield encode({"type": message_type, "index": index, **outcome})
+        yield encode({"type": "done", "total": len(files), "completed": completed})
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    directory: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    model: Optional[str] = Form(None)
+):
+    """
+    提交后台分类任务（服务器目录或上传的zip压缩包），立即返回任务ID
+    """
+    if (directory is None) == (file is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of 'directory' or 'file'")
+
+    try:
+        if directory is not None:
+            job_id = await get_job_manager().submit_directory(directory, model)
+        else:
+            job_id = await get_job_manager().submit_archive(file.file, model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, offset: int = 0, limit: int = 100):
+    """获取任务进度和已完成的部分结果（分页）"""
+    job = await asyncio.to_thread(get_job_manager().get, job_id, offset, min(limit, 1000))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """取消任务，已结束的任务保持原状态"""
+    status = await get_job_manager().cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id, "status": status}
+
+
 @app.get("/categories")
 async def get_categories():
     """获取所有可用的图片分类"""
@@ -199,6 +419,68 @@ async def get_available_models():
     }
 
 
+# 未配置 app.admin_token 时管理接口只接受这些来源
+_LOOPBACK_HOSTS = frozenset(["127.0.0.1", "::1", "localhost"])
+
+
+def _require_admin(request: Request) -> None:
+    """校验管理接口的访问权限：配置了 app.admin_token 时校验 Bearer 令牌，否则只允许本机请求"""
+    admin_token = config_manager.get_app_config().admin_token
+    if admin_token:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode("utf-8"), admin_token.encode("utf-8")):
+            raise HTTPException(status_code=401, detail="Invalid admin token")
+    elif request.client is None or request.client.host not in _LOOPBACK_HOSTS:
+        raise HTTPException(status_code=403, detail="Admin endpoints are only available from localhost")
+
+
+@app.post("/config/reload")
+async def reload_config(request: Request):
+    """重新加载配置文件，已缓存的分类器会在下次请求时按新配置重建；需要管理权限"""
+    _require_admin(request)
+    try:
+        config_manager.reload()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Config reload failed: {str(e)}")
+    return {"status": "reloaded", "version": config_manager.version}
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """获取结果缓存的命中统计"""
+    cache = get_result_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.get("/local_classifier/stats")
+async def get_local_classifier_stats(model: Optional[str] = None):
+    """获取模型当前分类配置下本地预分类器的样本数、验证精确率和是否启用短路"""
+    try:
+        classifier = classifier_registry.get(model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # 分类配置重新加载后切换到新命名空间的预分类器
+    classifier.get_categories()
+    local_classifier = classifier.local_classifier
+    if local_classifier is None:
+        return {"enabled": False}
+    return {"enabled": True, **local_classifier.stats()}
+
+
+@app.get("/concurrency/stats")
+async def get_concurrency_stats():
+    """获取各模型自适应并发的当前上限和变化记录"""
+    return {"models": ModelFactory.get_concurrency_stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus格式的指标：各阶段耗时、HTTP延迟、厂商请求、缓存命中和并发上限"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 async def health_check():
     """健康检查"""
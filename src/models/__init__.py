@@ -1,16 +1,39 @@
 """模型模块"""
 
-from .llm_base import BaseLLMModel, ClassificationResult
+from .llm_base import BaseLLMModel, ClassificationModel, ClassificationResult, STATUS_OK, STATUS_TRANSIENT_ERROR, STATUS_ERROR
 from .openai_model import OpenAIModel
 from .anthropic_model import AnthropicModel
 from .google_model import GoogleModel
+from .router_model import RouterModel
+from .mock_model import MockModel, MockProviderError
 from .model_factory import ModelFactory
+from .adaptive_limiter import AdaptiveLimiter
+from .rate_limiter import RateLimiter, TokenBucket
+from .prompts import Categories
+from .response_parser import CategoryMatcher, get_category_matcher, parse_classification
+from .retry import RetryPolicy, classify_error
 
 __all__ = [
     "BaseLLMModel",
+    "ClassificationModel",
     "ClassificationResult",
+    "STATUS_OK",
+    "STATUS_TRANSIENT_ERROR",
+    "STATUS_ERROR",
     "OpenAIModel",
     "AnthropicModel",
     "GoogleModel",
-    "ModelFactory"
+    "RouterModel",
+    "MockModel",
+    "MockProviderError",
+    "ModelFactory",
+    "AdaptiveLimiter",
+    "RateLimiter",
+    "TokenBucket",
+    "Categories",
+    "CategoryMatcher",
+    "get_category_matcher",
+    "parse_classification",
+    "RetryPolicy",
+    "classify_error"
 ]
\ No newline at end of file
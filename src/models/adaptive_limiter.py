@@ -0,0 +1,139 @@
+"""根据厂商延迟和错误自适应调整并发数（AIMD）"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from .retry import RATE_LIMIT, SERVER_ERROR, TIMEOUT, classify_error
+
+# 视为过载信号的错误类型
+OVERLOAD_ERRORS = (RATE_LIMIT, TIMEOUT, SERVER_ERROR)
+
+# 延迟的指数加权系数：短期反映当前负载，长期作为基线
+SHORT_LATENCY_ALPHA = 0.2
+LONG_LATENCY_ALPHA = 0.02
+# 延迟上升时的缩减比例（比限流错误温和）
+LATENCY_BACKOFF_RATIO = 0.9
+# 保留的并发上限变化记录数
+HISTORY_SIZE = 500
+
+
+class AdaptiveLimiter:
+    """
+    自适应并发限制器
+
+    固定的并发数总是不合适：夜间太低浪费吞吐，高峰太高引发429风暴。
+    这里采用AIMD：请求占满当前上限且延迟平稳时，每轮（约 limit 个成功请求）上限加1；
+    遇到限流、超时或5xx时按 backoff_ratio 成倍缩减；短期延迟超过长期基线的 latency_tolerance 倍时小幅缩减。
+    每次缩减后冷却一个往返时间，避免同一批失败把上限连续砍到底。
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff_ratio: float = 0.5,
+        latency_tolerance: float = 2.0
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial_limit)))
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+
+        self.in_flight = 0
+        self.short_latency: Optional[float] = None
+        self.long_latency: Optional[float] = None
+        self.history: deque = deque([(time.time(), int(self.limit))], maxlen=HISTORY_SIZE)
+        self.overloads = 0
+
+        self._cooldown_until = 0.0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[None]:
+        """
+        占用一个并发名额执行一次模型请求，根据耗时和异常调整上限
+
+            async with self.concurrency_limiter.acquire():
+                response = await client.create(...)
+        """
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            utilized = self.in_flight >= int(self.limit)
+
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if classify_error(e).kind in OVERLOAD_ERRORS:
+                self._on_overload()
+            raise
+        else:
+            self._on_success(time.monotonic() - started, utilized)
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def _on_success(self, latency: float, utilized: bool) -> None:
+        if self.short_latency is None:
+            self.short_latency = self.long_latency = latency
+        else:
+            self.short_latency += SHORT_LATENCY_ALPHA * (latency - self.short_latency)
+            self.long_latency += LONG_LATENCY_ALPHA * (latency - self.long_latency)
+
+        if self.short_latency > self.long_latency * self.latency_tolerance:
+            # 延迟明显上升，说明厂商开始排队
+            self._decrease(LATENCY_BACKOFF_RATIO)
+        elif utilized:
+            # 只有占满上限时才说明上限是瓶颈，空闲时不增长
+            self._set_limit(self.limit + 1.0 / self.limit)
+
+    def _on_overload(self) -> None:
+        self.overloads += 1
+        self._decrease(self.backoff_ratio)
+
+    def _decrease(self, ratio: float) -> None:
+        now = time.monotonic()
+        if now < self._cooldown_until:
+            return
+        self._set_limit(self.limit * ratio)
+        self._cooldown_until = now + (self.short_latency or 1.0)
+
+    def _set_limit(self, limit: float) -> None:
+        previous = int(self.limit)
+        self.limit = min(float(self.max_limit), max(float(self.min_limit), limit))
+        # 上限只在请求结束时提高，acquire 随后在锁内 notify_all 唤醒等待者，这里不需要另外通知
+        if int(self.limit) != previous:
+            self.history.append((time.time(), int(self.limit)))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前上限、在途请求数、延迟和上限变化记录"""
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "short_latency": self.short_latency,
+            "long_latency": self.long_latency,
+            "overloads": self.overloads,
+            "history": [{"time": timestamp, "limit": limit} for timestamp, limit in self.history],
+        }
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> Optional["AdaptiveLimiter"]:
+        """根据模型配置中的 adaptive_concurrency 创建限制器，未启用时返回None"""
+        if not config or not config.get("enabled"):
+            return None
+        return cls(
+            initial_limit=config.get("initial_limit", 4),
+            min_limit=config.get("min_limit", 1),
+            max_limit=config.get("max_limit", 64),
+            backoff_ratio=config.get("backoff_ratio", 0.5),
+            latency_tolerance=config.get("latency_tolerance", 2.0)
+        )
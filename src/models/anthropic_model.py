@@ -1,11 +1,15 @@
 """Anthropic Claude模型实现"""
 
-import base64
-from typing import Dict, Any, List
+import json
+from typing import Dict, Any, List, Optional, Tuple
 import io
 from PIL import Image
+import aiofiles
 
-from .llm_base import BaseLLMModel, ClassificationResult
+from .llm_base import BaseLLMModel
+from .prompts import SINGLE_IMAGE_INSTRUCTION, build_batch_instruction
+from ..utils.executor import encode_base64
+from ..utils.http_client import get_http_client, http_timeout
 
 try:
     import anthropic
@@ -17,91 +21,134 @@ except ImportError:
 class AnthropicModel(BaseLLMModel):
     """Anthropic Claude模型"""
 
+    provider_name = "Anthropic"
+    supports_batch_api = True
+    # Message Batches 单个批处理上限 256MB
+    max_batch_bytes = 256 * 1000 * 1000
+    supports_multi_image = True
+
     def __init__(self, config: Dict[str, Any]):
         if not ANTHROPIC_AVAILABLE:
             raise ImportError("Anthropic library not installed. Install with: pip install anthropic")
 
         super().__init__(config)
-        self.client = anthropic.AsyncAnthropic(api_key=self.api_key)
-
-    async def classify_image(self, image_data: bytes, categories: Dict[str, List[str]]) -> ClassificationResult:
-        """使用Anthropic Claude分类图片"""
-        try:
-            # 构建提示词
-            prompt = self._build_prompt(categories)
-
-            # 将图片转换为base64
-            base64_image = base64.b64encode(image_data).decode('utf-8')
-
-            # 确定图片类型
-            image_type = self._detect_image_type(image_data)
-
-            # 调用Anthropic API
-            response = await self.client.messages.create(
-                model=self.model_name,
-                max_tokens=self.max_tokens,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            },
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": f"image/{image_type}",
-                                    "data": base64_image
-                                }
+        # 为静态分类说明添加 cache_control，命中后这部分输入按缓存价格计费且首字延迟更低
+        self.prompt_caching = config.get("prompt_caching", True)
+        # 重试和超时由基类统一处理，关闭SDK内置重试避免叠加
+        # 所有模型共享调优过的连接池（连接数、长连接、HTTP/2），不使用SDK默认的连接池
+        http_config = config.get("http")
+        self.client = anthropic.AsyncAnthropic(
+            api_key=self.api_key,
+            base_url=config.get("base_url"),
+            timeout=http_timeout(http_config, self.timeout),
+            max_retries=0,
+            http_client=get_http_client(http_config)
+        )
+
+    async def _request(self, image_data: bytes, categories: Dict[str, List[str]]) -> Tuple[str, Optional[int]]:
+        """调用Anthropic API分类单张图片"""
+        request = await self._build_request(image_data, categories)
+        response = await self.client.messages.create(**request)
+        return response.content[0].text, self._usage_tokens(response)
+
+    async def _build_request(self, image_data: bytes, categories: Dict[str, List[str]]) -> Dict[str, Any]:
+        """构建单图分类的请求参数，在线调用和Message Batches共用"""
+        # 将图片转换为base64
+        base64_image = await encode_base64(image_data)
+
+        return {
+            "model": self.model_name,
+            "max_tokens": self.max_tokens,
+            "system": self._system(categories),
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": SINGLE_IMAGE_INSTRUCTION
+                        },
+                        {
+                            "type": "image",
+                            "source": {
+                                "type": "base64",
+                                "media_type": self._media_type(image_data),
+                                "data": base64_image
                             }
-                        ]
-                    }
-                ]
-            )
-
-            raw_response = response.content[0].text
-            return self._parse_response(raw_response, categories)
-
-        except Exception as e:
-            # 返回错误结果
-            return ClassificationResult(
-                category="unknown",
-                confidence=0.0,
-                reasoning=f"Anthropic API error: {str(e)}",
-                raw_response=""
-            )
-
-    def _detect_image_type(self, image_data: bytes) -> str:
-        """检测图片类型"""
-        try:
-            import imghdr
-            image_type = imghdr.what(None, h=image_data)
-            return image_type if image_type else "jpeg"
-        except ImportError:
-            # 如果没有imghdr，默认返回jpeg
-            return "jpeg"
-
-    def _build_prompt(self, categories: Dict[str, List[str]]) -> str:
-        """构建Anthropic分类提示词"""
-        categories_text = "\n".join([
-            f"- {category}: {', '.join(keywords)}"
-            for category, keywords in categories.items()
-        ])
-
-        prompt = f"""Please analyze this image and classify it into one of the following categories:
-
-{categories_text}
-
-Instructions:
-1. Look carefully at the image content
-2. Identify the main subject or theme
-3. Choose the most appropriate category based on the keywords
-4. Respond with just the category name and a brief explanation
-
-Format your response as:
-Category: [category_name]
-Reason: [brief explanation]"""
-
-        return prompt
\ No newline at end of file
+                        }
+                    ]
+                }
+            ]
+        }
+
+    def _batch_line(self, custom_id: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Message Batches中的一个请求"""
+        return {"custom_id": custom_id, "params": request}
+
+    async def submit_batch(self, request_file: str) -> str:
+        """读取请求文件并创建Message Batches批处理任务"""
+        requests = []
+        async with aiofiles.open(request_file, "r", encoding="utf-8") as f:
+            async for line in f:
+                if line.strip():
+                    requests.append(json.loads(line))
+        batch = await self.client.messages.batches.create(requests=requests)
+        return batch.id
+
+    async def is_batch_done(self, batch_id: str) -> bool:
+        """批处理任务是否已结束"""
+        batch = await self.client.messages.batches.retrieve(batch_id)
+        return batch.processing_status == "ended"
+
+    async def fetch_batch_results(self, batch_id: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """下载批处理结果"""
+        results: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        async for entry in await self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                results[entry.custom_id] = (entry.result.message.content[0].text, None)
+            elif entry.result.type == "errored":
+                results[entry.custom_id] = (None, str(entry.result.error))
+            else:
+                results[entry.custom_id] = (None, f"Request {entry.result.type}")
+        return results
+
+    async def _request_batch(self, images: List[bytes], categories: Dict[str, List[str]]) -> Tuple[str, Optional[int]]:
+        """在一次Anthropic请求中分类多张图片"""
+        # 所有图片共用一份分类提示词，静态部分放在system中与单图请求共享缓存
+        content = [{"type": "text", "text": build_batch_instruction(len(images))}]
+        for number, image_data in enumerate(images, start=1):
+            base64_image = await encode_base64(image_data)
+            content.append({"type": "text", "text": f"Image {number}:"})
+            content.append({
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": self._media_type(image_data),
+                    "data": base64_image
+                }
+            })
+
+        response = await self.client.messages.create(
+            model=self.model_name,
+            max_tokens=self.max_tokens * len(images),
+            system=self._system(categories),
+            messages=[{"role": "user", "content": content}]
+        )
+        return response.content[0].text, self._usage_tokens(response)
+
+    def _system(self, categories: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+        """静态分类说明作为system块，开启 prompt_caching 时标记为可缓存的前缀"""
+        block: Dict[str, Any] = {"type": "text", "text": self._build_system_prompt(categories)}
+        if self.prompt_caching:
+            block["cache_control"] = {"type": "ephemeral"}
+        return [block]
+
+    @staticmethod
+    def _usage_tokens(response: Any) -> Optional[int]:
+        """响应的实际token用量（input_tokens 不含写入和命中缓存的部分）"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return None
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        return usage.input_tokens + usage.output_tokens + cache_write + cache_read
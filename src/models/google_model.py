@@ -1,77 +1,135 @@
 """Google Gemini模型实现"""
 
-import base64
-from typing import Dict, Any, List
+import asyncio
 import io
+from typing import Dict, Any, List, Optional, Tuple
+
 from PIL import Image
 
-from .llm_base import BaseLLMModel, ClassificationResult
+from .llm_base import BaseLLMModel
+from .prompts import SINGLE_IMAGE_INSTRUCTION, build_batch_instruction
+from ..utils.executor import run_cpu
+from ..utils.http_client import register_client_closer, unregister_client_closer
+from ..utils.image_probe import MEDIA_TYPES, sniff_format
 
 try:
-    import google.generativeai as genai
+    import google.ai.generativelanguage as glm
     GOOGLE_AVAILABLE = True
 except ImportError:
     GOOGLE_AVAILABLE = False
 
+# Gemini inline_data 接受的图片格式，其他格式（GIF、BMP等）需要先转成PNG
+GEMINI_MEDIA_TYPES = frozenset(["image/jpeg", "image/png", "image/webp", "image/heic", "image/heif"])
 
-class GoogleModel(BaseLLMModel):
-    """Google Gemini模型"""
-
-    def __init__(self, config: Dict[str, Any]):
-        if not GOOGLE_AVAILABLE:
-            raise ImportError("Google Generative AI library not installed. Install with: pip install google-generativeai")
-
-        super().__init__(config)
-
-        # 配置Google API
-        genai.configure(api_key=self.api_key)
-
-        # 初始化模型
-        self.model = genai.GenerativeModel(self.model_name)
 
-    async def classify_image(self, image_data: bytes, categories: Dict[str, List[str]]) -> ClassificationResult:
-        """使用Google Gemini分类图片"""
-        try:
-            # 构建提示词
-            prompt = self._build_prompt(categories)
+def _encode_png(image_data: bytes) -> bytes:
+    """把Gemini不接受的格式重新编码为PNG（动图取第一帧）"""
+    with Image.open(io.BytesIO(image_data)) as image:
+        image.seek(0)
+        converted = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        buffer = io.BytesIO()
+        converted.save(buffer, format="PNG")
+    return buffer.getvalue()
 
-            # 准备图片数据
-            image = Image.open(io.BytesIO(image_data))
 
-            # 调用Google Gemini API
-            response = await self.model.generate_content_async([prompt, image])
-
-            raw_response = response.text
-            return self._parse_response(raw_response, categories)
-
-        except Exception as e:
-            # 返回错误结果
-            return ClassificationResult(
-                category="unknown",
-                confidence=0.0,
-                reasoning=f"Google API error: {str(e)}",
-                raw_response=""
-            )
-
-    def _build_prompt(self, categories: Dict[str, List[str]]) -> str:
-        """构建Google分类提示词"""
-        categories_text = "\n".join([
-            f"- {category}: {', '.join(keywords)}"
-            for category, keywords in categories.items()
-        ])
-
-        prompt = f"""Please analyze this image and classify it into one of the following categories:
+class GoogleModel(BaseLLMModel):
+    """
+    Google Gemini模型
 
-{categories_text}
+    每个实例使用自己的异步API客户端（不调用进程全局的 genai.configure），多个Google配置可以同时使用；
+    Gemini接受的格式以图片字节直接作为 inline_data 发送，其他格式在CPU执行器中转成PNG后发送。
+    """
 
-Instructions:
-1. Look carefully at the image content
-2. Identify the main subject or theme
-3. Choose the most appropriate category based on the keywords
-4. Respond with just the category name and a brief explanation
+    provider_name = "Google"
+    supports_multi_image = True
+    upload_formats = frozenset(["JPEG", "PNG", "WEBP"])
 
-Format your response as:
-Category: [category_name]
-Reason: [brief explanation]"""
+    def __init__(self, config: Dict[str, Any]):
+        if not GOOGLE_AVAILABLE:
+            raise ImportError("Google Generative Language library not installed. Install with: pip install google-ai-generativelanguage")
 
-        return prompt
\ No newline at end of file
+        super().__init__(config)
+        self._client_options: Dict[str, Any] = {"api_key": self.api_key}
+        if config.get("base_url"):
+            self._client_options["api_endpoint"] = config["base_url"]
+        self._model_path = self.model_name if "/" in self.model_name else f"models/{self.model_name}"
+        self._client: Optional["glm.GenerativeServiceAsyncClient"] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def warm_up(self) -> None:
+        """在当前事件循环中预先创建客户端"""
+        self._get_client()
+
+    def _get_client(self) -> "glm.GenerativeServiceAsyncClient":
+        """
+        gRPC异步通道绑定创建它的事件循环，预热或首次请求时（以及事件循环变化后）在当前循环中创建
+
+        新客户端登记到 close_http_clients，随应用关闭；被替换的旧客户端立即关闭。
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            if self._client is not None:
+                self._close_client(self._client, self._client_loop)
+            client = glm.GenerativeServiceAsyncClient(client_options=self._client_options)
+            register_client_closer(client, client.transport.close)
+            self._client = client
+            self._client_loop = loop
+        return self._client
+
+    @staticmethod
+    def _close_client(client: "glm.GenerativeServiceAsyncClient", loop: asyncio.AbstractEventLoop) -> None:
+        """关闭旧客户端的通道；通道只能在创建它的事件循环中关闭，该循环已经结束时通道随之失效"""
+        unregister_client_closer(client)
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.transport.close(), loop)
+
+    async def _request(self, image_data: bytes, categories: Dict[str, List[str]]) -> Tuple[str, Optional[int]]:
+        """调用Google Gemini API分类单张图片"""
+        request = self._build_content_request(
+            categories, [glm.Part(text=SINGLE_IMAGE_INSTRUCTION), await self._image_part(image_data)], self.max_tokens
+        )
+        response = await self._get_client().generate_content(request, timeout=self.timeout)
+        return self._response_text(response), self._usage_tokens(response)
+
+    async def _request_batch(self, images: List[bytes], categories: Dict[str, List[str]]) -> Tuple[str, Optional[int]]:
+        """在一次Gemini请求中分类多张图片"""
+        # 所有图片共用一份分类提示词
+        parts = [glm.Part(text=build_batch_instruction(len(images)))]
+        for number, image_data in enumerate(images, start=1):
+            parts.extend([glm.Part(text=f"Image {number}:"), await self._image_part(image_data)])
+
+        request = self._build_content_request(categories, parts, self.max_tokens * len(images))
+        response = await self._get_client().generate_content(request, timeout=self.timeout)
+        return self._response_text(response), self._usage_tokens(response)
+
+    def _build_content_request(
+        self, categories: Dict[str, List[str]], parts: List["glm.Part"], max_output_tokens: int
+    ) -> "glm.GenerateContentRequest":
+        """静态分类说明作为 system_instruction，请求前缀相同，可以命中Gemini的隐式缓存"""
+        return glm.GenerateContentRequest(
+            model=self._model_path,
+            system_instruction=glm.Content(parts=[glm.Part(text=self._build_system_prompt(categories))]),
+            contents=[glm.Content(role="user", parts=parts)],
+            generation_config=glm.GenerationConfig(max_output_tokens=max_output_tokens)
+        )
+
+    async def _image_part(self, image_data: bytes) -> "glm.Part":
+        """预处理后的图片字节作为 inline_data 发送，Gemini不接受的格式先重新编码为PNG"""
+        media_type = MEDIA_TYPES.get(sniff_format(image_data))
+        if media_type not in GEMINI_MEDIA_TYPES:
+            image_data = await run_cpu(_encode_png, image_data)
+            media_type = "image/png"
+        return glm.Part(inline_data=glm.Blob(mime_type=media_type, data=bytes(image_data)))
+
+    @staticmethod
+    def _response_text(response: Any) -> str:
+        """第一个候选结果的文本"""
+        if not response.candidates:
+            raise ValueError(f"Gemini returned no candidates: {response.prompt_feedback}")
+        return "".join(part.text for part in response.candidates[0].content.parts)
+
+    @staticmethod
+    def _usage_tokens(response: Any) -> Optional[int]:
+        """响应的实际token用量"""
+        usage = getattr(response, "usage_metadata", None)
+        return getattr(usage, "total_token_count", None) if usage is not None else None
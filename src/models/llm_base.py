@@ -1,9 +1,38 @@
 """LLM模型基类"""
 
+import asyncio
+import re
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from contextlib import nullcontext
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from pydantic import BaseModel
 
+from .adaptive_limiter import AdaptiveLimiter
+from .prompts import build_system_prompt
+from .rate_limiter import RateLimiter, estimate_tokens
+from .response_parser import parse_classification
+from .retry import RetryPolicy, classify_error
+from ..utils.image_probe import media_type_of
+from ..utils.metrics import (
+    PROVIDER_IN_FLIGHT, PROVIDER_REQUESTS, PROVIDER_RETRIES, PROVIDER_TOKENS, STAGE_SECONDS, histogram
+)
+
+PROVIDER_SECONDS = histogram(
+    "image_classifier_provider_request_seconds", "Provider request latency per attempt", ("provider",)
+)
+_PROVIDER_CALL_STAGE = STAGE_SECONDS.labels("provider_call")
+_PARSE_STAGE = STAGE_SECONDS.labels("parse_response")
+
+# 多图响应中每张图片段落的标题，例如 "Image 2:"
+_IMAGE_SECTION_PATTERN = re.compile(r"^[\s#*]*Image\s*#?\s*(\d+)\s*\**\s*[:：.]?", re.IGNORECASE | re.MULTILINE)
+
+
+# 分类结果状态
+STATUS_OK = "ok"
+STATUS_TRANSIENT_ERROR = "transient_error"  # 限流、超时、5xx等临时错误重试耗尽，稍后重跑通常可以成功
+STATUS_ERROR = "error"  # 鉴权失败、无效请求或无效图片，重跑也不会成功
+
 
 class ClassificationResult(BaseModel):
     """分类结果"""
@@ -11,22 +40,84 @@ class ClassificationResult(BaseModel):
     confidence: float
     reasoning: str
     raw_response: str
+    metadata: Dict[str, Any] = {}
+    status: str = STATUS_OK
+    error_type: Optional[str] = None  # 失败时的错误类型，见 retry 模块
+
+    @property
+    def ok(self) -> bool:
+        return self.status == STATUS_OK
+
+
+class ClassificationModel(ABC):
+    """
+    分类模型接口
+
+    ImageClassifier 和 ModelFactory 只依赖这里的成员。直接调用厂商API的模型继承 BaseLLMModel，
+    组合其他模型的（如 RouterModel）直接实现本接口。
+    """
+
+    # 错误信息中使用的厂商名称
+    provider_name = "LLM"
+    # 是否支持离线批处理接口（submit_batch / is_batch_done / fetch_batch_results）
+    supports_batch_api = False
+    # 可以原样上传的图片格式（Pillow格式名），其他格式在预处理时重新编码
+    upload_formats = frozenset(["JPEG", "PNG", "WEBP", "GIF"])
+    # 自适应并发限制，未启用时为None
+    concurrency_limiter: Optional[AdaptiveLimiter] = None
+
+    def warm_up(self) -> None:
+        """在应用的事件循环中预先创建需要绑定事件循环的客户端，默认不需要"""
+
+    @abstractmethod
+    async def classify_image(self, image_data: bytes, categories: Dict[str, List[str]]) -> ClassificationResult:
+        """分类单张图片，失败时返回带错误状态的结果而不是抛出异常"""
+
+    @abstractmethod
+    async def classify_images(self, images: List[bytes], categories: Dict[str, List[str]]) -> List[ClassificationResult]:
+        """分类多张图片，返回与输入顺序一致的结果"""
+
+    def _error_result(self, error: BaseException) -> ClassificationResult:
+        """把最终失败的调用转换为带错误状态的结果"""
+        info = classify_error(error)
+        return ClassificationResult(
+            category="unknown",
+            confidence=0.0,
+            reasoning=f"{self.provider_name} API error: {str(error) or type(error).__name__}",
+            raw_response="",
+            status=STATUS_TRANSIENT_ERROR if info.retryable else STATUS_ERROR,
+            error_type=info.kind
+        )
 
 
-class BaseLLMModel(ABC):
+class BaseLLMModel(ClassificationModel):
     """LLM模型基类"""
 
+    # 单个离线批处理请求文件的大小上限（字节），为None表示不限制
+    max_batch_bytes: Optional[int] = None
+    # 是否支持在一次请求中分类多张图片（_request_batch）
+    supports_multi_image = False
+
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.model_name = config.get("model")
         self.api_key = config.get("api_key")
         self.max_tokens = config.get("max_tokens", 300)
+        # 单次请求超时（秒），不含限流排队和重试等待
+        self.timeout = config.get("timeout", 60.0)
+        self.retry_policy = RetryPolicy.from_config(config)
+        # 同一模型的所有调用共享限流器（模型实例由 ModelFactory 缓存）
+        self.rate_limiter = RateLimiter.from_config(config)
+        self.concurrency_limiter = AdaptiveLimiter.from_config(config.get("adaptive_concurrency"))
+        # 指标标签
+        self.metrics_label = self.provider_name.lower()
 
-    @abstractmethod
     async def classify_image(self, image_data: bytes, categories: Dict[str, List[str]]) -> ClassificationResult:
         """
         分类图片
 
+        临时错误按 retry_policy 重试，最终失败时返回带错误状态的结果而不是抛出异常。
+
         Args:
             image_data: 图片二进制数据
             categories: 分类配置，格式为 {category_name: [keywords]}
@@ -34,34 +125,201 @@ class BaseLLMModel(ABC):
         Returns:
             ClassificationResult: 分类结果
         """
-        pass
+        try:
+            raw_response = await self._call(lambda: self._request(image_data, categories), 1)
+        except Exception as e:
+            return self._error_result(e)
+        with _PARSE_STAGE.time():
+            return self._parse_response(raw_response, categories)
+
+    async def classify_images(self, images: List[bytes], categories: Dict[str, List[str]]) -> List[ClassificationResult]:
+        """
+        分类多张图片
+
+        支持多图输入的模型在一次请求中分类所有图片（共用一份分类提示词），
+        多图响应无法解析或请求出现不可重试的错误时退回逐张调用，临时错误重试耗尽时所有图片返回错误结果；
+        其他模型逐张调用 classify_image。
+
+        Args:
+            images: 图片二进制数据列表
+            categories: 分类配置，格式为 {category_name: [keywords]}
+
+        Returns:
+            List[ClassificationResult]: 与输入顺序一致的分类结果
+        """
+        if len(images) <= 1 or not self.supports_multi_image:
+            return list(await asyncio.gather(*(self.classify_image(image, categories) for image in images)))
+
+        try:
+            raw_response = await self._call(lambda: self._request_batch(images, categories), len(images))
+        except Exception as e:
+            # 重试耗尽的临时错误（限流、超时、服务端错误）逐张重发只会放大负载，所有图片直接返回错误结果；
+            # 不可重试的错误（如多图请求不被接受）退回逐张调用
+            if classify_error(e).retryable:
+                return [self._error_result(e) for _ in images]
+            return list(await asyncio.gather(*(self.classify_image(image, categories) for image in images)))
+
+        try:
+            with _PARSE_STAGE.time():
+                parsed = self._parse_batch_response(raw_response, categories, len(images))
+        except Exception:
+            # 响应无法解析时退回逐张调用
+            return list(await asyncio.gather(*(self.classify_image(image, categories) for image in images)))
+
+        return await self._complete_batch(images, categories, parsed)
 
     @abstractmethod
-    def _build_prompt(self, categories: Dict[str, List[str]]) -> str:
-        """构建分类提示词"""
+    async def _request(self, image_data: bytes, categories: Dict[str, List[str]]) -> Tuple[str, Optional[int]]:
+        """
+        发送单图分类请求，失败时直接抛出SDK异常（由 _call 分类并重试）
+
+        Returns:
+            Tuple[str, Optional[int]]: (模型响应文本, 实际token用量)
+        """
         pass
 
+    async def _request_batch(self, images: List[bytes], categories: Dict[str, List[str]]) -> Tuple[str, Optional[int]]:
+        """发送多图分类请求，supports_multi_image 为True的模型需要实现"""
+        raise NotImplementedError(f"{type(self).__name__} does not support multi-image requests")
+
+    async def _call(self, request: Callable[[], Awaitable[Tuple[str, Optional[int]]]], image_count: int) -> str:
+        """
+        在限流、自适应并发、超时和重试保护下执行一次模型请求
+
+        每次尝试都重新排队获取限流额度和并发名额；可重试的错误按指数退避（或 Retry-After）等待后重试，
+        不可重试的错误、重试次数或等待预算耗尽后的最后一个错误直接抛出。
+        每次尝试的耗时（含请求构建）、结果和token用量记录到指标中。
+        """
+        provider = self.metrics_label
+        in_flight = PROVIDER_IN_FLIGHT.labels(provider)
+        attempt = 0
+        waited = 0.0
+        while True:
+            try:
+                async with self.rate_limiter.acquire(self._estimate_tokens(image_count)) as permit:
+                    async with self.concurrency_limiter.acquire() if self.concurrency_limiter else nullcontext():
+                        in_flight.inc()
+                        started = time.perf_counter()
+                        try:
+                            raw_response, usage_tokens = await asyncio.wait_for(request(), self.timeout)
+                        finally:
+                            elapsed = time.perf_counter() - started
+                            in_flight.dec()
+                            _PROVIDER_CALL_STAGE.observe(elapsed)
+                            PROVIDER_SECONDS.labels(provider).observe(elapsed)
+                    permit.record_usage(usage_tokens)
+                PROVIDER_REQUESTS.labels(provider, "ok").inc()
+                if usage_tokens:
+                    PROVIDER_TOKENS.labels(provider).inc(usage_tokens)
+                return raw_response
+            except Exception as e:
+                error = classify_error(e)
+                PROVIDER_REQUESTS.labels(provider, error.kind).inc()
+                if not error.retryable or attempt >= self.retry_policy.max_retries:
+                    raise
+                delay = self.retry_policy.delay(attempt, error, waited)
+                if delay is None:
+                    raise
+                PROVIDER_RETRIES.labels(provider, error.kind).inc()
+                await asyncio.sleep(delay)
+                waited += delay
+                attempt += 1
+
+    async def _build_request(self, image_data: bytes, categories: Dict[str, List[str]]) -> Dict[str, Any]:
+        """构建单图分类的请求参数，支持离线批处理的模型需要实现"""
+        raise NotImplementedError(f"{type(self).__name__} does not support batch submission")
+
+    def _batch_line(self, custom_id: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        """离线批处理请求文件中的一行，request 由 _build_request 生成"""
+        raise NotImplementedError(f"{type(self).__name__} does not support batch submission")
+
+    async def submit_batch(self, request_file: str) -> str:
+        """
+        提交离线批处理任务
+
+        Args:
+            request_file: JSONL请求文件路径，每行是 _batch_line 生成的一个请求
+
+        Returns:
+            str: 批处理任务ID
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support batch submission")
+
+    async def is_batch_done(self, batch_id: str) -> bool:
+        """批处理任务是否已结束"""
+        raise NotImplementedError(f"{type(self).__name__} does not support batch submission")
+
+    async def fetch_batch_results(self, batch_id: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """
+        获取批处理结果
+
+        Returns:
+            Dict[str, Tuple[Optional[str], Optional[str]]]: custom_id -> (模型响应文本, 错误信息)
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support batch submission")
+
+    def _estimate_tokens(self, image_count: int = 1) -> int:
+        """估算一次请求的token消耗，用于每分钟token数限流"""
+        return estimate_tokens(image_count, self.max_tokens * image_count)
+
+    @staticmethod
+    def _media_type(image_data: bytes) -> str:
+        """按魔数得到上传图片的MIME类型（只读前12个字节，预处理可能改变格式，因此按实际上传的数据判断）"""
+        return media_type_of(image_data)
+
+    def _build_system_prompt(self, categories: Dict[str, List[str]]) -> str:
+        """
+        静态分类说明，支持系统提示词的厂商把它放在请求最前面以命中提示词缓存，
+        图片和 SINGLE_IMAGE_INSTRUCTION / build_batch_instruction 放在其后
+        """
+        return build_system_prompt(categories)
+
+    def _parse_batch_response(
+        self,
+        response: str,
+        categories: Dict[str, List[str]],
+        count: int
+    ) -> List[Optional[ClassificationResult]]:
+        """解析多图响应，没有找到对应段落的图片返回None"""
+        sections: Dict[int, str] = {}
+        matches = list(_IMAGE_SECTION_PATTERN.finditer(response))
+        for match, next_match in zip(matches, matches[1:] + [None]):
+            number = int(match.group(1))
+            end = next_match.start() if next_match is not None else len(response)
+            section = response[match.end():end].strip().lstrip("*").strip()
+            if 1 <= number <= count and section and number not in sections:
+                sections[number] = section
+
+        return [
+            self._parse_response(sections[number], categories) if number in sections else None
+            for number in range(1, count + 1)
+        ]
+
+    async def _complete_batch(
+        self,
+        images: List[bytes],
+        categories: Dict[str, List[str]],
+        parsed: List[Optional[ClassificationResult]]
+    ) -> List[ClassificationResult]:
+        """多图响应缺少部分图片时，对缺少的图片逐张补充调用"""
+        missing = [index for index, result in enumerate(parsed) if result is None]
+        if missing:
+            retried = await asyncio.gather(*(self.classify_image(images[index], categories) for index in missing))
+            for index, result in zip(missing, retried):
+                parsed[index] = result
+        return parsed
+
     def _parse_response(self, response: str, categories: Dict[str, List[str]]) -> ClassificationResult:
-        """解析模型响应"""
-        # 这是一个基础解析方法，子类可以重写
-        response_lower = response.lower()
-
-        # 计算每个类别的匹配度
-        category_scores = {}
-        for category, keywords in categories.items():
-            score = 0
-            for keyword in keywords:
-                if keyword.lower() in response_lower:
-                    score += 1
-            category_scores[category] = score / len(keywords)
-
-        # 选择得分最高的类别
-        best_category = max(category_scores, key=category_scores.get)
-        confidence = category_scores[best_category]
+        """
+        解析模型响应
 
+        优先读取 "Category:" 行（或JSON中的 category 字段），无法识别时用预编译的关键词匹配器兜底，
+        见 response_parser.parse_classification。子类可以重写。
+        """
+        category, confidence, reasoning = parse_classification(response, categories)
         return ClassificationResult(
-            category=best_category,
+            category=category,
             confidence=confidence,
-            reasoning=f"Based on keyword matching in the response: {response[:100]}...",
+            reasoning=reasoning,
             raw_response=response
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,102 @@
+"""模拟厂商模型，用于离线压测和回归测试"""
+
+import asyncio
+import math
+import random
+import zlib
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from .llm_base import BaseLLMModel
+from .rate_limiter import TokenBucket
+
+# 每张图片模拟的token用量
+TOKENS_PER_IMAGE = 300
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "exponential", "lognormal")
+
+
+class MockProviderError(Exception):
+    """模拟厂商返回的HTTP错误，属性与官方SDK的 APIStatusError 一致，可以被 classify_error 识别"""
+
+    def __init__(self, status_code: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        headers = {"retry-after": f"{retry_after:.3f}"} if retry_after is not None else {}
+        self.response = SimpleNamespace(headers=headers)
+
+
+class MockModel(BaseLLMModel):
+    """
+    不调用任何API的模拟模型（model type: mock）
+
+    按配置的延迟分布等待后返回 "Category: xxx" 格式的响应，类别由图片内容的CRC32决定，
+    同一张图片总是得到相同的类别。可以模拟随机错误、厂商侧限流（429，带 Retry-After）
+    和并发容量，用于在不产生费用的情况下测量吞吐和延迟。
+    """
+
+    provider_name = "Mock"
+    supports_multi_image = True
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        mock_config = config.get("mock") or {}
+        self.latency_distribution: str = mock_config.get("latency_distribution", "lognormal")
+        self.latency: float = mock_config.get("latency", 0.5)
+        self.latency_sigma: float = mock_config.get("latency_sigma", 0.5)
+        self.latency_per_image: float = mock_config.get("latency_per_image", 0.05)
+        self.error_rate: float = mock_config.get("error_rate", 0.0)
+        self.error_status: int = mock_config.get("error_status", 500)
+        self.capacity: Optional[int] = mock_config.get("capacity")
+        self.random = random.Random(mock_config.get("seed"))
+        if self.latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unsupported latency distribution: {self.latency_distribution}")
+
+        # 厂商侧每分钟请求数限制，超出时返回429
+        requests_per_minute = mock_config.get("requests_per_minute")
+        self.provider_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.in_flight = 0
+
+    async def _request(self, image_data: bytes, categories: Dict[str, List[str]]) -> Tuple[str, Optional[int]]:
+        await self._simulate(1)
+        return f"Category: {self._pick_category(image_data, categories)}\nReason: mock response", TOKENS_PER_IMAGE
+
+    async def _request_batch(self, images: List[bytes], categories: Dict[str, List[str]]) -> Tuple[str, Optional[int]]:
+        await self._simulate(len(images))
+        response = "\n\n".join(
+            f"Image {number}:\nCategory: {self._pick_category(image, categories)}\nReason: mock response"
+            for number, image in enumerate(images, start=1)
+        )
+        return response, TOKENS_PER_IMAGE * len(images)
+
+    async def _simulate(self, image_count: int) -> None:
+        """检查限流和容量，按延迟分布等待，并按 error_rate 随机失败"""
+        if self.provider_bucket is not None:
+            wait = self.provider_bucket.try_acquire()
+            if wait > 0:
+                raise MockProviderError(429, "Mock rate limit exceeded", retry_after=wait)
+        if self.capacity is not None and self.in_flight >= self.capacity:
+            raise MockProviderError(429, "Mock provider overloaded")
+
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self._sample_latency() + self.latency_per_image * (image_count - 1))
+        finally:
+            self.in_flight -= 1
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            raise MockProviderError(self.error_status, f"Mock error {self.error_status}")
+
+    def _sample_latency(self) -> float:
+        """按配置的分布采样一次请求的延迟（秒），latency 为中位数（constant 时为固定值）"""
+        if self.latency_distribution == "constant":
+            return self.latency
+        if self.latency_distribution == "uniform":
+            return self.random.uniform(0, 2 * self.latency)
+        if self.latency_distribution == "exponential":
+            return self.random.expovariate(math.log(2) / self.latency) if self.latency > 0 else 0.0
+        return self.latency * self.random.lognormvariate(0, self.latency_sigma)
+
+    @staticmethod
+    def _pick_category(image_data: bytes, categories: Dict[str, List[str]]) -> str:
+        names = list(categories)
+        return names[zlib.crc32(image_data) % len(names)]
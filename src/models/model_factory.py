@@ -1,37 +1,110 @@
 """模型工厂类"""
 
+import hashlib
+import json
 from typing import Dict, Any, Optional
-from .llm_base import BaseLLMModel
+from .llm_base import ClassificationModel
+from .router_model import RouterModel
 from .openai_model import OpenAIModel
 from .anthropic_model import AnthropicModel
 from .google_model import GoogleModel
+from .mock_model import MockModel
+from ..utils.config import config_manager
+from ..utils.metrics import CONCURRENCY_LIMIT, registry
 
 
 class ModelFactory:
     """模型工厂类"""
 
-    _models: Dict[str, BaseLLMModel] = {}
+    _models: Dict[str, ClassificationModel] = {}
+    # 创建各实例时使用的配置指纹
+    _fingerprints: Dict[str, str] = {}
 
     @classmethod
-    def create_model(cls, model_type: str, config: Dict[str, Any]) -> BaseLLMModel:
-        """创建模型实例"""
+    def create_model(cls, model_type: str, config: Dict[str, Any]) -> ClassificationModel:
+        """创建模型实例，配置中的 type 字段可以指定实现（例如多个 router 配置），默认与模型类型相同"""
+        model_type = config.get("type") or model_type
         if model_type == "openai":
             return OpenAIModel(config)
         elif model_type == "anthropic":
             return AnthropicModel(config)
         elif model_type == "google":
             return GoogleModel(config)
+        elif model_type == "mock":
+            return MockModel(config)
+        elif model_type == "router":
+            router_config = config.get("router") or {}
+            return RouterModel(router_config, cls._get_providers(router_config.get("providers", [])))
         else:
             raise ValueError(f"Unsupported model type: {model_type}")
 
     @classmethod
-    def get_model(cls, model_type: str, config: Dict[str, Any]) -> BaseLLMModel:
-        """获取模型实例（单例模式）"""
-        if model_type not in cls._models:
-            cls._models[model_type] = cls.create_model(model_type, config)
-        return cls._models[model_type]
+    def get_model(cls, model_type: str, config: Dict[str, Any]) -> ClassificationModel:
+        """
+        获取模型实例，同一模型类型在配置不变时复用同一个实例，配置变化后重新创建
+
+        路由模型的指纹同时包含各厂商的配置，任一厂商的配置变化后路由也重新创建，不会继续使用旧的厂商实例。
+        """
+        fingerprint = cls._fingerprint(config)
+        if (config.get("type") or model_type) == "router":
+            provider_names = (config.get("router") or {}).get("providers", [])
+            fingerprint = cls._fingerprint({
+                "router": fingerprint,
+                "providers": [cls._provider_fingerprint(name) for name in provider_names]
+            })
+        model = cls._models.get(model_type)
+        # 手动放入的实例没有记录配置指纹，保持不变
+        if model is None or cls._fingerprints.get(model_type, fingerprint) != fingerprint:
+            model = cls.create_model(model_type, config)
+            cls._models[model_type] = model
+            cls._fingerprints[model_type] = fingerprint
+        return model
+
+    @staticmethod
+    def _fingerprint(config: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def _provider_fingerprint(cls, name: str) -> Optional[str]:
+        provider_config = config_manager.get_model_config(name)
+        return None if provider_config is None else cls._fingerprint(provider_config.dict())
+
+    @classmethod
+    def clear(cls) -> None:
+        """清空模型实例缓存，之后按当前配置重新创建"""
+        cls._models.clear()
+        cls._fingerprints.clear()
+
+    @classmethod
+    def _get_providers(cls, provider_names: list[str]) -> Dict[str, ClassificationModel]:
+        """按名称获取路由使用的各厂商模型实例"""
+        providers = {}
+        for name in provider_names:
+            provider_config = config_manager.get_model_config(name)
+            if provider_config is None:
+                raise ValueError(f"Model configuration not found: {name}")
+            providers[name] = cls.get_model(name, provider_config.dict())
+        return providers
+
+    @classmethod
+    def get_concurrency_stats(cls) -> Dict[str, Dict[str, Any]]:
+        """已创建模型的自适应并发状态，未启用的模型不包含在内"""
+        return {
+            model_type: model.concurrency_limiter.snapshot()
+            for model_type, model in cls._models.items()
+            if model.concurrency_limiter is not None
+        }
 
     @classmethod
     def get_available_models(cls) -> list[str]:
         """获取可用模型列表"""
-        return ["openai", "anthropic", "google"]
\ No newline at end of file
+        return ["openai", "anthropic", "google", "router", "mock"]
+
+
+def _collect_concurrency_limits() -> None:
+    """导出指标前刷新各模型的自适应并发上限"""
+    for model_type, stats in ModelFactory.get_concurrency_stats().items():
+        CONCURRENCY_LIMIT.labels(model_type).set(stats["limit"])
+
+
+registry.add_collector(_collect_concurrency_limits)
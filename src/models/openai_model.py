@@ -1,11 +1,14 @@
 """OpenAI GPT-4 Vision模型实现"""
 
-import base64
-from typing import Dict, Any, List
+import json
+from typing import Dict, Any, List, Optional, Tuple
 import io
 from PIL import Image
 
-from .llm_base import BaseLLMModel, ClassificationResult
+from .llm_base import BaseLLMModel
+from .prompts import SINGLE_IMAGE_INSTRUCTION, build_batch_instruction
+from ..utils.executor import encode_base64
+from ..utils.http_client import get_http_client, http_timeout
 
 try:
     import openai
@@ -14,82 +17,146 @@ except ImportError:
     OPENAI_AVAILABLE = False
 
 
+# Batch API 对应的在线接口
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
 class OpenAIModel(BaseLLMModel):
     """OpenAI GPT-4 Vision模型"""
 
+    provider_name = "OpenAI"
+    supports_batch_api = True
+    # Batch API 输入文件上限 200MB
+    max_batch_bytes = 200 * 1000 * 1000
+    supports_multi_image = True
+
     def __init__(self, config: Dict[str, Any]):
         if not OPENAI_AVAILABLE:
             raise ImportError("OpenAI library not installed. Install with: pip install openai")
 
         super().__init__(config)
+        # 重试和超时由基类统一处理，关闭SDK内置重试避免叠加
+        # 所有模型共享调优过的连接池（连接数、长连接、HTTP/2），不使用SDK默认的连接池
+        http_config = config.get("http")
         self.client = openai.AsyncOpenAI(
             api_key=self.api_key,
-            base_url=config.get("base_url")
+            base_url=config.get("base_url"),
+            timeout=http_timeout(http_config, self.timeout),
+            max_retries=0,
+            http_client=get_http_client(http_config)
         )
 
-    async def classify_image(self, image_data: bytes, categories: Dict[str, List[str]]) -> ClassificationResult:
-        """使用OpenAI GPT-4 Vision分类图片"""
-        try:
-            # 构建提示词
-            prompt = self._build_prompt(categories)
-
-            # 准备图片数据
-            base64_image = base64.b64encode(image_data).decode('utf-8')
-
-            # 调用OpenAI API
-            response = await self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
-                                }
+    async def _request(self, image_data: bytes, categories: Dict[str, List[str]]) -> Tuple[str, Optional[int]]:
+        """调用OpenAI API分类单张图片"""
+        request = await self._build_request(image_data, categories)
+        response = await self.client.chat.completions.create(**request)
+        return response.choices[0].message.content, self._usage_tokens(response)
+
+    async def _build_request(self, image_data: bytes, categories: Dict[str, List[str]]) -> Dict[str, Any]:
+        """
+        构建单图分类的请求参数，在线调用和Batch API共用
+
+        静态的分类说明作为第一条system消息，所有请求的前缀完全相同，可以命中OpenAI的自动提示词缓存；
+        随请求变化的图片放在最后。
+        """
+        # 准备图片数据
+        base64_image = await encode_base64(image_data)
+
+        return {
+            "model": self.model_name,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": self._build_system_prompt(categories)
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": SINGLE_IMAGE_INSTRUCTION
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:{self._media_type(image_data)};base64,{base64_image}"
                             }
-                        ]
-                    }
-                ],
-                max_tokens=self.max_tokens
-            )
-
-            raw_response = response.choices[0].message.content
-            return self._parse_response(raw_response, categories)
-
-        except Exception as e:
-            # 返回错误结果
-            return ClassificationResult(
-                category="unknown",
-                confidence=0.0,
-                reasoning=f"OpenAI API error: {str(e)}",
-                raw_response=""
-            )
-
-    def _build_prompt(self, categories: Dict[str, List[str]]) -> str:
-        """构建OpenAI分类提示词"""
-        categories_text = "\n".join([
-            f"- {category}: {', '.join(keywords)}"
-            for category, keywords in categories.items()
-        ])
-
-        prompt = f"""Please analyze this image and classify it into one of the following categories:
-
-{categories_text}
-
-Instructions:
-1. Look carefully at the image content
-2. Identify the main subject or theme
-3. Choose the most appropriate category based on the keywords
-4. Respond with just the category name and a brief explanation
-
-Format your response as:
-Category: [category_name]
-Reason: [brief explanation]"""
-
-        return prompt
\ No newline at end of file
+                        }
+                    ]
+                }
+            ],
+            "max_tokens": self.max_tokens
+        }
+
+    def _batch_line(self, custom_id: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Batch JSONL文件中的一行"""
+        return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": request}
+
+    async def submit_batch(self, request_file: str) -> str:
+        """上传Batch JSONL文件（从磁盘流式读取）并创建批处理任务"""
+        with open(request_file, "rb") as f:
+            batch_file = await self.client.files.create(file=("batch.jsonl", f), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window="24h"
+        )
+        return batch.id
+
+    async def is_batch_done(self, batch_id: str) -> bool:
+        """批处理任务是否已结束"""
+        batch = await self.client.batches.retrieve(batch_id)
+        return batch.status in ("completed", "failed", "expired", "cancelled")
+
+    async def fetch_batch_results(self, batch_id: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """下载批处理结果文件和错误文件"""
+        batch = await self.client.batches.retrieve(batch_id)
+        results: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await self.client.files.content(file_id)
+            for line in content.text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                body = response.get("body") or {}
+                if response.get("status_code") == 200 and body.get("choices"):
+                    results[record["custom_id"]] = (body["choices"][0]["message"]["content"], None)
+                else:
+                    error = record.get("error") or body.get("error") or f"HTTP {response.get('status_code')}"
+                    results[record["custom_id"]] = (None, str(error))
+
+        return results
+
+    async def _request_batch(self, images: List[bytes], categories: Dict[str, List[str]]) -> Tuple[str, Optional[int]]:
+        """在一次OpenAI请求中分类多张图片"""
+        # 所有图片共用一份分类提示词，静态部分放在system消息中与单图请求共享缓存前缀
+        content = [{"type": "text", "text": build_batch_instruction(len(images))}]
+        for number, image_data in enumerate(images, start=1):
+            base64_image = await encode_base64(image_data)
+            content.append({"type": "text", "text": f"Image {number}:"})
+            content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:{self._media_type(image_data)};base64,{base64_image}"
+                }
+            })
+
+        response = await self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": self._build_system_prompt(categories)},
+                {"role": "user", "content": content}
+            ],
+            max_tokens=self.max_tokens * len(images)
+        )
+        return response.choices[0].message.content, self._usage_tokens(response)
+
+    @staticmethod
+    def _usage_tokens(response: Any) -> Optional[int]:
+        """响应的实际token用量"""
+        usage = getattr(response, "usage", None)
+        return usage.total_tokens if usage is not None else None
\ No newline at end of file
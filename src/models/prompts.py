@@ -0,0 +1,77 @@
+"""分类提示词，按分类配置缓存"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+CategoryKey = Tuple[Tuple[str, Tuple[str, ...]], ...]
+
+# 单图请求的指令（放在图片之前，位于静态前缀之后）
+SINGLE_IMAGE_INSTRUCTION = """Please analyze this image and classify it.
+
+Format your response as:
+Category: [category_name]
+Reason: [brief explanation]"""
+
+
+def category_key(categories: Dict[str, List[str]]) -> CategoryKey:
+    """分类配置的可哈希表示，用作按分类配置缓存的键"""
+    return tuple((name, tuple(keywords)) for name, keywords in categories.items())
+
+
+class Categories(dict):
+    """
+    分类配置 {category_name: [keywords]}，同时保存由它生成的系统提示词和响应匹配器
+
+    ImageClassifier 每个配置版本创建一次并在所有请求间复用，提示词和匹配器只构建一次；
+    普通字典同样可以传给模型，此时每次按分类配置的内容查找缓存。创建后不要修改。
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.derived: Dict[str, Any] = {}
+
+
+@lru_cache(maxsize=32)
+def _system_prompt(key: CategoryKey) -> str:
+    categories_text = "\n".join(f"- {category}: {', '.join(keywords)}" for category, keywords in key)
+    return f"""You classify images into one of the following categories:
+
+{categories_text}
+
+Instructions:
+1. Look carefully at the image content
+2. Identify the main subject or theme
+3. Choose the most appropriate category based on the keywords
+4. Respond with just the category name and a brief explanation"""
+
+
+def build_system_prompt(categories: Dict[str, List[str]]) -> str:
+    """
+    静态的分类说明（分类列表和通用指令）
+
+    同一分类配置下所有请求（单图和多图）的这部分完全相同，放在请求最前面，
+    可以命中厂商的提示词缓存（Anthropic cache_control / OpenAI 自动前缀缓存）。
+    """
+    derived = getattr(categories, "derived", None)
+    if derived is None:
+        return _system_prompt(category_key(categories))
+    if "system_prompt" not in derived:
+        derived["system_prompt"] = _system_prompt(category_key(categories))
+    return derived["system_prompt"]
+
+
+@lru_cache(maxsize=64)
+def build_batch_instruction(count: int) -> str:
+    """多图请求的指令，要求按图片编号逐段作答"""
+    return f"""You will receive {count} images, each preceded by its label "Image 1" to "Image {count}".
+Classify every image independently, and answer every image, in order, without skipping any.
+
+Format your response as one block per image:
+Image 1:
+Category: [category_name]
+Reason: [brief explanation]
+
+Image 2:
+Category: [category_name]
+Reason: [brief explanation]"""
+
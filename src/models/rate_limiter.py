@@ -0,0 +1,134 @@
+"""客户端限流（按模型的令牌桶）"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+# 请求实际消耗未知时的估算值：提示词 + 每张图片（长边1568像素约1600 tokens）
+PROMPT_TOKEN_ESTIMATE = 200
+IMAGE_TOKEN_ESTIMATE = 1600
+
+
+class TokenBucket:
+    """
+    每分钟补充 rate_per_minute 个令牌的令牌桶
+
+    容量等于每分钟额度，与厂商服务端的限流方式一致；
+    等待者在锁上排队，先到先得，不会因大请求饿死。
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        """取出 amount 个令牌，不足时等待补充"""
+        # 超过容量的请求最多等到桶满，否则永远无法发出
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def try_acquire(self, amount: float = 1) -> float:
+        """不等待地取出令牌：成功时返回0，不足时不扣减并返回需要等待的秒数"""
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def adjust(self, amount: float) -> None:
+        """按实际用量修正：正数补扣，负数退还；余额可以为负，后续请求会等待还清"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RateLimitPermit:
+    """一次受限调用的许可，用于上报实际token用量"""
+
+    def __init__(self, limiter: "RateLimiter", estimated_tokens: int):
+        self._limiter = limiter
+        self.estimated_tokens = estimated_tokens
+
+    def record_usage(self, total_tokens: Optional[int]) -> None:
+        """用响应中的实际用量修正预扣的估算值"""
+        if total_tokens is None or self._limiter.token_bucket is None:
+            return
+        self._limiter.token_bucket.adjust(total_tokens - self.estimated_tokens)
+        self.estimated_tokens = total_tokens
+
+
+class RateLimiter:
+    """
+    单个模型的客户端限流器（每分钟请求数、每分钟token数、最大并发数）
+
+    提高并发后直接把请求打给厂商只会换来429；在客户端按额度匀速放行，
+    可以让持续吞吐停留在限额之下而不是在限流错误中反复重试。
+    未配置的维度不做限制。
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_concurrent: Optional[int] = None
+    ):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrent = max_concurrent
+        self._semaphore = asyncio.Semaphore(max_concurrent) if max_concurrent else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.request_bucket is not None or self.token_bucket is not None or self._semaphore is not None
+
+    @asynccontextmanager
+    async def acquire(self, estimated_tokens: int = 0) -> AsyncIterator[RateLimitPermit]:
+        """
+        等待额度后执行一次模型调用
+
+            async with self.rate_limiter.acquire(tokens) as permit:
+                response = await client.create(...)
+                permit.record_usage(response.usage.total_tokens)
+
+        Args:
+            estimated_tokens: 预估的token消耗（输入 + 最大输出），响应返回后用实际用量修正
+        """
+        permit = RateLimitPermit(self, estimated_tokens)
+        if self._semaphore is not None:
+            await self._semaphore.acquire()
+        try:
+            if self.request_bucket is not None:
+                await self.request_bucket.acquire(1)
+            if self.token_bucket is not None and estimated_tokens:
+                await self.token_bucket.acquire(estimated_tokens)
+            yield permit
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "RateLimiter":
+        """根据模型配置创建限流器"""
+        return cls(
+            requests_per_minute=config.get("requests_per_minute"),
+            tokens_per_minute=config.get("tokens_per_minute"),
+            max_concurrent=config.get("max_concurrent")
+        )
+
+
+def estimate_tokens(image_count: int, max_tokens: int) -> int:
+    """估算一次分类请求的token消耗"""
+    return PROMPT_TOKEN_ESTIMATE + image_count * IMAGE_TOKEN_ESTIMATE + max_tokens
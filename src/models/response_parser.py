@@ -0,0 +1,173 @@
+"""模型响应解析：结构化字段优先，关键词匹配兜底"""
+
+import json
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from .prompts import CategoryKey, category_key
+
+# "Category: cat"、"**Category:** cat"、"分类：猫" 等结构化字段
+_CATEGORY_LINE = re.compile(r"^[\s>*#-]*(?:category|分类|类别)[\s*]*[:：]\s*(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+_REASON_LINE = re.compile(r"^[\s>*#-]*(?:reason|reasoning|原因|理由)[\s*]*[:：]\s*(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+_CONFIDENCE_LINE = re.compile(
+    r"^[\s>*#-]*(?:confidence|置信度)[\s*]*[:：]\s*([0-9]*\.?[0-9]+)\s*(%?)", re.IGNORECASE | re.MULTILINE
+)
+# 响应中的JSON对象（可能包在 ```json 代码块中）
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+# 字段值两侧的Markdown标记、括号和引号
+_VALUE_STRIP = " \t*_`'\"[]()<>.,;:!。，；：！"
+
+# 置信度：模型没有给出时，按解析方式给定
+CONFIDENCE_EXACT = 1.0  # 结构化字段就是分类名
+CONFIDENCE_FIELD_KEYWORD = 0.8  # 结构化字段中匹配到关键词
+CONFIDENCE_TEXT_KEYWORD = 0.5  # 只能在全文中匹配关键词（乘以最佳类别的命中占比）
+
+UNKNOWN_CATEGORY = "unknown"
+
+
+class CategoryMatcher:
+    """
+    由分类配置预编译的匹配器
+
+    分类名放在字典中精确查找；所有关键词编译为一个正则，一次扫描统计各类别命中的关键词。
+    英文关键词要求单词边界，避免 "cat" 命中 "Category" 或 "education"。
+    """
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        self.categories = list(categories)
+        self._names = {name.lower(): name for name in categories}
+        self._keyword_categories: Dict[str, List[str]] = {}
+        for name, keywords in categories.items():
+            for keyword in [name, *keywords]:
+                keyword = keyword.strip().lower()
+                if keyword:
+                    owners = self._keyword_categories.setdefault(keyword, [])
+                    if name not in owners:
+                        owners.append(name)
+
+        # 长关键词优先，避免 "cat" 抢先匹配 "catalog" 一类的长词
+        alternatives = [
+            rf"(?<![a-z0-9]){re.escape(keyword)}(?![a-z0-9])" if keyword.isascii() else re.escape(keyword)
+            for keyword in sorted(self._keyword_categories, key=len, reverse=True)
+        ]
+        self._pattern = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+
+    def lookup_name(self, value: str) -> Optional[str]:
+        """字段值是否就是某个分类名（忽略大小写和两侧标记）"""
+        value = value.strip(_VALUE_STRIP).lower()
+        if value in self._names:
+            return self._names[value]
+        # "cat - a kitten on a sofa" 一类的写法取第一个词
+        first = re.split(r"[\s,，(（/|-]+", value, maxsplit=1)[0].strip(_VALUE_STRIP)
+        return self._names.get(first)
+
+    def match_keywords(self, text: str) -> Tuple[Optional[str], float]:
+        """
+        单次扫描匹配关键词
+
+        Returns:
+            Tuple[Optional[str], float]: (命中关键词最多的分类, 其命中数占全部命中数的比例)，没有命中时分类为None
+        """
+        if self._pattern is None:
+            return None, 0.0
+        hits: Dict[str, set] = {}
+        for match in self._pattern.finditer(text):
+            keyword = match.group(0).lower()
+            for name in self._keyword_categories[keyword]:
+                hits.setdefault(name, set()).add(keyword)
+        if not hits:
+            return None, 0.0
+
+        counts = {name: len(keywords) for name, keywords in hits.items()}
+        # 同分时按配置顺序
+        best = max(self.categories, key=lambda name: counts.get(name, 0))
+        return best, counts[best] / sum(counts.values())
+
+
+@lru_cache(maxsize=32)
+def _cached_matcher(key: CategoryKey) -> CategoryMatcher:
+    return CategoryMatcher({name: list(keywords) for name, keywords in key})
+
+
+def get_category_matcher(categories: Dict[str, List[str]]) -> CategoryMatcher:
+    """获取分类配置对应的匹配器，分类配置不变时复用同一个实例"""
+    derived = getattr(categories, "derived", None)
+    if derived is None:
+        return _cached_matcher(category_key(categories))
+    if "matcher" not in derived:
+        derived["matcher"] = _cached_matcher(category_key(categories))
+    return derived["matcher"]
+
+
+def _parse_confidence(value) -> Optional[float]:
+    try:
+        confidence = float(str(value).strip().rstrip("%"))
+    except (TypeError, ValueError):
+        return None
+    # 带%或在 (1, 100] 内的按百分数处理，其余超出 [0, 1] 的值截断
+    if (isinstance(value, str) and value.strip().endswith("%")) or 1 < confidence <= 100:
+        confidence /= 100
+    return min(1.0, max(0.0, confidence))
+
+
+def _parse_json(response: str) -> Optional[Dict[str, str]]:
+    """提取响应中带 category 字段的JSON对象（结构化输出 / 工具调用的参数）"""
+    match = _JSON_OBJECT.search(response)
+    if match is None:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    fields = {str(key).lower(): value for key, value in data.items()}
+    if "category" not in fields:
+        return None
+    return {
+        "category": str(fields["category"]),
+        "reason": str(fields.get("reason") or fields.get("reasoning") or ""),
+        "confidence": fields.get("confidence"),
+    }
+
+
+def parse_classification(response: str, categories: Dict[str, List[str]]) -> Tuple[str, float, str]:
+    """
+    解析模型响应
+
+    依次尝试：JSON中的 category 字段、"Category:" 行、全文关键词匹配。
+    模型给出 Confidence 时使用其值，否则按解析方式给定置信度；都无法识别时返回 unknown。
+
+    Returns:
+        Tuple[str, float, str]: (分类名, 置信度, 理由)
+    """
+    matcher = get_category_matcher(categories)
+
+    fields = _parse_json(response) if "{" in response else None
+    if fields is None:
+        category_match = _CATEGORY_LINE.search(response)
+        reason_match = _REASON_LINE.search(response)
+        confidence_match = _CONFIDENCE_LINE.search(response)
+        fields = {
+            "category": category_match.group(1) if category_match else None,
+            "reason": reason_match.group(1) if reason_match else "",
+            "confidence": "".join(confidence_match.groups()) if confidence_match else None,
+        }
+
+    reported = _parse_confidence(fields["confidence"]) if fields["confidence"] is not None else None
+    reasoning = fields["reason"] or response[:100]
+
+    value = fields["category"]
+    if value:
+        name = matcher.lookup_name(value)
+        if name is not None:
+            return name, reported if reported is not None else CONFIDENCE_EXACT, reasoning
+        name, _ = matcher.match_keywords(value)
+        if name is not None:
+            return name, reported if reported is not None else CONFIDENCE_FIELD_KEYWORD, reasoning
+
+    name, share = matcher.match_keywords(response)
+    if name is not None:
+        return name, CONFIDENCE_TEXT_KEYWORD * share, reasoning
+    return UNKNOWN_CATEGORY, 0.0, reasoning
@@ -0,0 +1,125 @@
+"""模型调用的错误分类与重试退避"""
+
+import asyncio
+import email.utils
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+# 错误类型
+RATE_LIMIT = "rate_limit"
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+SERVER_ERROR = "server_error"
+AUTH = "auth"
+INVALID_REQUEST = "invalid_request"
+UNKNOWN = "unknown"
+
+# 可以重试的HTTP状态码（与官方SDK内置重试的范围一致）
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+@dataclass
+class ErrorInfo:
+    """模型调用异常的分类结果"""
+    kind: str
+    retryable: bool
+    status_code: Optional[int] = None
+    retry_after: Optional[float] = None  # 服务端要求的等待时间（秒）
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    # openai / anthropic 的 APIStatusError 使用 status_code，google.api_core 的异常使用 code
+    for attribute in ("status_code", "code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """读取响应头中的 retry-after-ms / Retry-After（秒数或HTTP日期）"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        parsed = email.utils.parsedate_tz(retry_after)
+        if parsed is None:
+            return None
+        return max(0.0, email.utils.mktime_tz(parsed) - time.time())
+
+
+def classify_error(error: BaseException) -> ErrorInfo:
+    """
+    把模型调用异常分为可重试（限流、超时、连接失败、5xx）和不可重试（鉴权、无效请求/图片）两类
+
+    只依赖异常的属性和类名，不需要导入各厂商的SDK。
+    """
+    name = type(error).__name__
+    status_code = _status_code(error)
+
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or "Timeout" in name:
+        return ErrorInfo(TIMEOUT, True, status_code)
+    if status_code is None:
+        if isinstance(error, ConnectionError) or "Connection" in name:
+            return ErrorInfo(CONNECTION, True)
+        return ErrorInfo(UNKNOWN, False)
+
+    if status_code == 429:
+        return ErrorInfo(RATE_LIMIT, True, status_code, _retry_after(error))
+    if status_code >= 500 or status_code in RETRYABLE_STATUS_CODES:
+        return ErrorInfo(SERVER_ERROR, True, status_code, _retry_after(error))
+    if status_code in (401, 403):
+        return ErrorInfo(AUTH, False, status_code)
+    return ErrorInfo(INVALID_REQUEST, False, status_code)
+
+
+@dataclass
+class RetryPolicy:
+    """带上限和抖动的指数退避"""
+    max_retries: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    max_retry_after: float = 60.0  # 按 Retry-After 等待的上限（秒）
+    budget: float = 120.0  # 一次调用所有重试的等待时间合计上限（秒）
+
+    def delay(self, attempt: int, error: ErrorInfo, waited: float = 0.0) -> Optional[float]:
+        """
+        第 attempt 次重试（从0开始）前的等待时间，返回None表示不再重试
+
+        服务端给出 Retry-After 时按其等待（不超过 max_retry_after），否则使用 full jitter：
+        在 [0, min(max_delay, base_delay * 2^attempt)] 内随机，避免大量请求同时重试。
+        服务端要求的等待或退避时间超过剩余预算（budget - waited）时直接失败，不占用并发名额空等。
+        """
+        remaining = self.budget - waited
+        if error.retry_after is not None:
+            if error.retry_after > remaining:
+                return None
+            return min(error.retry_after, self.max_retry_after)
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        return delay if delay <= remaining else None
+
+    @classmethod
+    def from_config(cls, config: Any) -> "RetryPolicy":
+        """根据模型配置创建重试策略"""
+        return cls(
+            max_retries=config.get("max_retries", 3),
+            base_delay=config.get("retry_base_delay", 1.0),
+            max_delay=config.get("retry_max_delay", 30.0),
+            max_retry_after=config.get("retry_max_retry_after", 60.0),
+            budget=config.get("retry_budget", 120.0)
+        )
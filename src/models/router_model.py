@@ -0,0 +1,241 @@
+"""多厂商路由模型：故障转移与对冲请求"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Collection, Dict, List, Optional, Tuple, TypeVar
+
+from .llm_base import ClassificationModel, ClassificationResult
+
+T = TypeVar("T")
+
+# 每个厂商保留的最近延迟样本数
+LATENCY_WINDOW = 200
+# 计算p95之前需要的最少样本数，样本不足时使用 hedge_min_delay
+MIN_LATENCY_SAMPLES = 20
+# 错误率的指数加权系数
+ERROR_RATE_ALPHA = 0.2
+# 连续失败达到该次数后熔断，冷却期内排到最后
+FAILURE_THRESHOLD = 3
+CIRCUIT_COOLDOWN = 30.0
+
+
+class ProviderStats:
+    """单个厂商的实时延迟与错误统计"""
+
+    def __init__(self):
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.requests += 1
+        self.error_rate += ERROR_RATE_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            # 失败的请求往往很快返回，不计入延迟分布
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+            return
+
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= FAILURE_THRESHOLD:
+            self.open_until = time.monotonic() + CIRCUIT_COOLDOWN
+
+    @property
+    def circuit_open(self) -> bool:
+        return time.monotonic() < self.open_until
+
+    def quantile(self, q: float) -> Optional[float]:
+        """延迟分位数，样本不足时返回None"""
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate, 4),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "circuit_open": self.circuit_open,
+        }
+
+
+class RouterModel(ClassificationModel):
+    """
+    在多个厂商之间路由的模型（model type: router）
+
+    - 故障转移：当前厂商返回失败结果，或超过 latency_budget 仍未返回时，启用下一个厂商
+    - 对冲请求：hedge 开启时，当前厂商超过其 p95 延迟仍未返回，就向下一个厂商再发一次，
+      先返回的成功结果胜出，其余请求被取消，尾延迟被限制在大约 p95 + 次选厂商的延迟
+    - 排序：按配置的优先级，熔断中的厂商和错误率过高的厂商排到后面
+
+    路由本身不发送请求，因此直接实现 ClassificationModel 接口而不继承 BaseLLMModel；
+    各厂商模型通过构造参数注入，测试时可以直接传入本地桩模型。
+    """
+
+    provider_name = "Router"
+
+    def __init__(self, config: Dict[str, Any], providers: Dict[str, ClassificationModel]):
+        """
+        初始化路由模型
+
+        Args:
+            config: 路由配置，即模型配置中 router 字段（RouterConfig）的字典形式
+            providers: 模型配置名 -> 模型实例，顺序即优先级
+        """
+        if not providers:
+            raise ValueError("Router requires at least one provider")
+
+        self.providers = dict(providers)
+        # 只原样上传所有厂商都接受的格式
+        self.upload_formats = frozenset.intersection(*(model.upload_formats for model in self.providers.values()))
+        self.latency_budget: Optional[float] = config.get("latency_budget")
+        self.hedge: bool = config.get("hedge", False)
+        self.hedge_quantile: float = config.get("hedge_quantile", 0.95)
+        self.hedge_min_delay: float = config.get("hedge_min_delay", 1.0)
+        self.max_error_rate: float = config.get("max_error_rate", 0.5)
+        self.stats: Dict[str, ProviderStats] = {name: ProviderStats() for name in self.providers}
+
+    def warm_up(self) -> None:
+        """预热所有厂商"""
+        for model in self.providers.values():
+            model.warm_up()
+
+    async def classify_image(self, image_data: bytes, categories: Dict[str, List[str]]) -> ClassificationResult:
+        """按路由策略分类单张图片"""
+        try:
+            result, provider = await self._route(
+                lambda model: model.classify_image(image_data, categories),
+                lambda result: result.ok
+            )
+        except Exception as e:
+            return self._error_result(e)
+        result.metadata = {**result.metadata, "provider": provider}
+        return result
+
+    async def classify_images(self, images: List[bytes], categories: Dict[str, List[str]]) -> List[ClassificationResult]:
+        """
+        按路由策略分类多张图片
+
+        至少一张成功即视为该厂商可用；失败的图片再交给还没有尝试过的厂商，已经成功的图片不重发。
+        """
+        results: List[Optional[ClassificationResult]] = [None] * len(images)
+        pending = list(range(len(images)))
+        tried: List[str] = []
+        while pending and len(tried) < len(self.providers):
+            batch = [images[index] for index in pending]
+            try:
+                outcome, provider = await self._route(
+                    lambda model: model.classify_images(batch, categories),
+                    lambda outcome: any(result.ok for result in outcome),
+                    exclude=tried
+                )
+            except Exception as e:
+                for index in pending:
+                    results[index] = self._error_result(e)
+                break
+
+            tried.append(provider)
+            failed = []
+            for index, result in zip(pending, outcome):
+                result.metadata = {**result.metadata, "provider": provider}
+                results[index] = result
+                if not result.ok:
+                    failed.append(index)
+            pending = failed
+        return results
+
+    def ranked_providers(self) -> List[str]:
+        """按实时状态排序的厂商列表"""
+        order = list(self.providers)
+        return sorted(order, key=lambda name: (
+            self.stats[name].circuit_open,
+            self.stats[name].error_rate > self.max_error_rate,
+            order.index(name)
+        ))
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各厂商的实时统计"""
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+    def _launch_delay(self, provider: str) -> Optional[float]:
+        """当前厂商多久未返回时启用下一个厂商，None表示只在失败时切换"""
+        delays = []
+        if self.latency_budget:
+            delays.append(self.latency_budget)
+        if self.hedge:
+            p95 = self.stats[provider].quantile(self.hedge_quantile)
+            delays.append(max(self.hedge_min_delay, p95) if p95 is not None else self.hedge_min_delay)
+        return min(delays) if delays else None
+
+    async def _route(
+        self, call: Callable[[ClassificationModel], Awaitable[T]], is_ok: Callable[[T], bool],
+        exclude: Collection[str] = ()
+    ) -> Tuple[T, str]:
+        """
+        依次（或对冲并行）调用各厂商（跳过 exclude 中的厂商），返回第一个成功的结果和厂商名
+
+        所有厂商都失败时返回最后一个失败结果（最后一个厂商抛出异常时重新抛出）。
+        """
+        queue = [name for name in self.ranked_providers() if name not in exclude]
+        if self.hedge and len(queue) == 1:
+            # 只有一个厂商时对冲到同一个厂商
+            queue = queue * 2
+
+        running: Dict[asyncio.Task, Tuple[str, float]] = {}
+        launched_at: Dict[str, float] = {}
+        last_failure: Optional[Tuple[Any, str]] = None
+
+        def launch() -> str:
+            provider = queue.pop(0)
+            task = asyncio.ensure_future(call(self.providers[provider]))
+            launched_at[provider] = time.monotonic()
+            running[task] = (provider, launched_at[provider])
+            return provider
+
+        current = launch()
+        try:
+            while running:
+                timeout = None
+                delay = self._launch_delay(current) if queue else None
+                if delay is not None:
+                    # 从当前厂商发出请求时开始计时
+                    timeout = max(0.0, delay - (time.monotonic() - launched_at[current]))
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # 超过延迟预算或对冲阈值：保留在途请求，同时启用下一个厂商
+                    current = launch()
+                    continue
+
+                for task in done:
+                    provider, started = running.pop(task)
+                    try:
+                        outcome = task.result()
+                        ok = is_ok(outcome)
+                    except Exception as e:
+                        outcome, ok = e, False
+                    self.stats[provider].record(time.monotonic() - started, ok)
+                    if ok:
+                        return outcome, provider
+                    last_failure = (outcome, provider)
+                    # 失败时立即启用下一个厂商，即使还有对冲请求在途
+                    if queue:
+                        current = launch()
+
+            outcome, provider = last_failure
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome, provider
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
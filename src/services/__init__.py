@@ -1,8 +1,39 @@
 """服务模块"""
 
 from .classifier import ImageClassifier, BatchClassifier
+from .bulk import BulkBatchClassifier
+from .cache import ResultCache, close_result_cache, get_result_cache
+from .dedup import BKTree, NearDuplicateIndex, compute_image_hash, get_dedup_index
+from .label_index import LabelIndex, get_label_index
+from .local_classifier import LocalClassifier, extract_features, get_local_classifier
+from .jobs import JobManager, get_job_manager, shutdown_job_manager
+from .registry import ClassifierRegistry, classifier_registry
+from .sinks import ResultSink, JSONLResultSink, CSVResultSink, open_result_sink, load_completed_paths
 
 __all__ = [
     "ImageClassifier",
-    "BatchClassifier"
+    "BatchClassifier",
+    "BulkBatchClassifier",
+    "ResultCache",
+    "get_result_cache",
+    "close_result_cache",
+    "BKTree",
+    "NearDuplicateIndex",
+    "compute_image_hash",
+    "get_dedup_index",
+    "LabelIndex",
+    "get_label_index",
+    "LocalClassifier",
+    "extract_features",
+    "get_local_classifier",
+    "JobManager",
+    "get_job_manager",
+    "shutdown_job_manager",
+    "ClassifierRegistry",
+    "classifier_registry",
+    "ResultSink",
+    "JSONLResultSink",
+    "CSVResultSink",
+    "open_result_sink",
+    "load_completed_paths"
 ]
\ No newline at end of file
@@ -0,0 +1,234 @@
+"""基于厂商离线Batch API的批量分类"""
+
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiofiles
+
+from ..models import ClassificationResult, STATUS_ERROR, STATUS_TRANSIENT_ERROR
+from ..utils.config import config_manager
+from .classifier import ImageClassifier, PendingImage
+
+# 每次读取并预处理的文件数
+PREPARE_CHUNK_SIZE = 32
+
+
+class _RequestFile:
+    """正在写入的批处理请求文件，请求生成后立即写入磁盘，不在内存中累积"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.requests = 0
+        self.size = 0
+        # custom_id -> 恢复轮询所需的图片信息（结果位置、缓存键、感知哈希、预处理元数据）
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._file: Any = None
+
+    async def write(self, custom_id: str, line: bytes, entry: Dict[str, Any]) -> None:
+        if self._file is None:
+            self._file = await aiofiles.open(self.path, "wb")
+        await self._file.write(line)
+        self.requests += 1
+        self.size += len(line)
+        self.entries[custom_id] = entry
+
+    async def close(self) -> None:
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+
+
+class BulkBatchClassifier:
+    """
+    离线批量分类器
+
+    把图片写成厂商的批处理请求（OpenAI Batch JSONL / Anthropic Message Batches）提交，
+    轮询直到完成后再把结果映射回文件路径。延迟以小时计，但费用更低、不受在线限流影响，适合夜间回填。
+    请求参数和响应解析复用模型的 _build_request / _parse_response，结果与在线调用一致。
+
+    请求边生成边写入 work_dir 下的请求文件，按请求数和编码后的字节数拆成多个批处理；
+    已提交的批处理ID保存在状态文件中，中断后对同一批文件重新运行会继续轮询，不会重复提交。
+    """
+
+    def __init__(self, classifier: ImageClassifier, poll_interval: Optional[float] = None,
+                 max_requests_per_batch: Optional[int] = None, max_bytes_per_batch: Optional[int] = None,
+                 work_dir: Optional[str] = None):
+        """
+        初始化离线批量分类器
+
+        Args:
+            classifier: 提供模型、缓存和预处理的分类器
+            poll_interval: 轮询间隔（秒），不指定则使用 app.bulk.poll_interval
+            max_requests_per_batch: 每个批处理任务的最大请求数，不指定则使用 app.bulk.max_requests_per_batch
+            max_bytes_per_batch: 每个批处理请求文件的最大字节数，不指定则使用 app.bulk.max_bytes_per_batch，
+                不超过厂商上限
+            work_dir: 请求文件和状态文件目录，不指定则使用 app.bulk.work_dir
+        """
+        bulk_config = config_manager.get_app_config().bulk
+        self.classifier = classifier
+        self.poll_interval = bulk_config.poll_interval if poll_interval is None else poll_interval
+        self.max_requests_per_batch = max(1, max_requests_per_batch or bulk_config.max_requests_per_batch)
+        self.work_dir = work_dir or bulk_config.work_dir
+
+        if not classifier.model.supports_batch_api:
+            raise ValueError(f"Model does not support batch submission: {classifier.model_type}")
+
+        provider_limit = classifier.model.max_batch_bytes
+        self.max_bytes_per_batch = max_bytes_per_batch or bulk_config.max_bytes_per_batch or provider_limit
+        if self.max_bytes_per_batch and provider_limit:
+            self.max_bytes_per_batch = min(self.max_bytes_per_batch, provider_limit)
+
+    async def classify_files(self, file_paths: List[str]) -> List[Tuple[str, ClassificationResult]]:
+        """
+        通过离线批处理分类文件
+
+        校验、缓存、近似重复查询、本地预分类和预处理与在线路径相同，直接得到结果的图片不会提交。
+
+        Args:
+            file_paths: 图片文件路径列表
+
+        Returns:
+            List[Tuple[str, ClassificationResult]]: (文件名, 分类结果) 的列表，顺序与输入一致
+        """
+        model = self.classifier.model
+        category_keywords, namespace = self.classifier.get_categories()
+
+        os.makedirs(self.work_dir, exist_ok=True)
+        state_path = self._state_path(file_paths, namespace)
+        # 上次运行已经提交的批处理：[{"id": batch_id, "entries": {custom_id: entry}}]
+        batches = self._load_state(state_path)
+        submitted = {entry["index"] for batch in batches for entry in batch["entries"].values()}
+
+        results: List[Optional[ClassificationResult]] = [None] * len(file_paths)
+        # 本次运行提交的图片，保留特征向量供结果写入近邻标签索引和本地预分类
+        live: Dict[str, PendingImage] = {}
+        remaining = [index for index in range(len(file_paths)) if index not in submitted]
+        request_file: Optional[_RequestFile] = None
+
+        try:
+            for start in range(0, len(remaining), PREPARE_CHUNK_SIZE):
+                images: List[bytes] = []
+                indexes: List[int] = []
+                for index in remaining[start:start + PREPARE_CHUNK_SIZE]:
+                    try:
+                        async with aiofiles.open(file_paths[index], 'rb') as f:
+                            images.append(await f.read())
+                        indexes.append(index)
+                    except OSError as e:
+                        results[index] = self._error_result(f"Classification failed: {str(e)}", STATUS_ERROR, "read_error")
+
+                prepared = await self.classifier.prepare_images(images)
+                for position, result in enumerate(prepared.results):
+                    if result is not None:
+                        results[indexes[position]] = result
+
+                for image in prepared.pending:
+                    image.index = indexes[image.index]
+                    custom_id = f"img-{image.index}"
+                    request = await model._build_request(image.upload_data, category_keywords)
+                    line = (json.dumps(model._batch_line(custom_id, request)) + "\n").encode("utf-8")
+                    # 请求已经编码，释放图片数据
+                    image.image_data = image.upload_data = b""
+
+                    if request_file is not None and self._is_full(request_file, len(line)):
+                        await self._submit(request_file, batches, state_path)
+                        request_file = None
+                    if request_file is None:
+                        request_file = _RequestFile(f"{state_path[:-len('.json')]}-{len(batches)}.jsonl")
+                    await request_file.write(custom_id, line, {
+                        "index": image.index,
+                        "cache_key": image.cache_key,
+                        "image_hash": image.image_hash,
+                        "metadata": image.metadata
+                    })
+                    live[custom_id] = image
+
+            if request_file is not None:
+                await self._submit(request_file, batches, state_path)
+                request_file = None
+        finally:
+            if request_file is not None:
+                await request_file.close()
+
+        for batch in batches:
+            while not await model.is_batch_done(batch["id"]):
+                await asyncio.sleep(self.poll_interval)
+
+            batch_results = await model.fetch_batch_results(batch["id"])
+            pending: List[PendingImage] = []
+            model_results: List[ClassificationResult] = []
+            for custom_id, entry in batch["entries"].items():
+                image = live.get(custom_id)
+                if image is None:
+                    # 上次运行提交的图片，从状态文件恢复
+                    image = PendingImage(
+                        entry["index"], b"", cache_key=entry["cache_key"], image_hash=entry["image_hash"],
+                        metadata=entry["metadata"]
+                    )
+                raw_response, error = batch_results.get(custom_id, (None, "Missing from batch results"))
+                if raw_response is None:
+                    # 批处理中单个请求失败（过期、取消、服务端错误），重新提交通常可以成功
+                    result = self._error_result(f"Batch request failed: {error}", STATUS_TRANSIENT_ERROR, "batch_error")
+                else:
+                    result = model._parse_response(raw_response, category_keywords)
+                pending.append(image)
+                model_results.append(result)
+
+            completed = await self.classifier.complete_images(pending, model_results, namespace)
+            for image, result in zip(pending, completed):
+                results[image.index] = result
+
+        # 所有批处理的结果都已取回，下次运行重新提交
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return list(zip(file_paths, results))
+
+    def _is_full(self, request_file: _RequestFile, line_size: int) -> bool:
+        """再写入一个请求是否会超过请求数或字节数上限"""
+        if request_file.requests >= self.max_requests_per_batch:
+            return True
+        return self.max_bytes_per_batch is not None and request_file.size + line_size > self.max_bytes_per_batch
+
+    async def _submit(self, request_file: _RequestFile, batches: List[Dict[str, Any]], state_path: str) -> None:
+        """提交请求文件，并在删除请求文件之前保存批处理ID"""
+        await request_file.close()
+        batch_id = await self.classifier.model.submit_batch(request_file.path)
+        batches.append({"id": batch_id, "entries": request_file.entries})
+        self._save_state(state_path, batches)
+        os.remove(request_file.path)
+
+    def _state_path(self, file_paths: List[str], namespace: str) -> str:
+        """状态文件路径，由结果命名空间和文件列表决定，对同一批文件重新运行时得到同一个文件"""
+        digest = hashlib.sha256(namespace.encode("utf-8"))
+        for file_path in file_paths:
+            digest.update(b"\0" + file_path.encode("utf-8", "surrogateescape"))
+        return os.path.join(self.work_dir, f"{digest.hexdigest()[:32]}.json")
+
+    @staticmethod
+    def _load_state(state_path: str) -> List[Dict[str, Any]]:
+        if not os.path.exists(state_path):
+            return []
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)["batches"]
+
+    @staticmethod
+    def _save_state(state_path: str, batches: List[Dict[str, Any]]) -> None:
+        """整体原子替换，中断时不会留下写了一半的状态文件"""
+        temp_path = f"{state_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"batches": batches}, f)
+        os.replace(temp_path, state_path)
+
+    @staticmethod
+    def _error_result(reasoning: str, status: str, error_type: str) -> ClassificationResult:
+        return ClassificationResult(
+            category="unknown",
+            confidence=0.0,
+            reasoning=reasoning,
+            raw_response="",
+            status=status,
+            error_type=error_type
+        )
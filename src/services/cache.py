@@ -0,0 +1,200 @@
+"""分类结果缓存"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ..models import ClassificationResult
+from ..utils.config import config_manager, CacheConfig
+from ..utils.metrics import CACHE_LOOKUPS
+
+_CACHE_HITS = CACHE_LOOKUPS.labels("hit")
+_CACHE_PERSISTENT_HITS = CACHE_LOOKUPS.labels("persistent_hit")
+_CACHE_MISSES = CACHE_LOOKUPS.labels("miss")
+
+
+class ResultCache:
+    """
+    内容寻址的分类结果缓存
+
+    缓存键由图片字节的哈希和命名空间（模型类型、模型名称、分类配置）共同决定，
+    相同图片在相同配置下只需调用一次模型。
+    包含进程内LRU层（按条目数和TTL淘汰）和可选的SQLite持久化层。
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 0, persistent_path: Optional[str] = None):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 内存层最多保存的条目数
+            ttl_seconds: 条目有效期（秒），0表示永不过期
+            persistent_path: SQLite数据库路径，不指定则只使用内存层
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[float, ClassificationResult]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.persistent_hits = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if persistent_path:
+            Path(persistent_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(persistent_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(image_data: bytes, namespace: str) -> str:
+        """生成缓存键，namespace 由 make_namespace 生成"""
+        return f"{namespace}:{hashlib.sha256(image_data).hexdigest()}"
+
+    async def get(self, key: str) -> Optional[ClassificationResult]:
+        """查询缓存，未命中时返回None"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            created_at, result = entry
+            if not self._is_expired(created_at):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                _CACHE_HITS.inc()
+                return result.model_copy()
+            del self._memory[key]
+
+        if self._db is not None:
+            row = await asyncio.to_thread(self._db_get, key)
+            if row is not None and not self._is_expired(row[1]):
+                result = ClassificationResult.model_validate_json(row[0])
+                self._remember(key, result, row[1])
+                self.hits += 1
+                self.persistent_hits += 1
+                _CACHE_PERSISTENT_HITS.inc()
+                return result.model_copy()
+
+        self.misses += 1
+        _CACHE_MISSES.inc()
+        return None
+
+    async def set(self, key: str, result: ClassificationResult) -> None:
+        """写入缓存"""
+        created_at = time.time()
+        self._remember(key, result, created_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._db_set, key, result.model_dump_json(), created_at)
+
+    def clear(self) -> None:
+        """清空缓存（包括持久化层）"""
+        self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """获取命中统计"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "persistent_hits": self.persistent_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self) -> None:
+        """关闭持久化层"""
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def _remember(self, key: str, result: ClassificationResult, created_at: float) -> None:
+        self._memory[key] = (created_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def _db_get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            # 配置重新加载时旧缓存会被关闭，进行中的请求按未命中处理
+            if self._db is None:
+                return None
+            return self._db.execute(
+                "SELECT value, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _db_set(self, key: str, value: str, created_at: float) -> None:
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, created_at)
+            )
+            self._db.commit()
+
+    @classmethod
+    def from_config(cls, cache_config: CacheConfig) -> "ResultCache":
+        """根据配置创建缓存"""
+        return cls(
+            max_entries=cache_config.max_entries,
+            ttl_seconds=cache_config.ttl_seconds,
+            persistent_path=cache_config.persistent_path
+        )
+
+
+def make_namespace(model_type: str, model_name: str, categories: Dict[str, List[str]]) -> str:
+    """由模型类型、模型名称和分类配置生成结果命名空间，配置不同的结果互不复用"""
+    category_fingerprint = hashlib.sha256(
+        json.dumps(categories, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    return f"{model_type}:{model_name}:{category_fingerprint[:16]}"
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_config: Optional[CacheConfig] = None
+_result_cache_version = -1
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """
+    获取全局结果缓存，缓存未启用时返回None
+
+    配置重新加载后（config_manager.version 变化）缓存配置有变化时关闭旧缓存并按新配置重建。
+    """
+    global _result_cache, _result_cache_config, _result_cache_version
+    if _result_cache_version != config_manager.version:
+        cache_config = config_manager.get_app_config().cache
+        if cache_config != _result_cache_config:
+            close_result_cache()
+            _result_cache_config = cache_config
+            if cache_config.enabled:
+                _result_cache = ResultCache.from_config(cache_config)
+        _result_cache_version = config_manager.version
+    return _result_cache
+
+
+def close_result_cache() -> None:
+    """关闭全局结果缓存，下次获取时重新创建"""
+    global _result_cache, _result_cache_config, _result_cache_version
+    if _result_cache is not None:
+        _result_cache.close()
+    _result_cache = None
+    _result_cache_config = None
+    _result_cache_version = -1
@@ -1,14 +1,51 @@
 """图片分类服务"""
 
-import io
+import asyncio
+import inspect
 import os
-from typing import Dict, List, Optional, Tuple
-from PIL import Image
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Container, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 import aiofiles
 from pathlib import Path
 
-from ..models import ModelFactory, ClassificationResult
+from ..models import ModelFactory, Categories, ClassificationResult, STATUS_ERROR, STATUS_TRANSIENT_ERROR, classify_error
 from ..utils.config import config_manager
+from ..utils.executor import get_cpu_executor, run_cpu
+from ..utils.image_probe import ImageInfo, probe_image
+from ..utils.metrics import DEDUP_HITS, STAGE_SECONDS
+from .cache import get_result_cache, make_namespace
+from .dedup import cluster_hashes, compute_image_hash, get_dedup_index
+from .label_index import LABEL_INDEX_TIER, LabelIndex, get_label_index
+from .local_classifier import LOCAL_TIER, LocalClassifier, extract_image_features, get_local_classifier
+from .preprocess import preprocess_image, verify_image
+
+_VALIDATE_STAGE = STAGE_SECONDS.labels("validate")
+_CACHE_LOOKUP_STAGE = STAGE_SECONDS.labels("cache_lookup")
+_DEDUP_LOOKUP_STAGE = STAGE_SECONDS.labels("dedup_lookup")
+_PREPROCESS_STAGE = STAGE_SECONDS.labels("preprocess")
+_LOCAL_CLASSIFY_STAGE = STAGE_SECONDS.labels("local_classify")
+
+
+@dataclass
+class PendingImage:
+    """分类流程中单张图片的中间状态"""
+    index: int
+    image_data: Union[bytes, memoryview]
+    cache_key: Optional[str] = None
+    image_hash: Optional[int] = None
+    upload_data: Union[bytes, memoryview, None] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    features: Any = None  # 近邻标签索引和本地预分类使用的特征向量
+    info: Optional[ImageInfo] = None  # 文件头识别的格式和尺寸
+
+
+@dataclass
+class PreparedImages:
+    """prepare_images 的结果"""
+    categories: Dict[str, List[str]]
+    namespace: str
+    results: List[Optional[ClassificationResult]] = field(default_factory=list)  # 已直接得到的结果，需要调用模型的位置为None
+    pending: List[PendingImage] = field(default_factory=list)  # 需要调用模型的图片，index 对应 results 中的位置
 
 
 class ImageClassifier:
@@ -27,6 +64,17 @@ class ImageClassifier:
             raise ValueError(f"Model configuration not found: {self.model_type}")
 
         self.model = ModelFactory.get_model(self.model_type, self.config.dict())
+        self.cache = get_result_cache()
+        self.dedup_index = get_dedup_index()
+        # 分类配置和结果命名空间，配置重新加载后重建
+        self._category_version: Optional[int] = None
+        self._category_config: Tuple[Categories, str] = (Categories(), "")
+        # 近邻标签索引和本地预分类器按结果命名空间分开，分类配置变化后在 get_categories 中切换；设为None即关闭
+        self.label_index: Optional[LabelIndex] = None
+        self.local_classifier: Optional[LocalClassifier] = None
+        namespace = self.get_categories()[1]
+        self.label_index = get_label_index(namespace)
+        self.local_classifier = get_local_classifier(namespace)
 
     async def classify_image_file(self, file_path: str) -> ClassificationResult:
         """
@@ -44,46 +92,301 @@ class ImageClassifier:
 
         return await self.classify_image_data(image_data)
 
-    async def classify_image_data(self, image_data: bytes) -> ClassificationResult:
+    async def classify_image_data(self, image_data: Union[bytes, memoryview]) -> ClassificationResult:
         """
         分类图片数据
 
         Args:
-            image_data: 图片二进制数据
+            image_data: 图片二进制数据，可以直接传入上传缓冲区的 memoryview 以避免复制
 
         Returns:
             ClassificationResult: 分类结果
         """
+        results = await self.classify_images_data([image_data])
+        return results[0]
+
+    async def classify_images_data(self, images: Sequence[Union[bytes, memoryview]]) -> List[ClassificationResult]:
+        """
+        分类多张图片数据
+
+        每张图片先经过校验、结果缓存和近似重复查询，剩余的图片预处理后
+        通过一次 classify_images 调用打包发送给模型。
+
+        Args:
+            images: 图片二进制数据列表
+
+        Returns:
+            List[ClassificationResult]: 与输入顺序一致的分类结果
+        """
+        prepared = await self.prepare_images(images)
+        if not prepared.pending:
+            return prepared.results
+
+        # 使用模型分类
+        uploads = [image.upload_data for image in prepared.pending]
+        if len(uploads) == 1:
+            model_results = [await self.model.classify_image(uploads[0], prepared.categories)]
+        else:
+            model_results = await self.model.classify_images(uploads, prepared.categories)
+
+        completed = await self.complete_images(prepared.pending, model_results, prepared.namespace)
+        for image, result in zip(prepared.pending, completed):
+            prepared.results[image.index] = result
+        return prepared.results
+
+    async def prepare_images(self, images: Sequence[Union[bytes, memoryview]]) -> "PreparedImages":
+        """
+        调用模型之前的阶段：校验、结果缓存和近似重复查询、近邻标签索引和本地预分类、预处理
+
+        自行调用模型的场景（如离线批处理）先调用本方法，把 pending 中图片的 upload_data 发送给模型，
+        再把模型结果交给 complete_images。
+
+        Args:
+            images: 图片二进制数据列表
+
+        Returns:
+            PreparedImages: 已直接得到的结果和仍需调用模型的图片
+        """
+        category_keywords, namespace = self.get_categories()
+        prepared = PreparedImages(category_keywords, namespace)
+
+        entries = [PendingImage(index, image_data) for index, image_data in enumerate(images)]
+        prepared.results = list(await asyncio.gather(*(self._lookup(entry, namespace) for entry in entries)))
+        pending = [entry for entry, result in zip(entries, prepared.results) if result is None]
+
+        # 近邻标签索引和本地预分类，置信度足够的图片不再调用模型
+        if pending and (self.label_index is not None or self.local_classifier is not None):
+            pending = await self._classify_locally(pending, prepared.results, category_keywords)
+
+        # 缩放并重新编码，减小上传体积
+        await asyncio.gather(*(self._preprocess(image) for image in pending))
+        prepared.pending = pending
+        return prepared
+
+    async def complete_images(
+        self,
+        pending: Sequence["PendingImage"],
+        model_results: Sequence[ClassificationResult],
+        namespace: str
+    ) -> List[ClassificationResult]:
+        """
+        调用模型之后的阶段：合并预处理元数据，写入结果缓存、近似重复索引、本地预分类样本和近邻标签索引
+
+        Args:
+            pending: prepare_images 返回的待分类图片
+            model_results: 与 pending 顺序一致的模型结果
+            namespace: 结果命名空间
+
+        Returns:
+            List[ClassificationResult]: 与 pending 顺序一致的最终结果
+        """
+        results = []
+        for image, result in zip(pending, model_results):
+            if self.local_classifier is not None and image.features is not None:
+                # 模型结果作为本地预分类的训练样本
+                self.local_classifier.add_example(image.features, result)
+            results.append(await self._store(image, result, namespace))
+
+        if self.label_index is not None:
+            # 模型结果追加到近邻标签索引
+            labelled = [
+                (image.features, result) for image, result in zip(pending, results) if image.features is not None
+            ]
+            if labelled:
+                await self.label_index.add([features for features, _ in labelled], [result for _, result in labelled])
+
+        return results
+
+    def get_concurrency_limit(self) -> int:
+        """
+        批量分类时同时在途的请求数上限
+
+        启用自适应并发时使用其最大值，实际并发由模型调用处的 AdaptiveLimiter 动态控制；
+        否则使用 app.model_concurrency / app.max_concurrency。
+        """
+        limiter = self.model.concurrency_limiter
+        if limiter is not None:
+            return limiter.max_limit
+        return config_manager.get_concurrency_limit(self.model_type)
+
+    def get_categories(self) -> Tuple[Categories, str]:
+        """
+        获取分类配置 {category_name: [keywords]} 和对应的结果命名空间
+
+        按配置版本缓存，每张图片复用同一个 Categories，模型的提示词和响应匹配器保存在其中，只在配置变化时重建。
+        """
+        if self._category_version != config_manager.version:
+            category_keywords = Categories({
+                name: category.keywords
+                for name, category in config_manager.get_categories().items()
+            })
+            namespace = make_namespace(self.model_type, self.config.model, category_keywords)
+            self._category_config = (category_keywords, namespace)
+            self._category_version = config_manager.version
+            if self.label_index is not None:
+                self.label_index = get_label_index(namespace)
+            if self.local_classifier is not None:
+                self.local_classifier = get_local_classifier(namespace)
+        return self._category_config
+
+    async def _store(self, image: "PendingImage", result: ClassificationResult, namespace: str) -> ClassificationResult:
+        """合并预处理元数据，并把成功的模型结果写入缓存和近似重复索引"""
+        result.metadata = {**result.metadata, **image.metadata}
+
+        # 只缓存成功的结果
+        if result.ok:
+            if image.cache_key is not None:
+                await self.cache.set(image.cache_key, result)
+            if image.image_hash is not None:
+                self.dedup_index.add(namespace, image.image_hash, result)
+        return result
+
+    async def _lookup(self, image: "PendingImage", namespace: str) -> Optional[ClassificationResult]:
+        """
+        校验图片并查询缓存，可以直接得到结果时返回结果，需要调用模型时返回None
+
+        缓存键和感知哈希记录在 image 上，供模型返回结果后写入缓存。
+        """
+        image_data = image.image_data
         # 验证图片格式
-        if not self._is_valid_image(image_data):
+        if not await self._validate(image):
             return ClassificationResult(
                 category="unknown",
                 confidence=0.0,
                 reasoning="Invalid image format or corrupted file",
-                raw_response=""
+                raw_response="",
+                status=STATUS_ERROR,
+                error_type="invalid_image"
             )
 
-        # 获取分类配置
-        categories = config_manager.get_categories()
-        category_keywords = {
-            name: category.keywords
-            for name, category in categories.items()
-        }
+        # 查询结果缓存，命中则无需调用模型
+        cache_key = None
+        if self.cache is not None:
+            with _CACHE_LOOKUP_STAGE.time():
+                cache_key = await get_cpu_executor().run_in_thread(self.cache.make_key, image_data, namespace)
+                cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached
 
-        # 使用模型分类
-        result = await self.model.classify_image(image_data, category_keywords)
+        # 近似重复查询：缩放或重新编码过的同一张图片复用已有结果
+        image_hash = None
+        if self.dedup_index is not None:
+            with _DEDUP_LOOKUP_STAGE.time():
+                image_hash = await self.compute_hash(image_data)
+                duplicate = self.dedup_index.lookup(namespace, image_hash) if image_hash is not None else None
+            if duplicate is not None:
+                DEDUP_HITS.inc()
+                result = duplicate.model_copy()
+                if cache_key is not None:
+                    await self.cache.set(cache_key, result)
+                return result
 
-        return result
+        image.cache_key = cache_key
+        image.image_hash = image_hash
+        return None
+
+    async def _classify_locally(
+        self,
+        pending: List["PendingImage"],
+        results: List[Optional[ClassificationResult]],
+        categories: Dict[str, List[str]]
+    ) -> List["PendingImage"]:
+        """
+        用近邻标签索引和本地预分类器处理待分类的图片
 
-    def _is_valid_image(self, image_data: bytes) -> bool:
-        """验证图片数据是否有效"""
+        先对所有图片批量查询近邻索引，未命中的再交给本地预分类器。置信的结果直接写入 results，返回仍需调用模型的图片。
+        本地结果不写入结果缓存和近似重复索引，模型结果的缓存不会被本地近似结果占据。
+        """
+        with _LOCAL_CLASSIFY_STAGE.time():
+            features = await asyncio.gather(*(extract_image_features(image.image_data) for image in pending))
+        for image, image_features in zip(pending, features):
+            image.features = image_features
+
+        candidates = [image for image in pending if image.features is not None]
+        if self.label_index is not None and candidates:
+            matches = await self.label_index.lookup([image.features for image in candidates], categories)
+            for image, match in zip(candidates, matches):
+                if match is None:
+                    continue
+                result = ClassificationResult(
+                    category=match.category,
+                    confidence=match.confidence,
+                    reasoning=f"Majority label of {match.votes} similar images",
+                    raw_response="",
+                    metadata={"tier": LABEL_INDEX_TIER, "similarity": round(match.similarity, 4)}
+                )
+                results[image.index] = result
+
+        remaining = []
+        for image in pending:
+            if results[image.index] is not None:
+                continue
+            prediction = None
+            if image.features is not None and self.local_classifier is not None:
+                prediction = self.local_classifier.predict(image.features, categories)
+            if prediction is None:
+                remaining.append(image)
+                continue
+            result = ClassificationResult(
+                category=prediction.category,
+                confidence=prediction.confidence,
+                reasoning="Local pre-classifier prediction",
+                raw_response="",
+                metadata={"tier": LOCAL_TIER}
+            )
+            results[image.index] = result
+        return remaining
+
+    async def _preprocess(self, image: "PendingImage") -> None:
+        """缩放并重新编码待上传的图片，失败时保留原图"""
+        image_data = image.image_data
+        image.upload_data = image_data
+        image.metadata = {"original_bytes": len(image_data), "upload_bytes": len(image_data)}
+        if image.info is not None and image.info.valid:
+            image.metadata.update(media_type=image.info.media_type, width=image.info.width, height=image.info.height)
+
+        preprocess_config = config_manager.get_app_config().preprocess
+        if not preprocess_config.enabled:
+            return
         try:
-            # 尝试打开图片
-            image = Image.open(io.BytesIO(image_data))
-            image.verify()  # 验证图片数据
-            return True
+            with _PREPROCESS_STAGE.time():
+                processed = await run_cpu(preprocess_image, image_data, preprocess_config, self.model.upload_formats)
+        except Exception:
+            # 预处理失败时退回原图，交给模型处理
+            return
+
+        image.upload_data = processed.data
+        image.metadata.update(
+            upload_bytes=processed.processed_size,
+            media_type=processed.media_type,
+            width=processed.width,
+            height=processed.height,
+            preprocessed=processed.transformed
+        )
+
+    @staticmethod
+    async def compute_hash(image_data: bytes) -> Optional[int]:
+        """计算感知哈希，图片无法解码时返回None"""
+        dedup_config = config_manager.get_app_config().dedup
+        try:
+            return await run_cpu(compute_image_hash, image_data, dedup_config.algorithm, dedup_config.hash_size)
         except Exception:
-            return False
+            return None
+
+    async def _validate(self, image: "PendingImage") -> bool:
+        """
+        验证图片数据是否有效
+
+        默认只读取文件头（格式、尺寸），结果记录在 image.info 上，文件头读完之前数据就结束的直接拒绝；
+        开启 app.strict_image_validation 或文件头无法解析时，再在CPU执行器中用Pillow完整解析。
+        """
+        with _VALIDATE_STAGE.time():
+            image.info = probe_image(image.image_data)
+            if image.info.truncated:
+                return False
+            if not image.info.valid or config_manager.get_app_config().strict_image_validation:
+                return await run_cpu(verify_image, image.image_data)
+            return True
 
     @staticmethod
     def get_supported_formats() -> List[str]:
@@ -109,42 +412,301 @@ class ImageClassifier:
         return file_extension in ImageClassifier.get_supported_formats()
 
 
+ResultCallback = Callable[[str, ClassificationResult], Any]
+
+
 class BatchClassifier:
     """批量图片分类器"""
 
-    def __init__(self, model_type: Optional[str] = None):
+    def __init__(self, model_type: Optional[str] = None, concurrency: Optional[int] = None):
+        """
+        初始化批量分类器
+
+        Args:
+            model_type: 模型类型，如果不指定则使用配置中的默认模型
+            concurrency: 同时在途的分类请求数，不指定则使用 ImageClassifier.get_concurrency_limit
+        """
         self.classifier = ImageClassifier(model_type)
+        self.concurrency = max(1, concurrency or self.classifier.get_concurrency_limit())
+        # 每次模型请求打包的图片数
+        self.batch_size = max(1, config_manager.get_app_config().provider_batch_size)
 
-    async def classify_directory(self, directory_path: str) -> List[Tuple[str, ClassificationResult]]:
+    async def classify_directory(
+        self,
+        directory_path: str,
+        on_result: Optional[ResultCallback] = None,
+        concurrency: Optional[int] = None
+    ) -> List[Tuple[str, ClassificationResult]]:
         """
-        分类目录中的所有图片
+        并发分类目录中的所有图片
+
+        最多 concurrency 个文件同时处于读取或模型调用阶段；每完成一张图片就调用
+        on_result（按完成顺序），返回值则按文件发现顺序排列。
+        如果不需要完整的结果列表，请使用 iter_directory 以保持内存平稳。
 
         Args:
             directory_path: 目录路径
+            on_result: 可选回调 (文件路径, 分类结果)，可以是普通函数或协程函数
+            concurrency: 覆盖实例的并发数
 
         Returns:
             List[Tuple[str, ClassificationResult]]: (文件名, 分类结果) 的列表
         """
-        results = []
-        directory = Path(directory_path)
+        directory = self._validate_directory(directory_path)
 
+        results: List[Optional[Tuple[str, ClassificationResult]]] = []
+        pending = self._iter_chunks(self._iter_indexed(self.iter_image_files(directory), results), self.batch_size)
+
+        async def worker() -> None:
+            # 所有worker共享同一个迭代器，天然实现任务分发且不会重复
+            for chunk in pending:
+                chunk_results = await self._classify_files([file_path for _, file_path in chunk])
+                for (index, file_path), result in zip(chunk, chunk_results):
+                    results[index] = (file_path, result)
+                    if on_result is not None:
+                        callback_result = on_result(file_path, result)
+                        if inspect.isawaitable(callback_result):
+                            await callback_result
+
+        worker_count = max(1, concurrency or self.concurrency)
+        await asyncio.gather(*(worker() for _ in range(worker_count)))
+
+        return results
+
+    async def iter_directory(
+        self,
+        directory_path: str,
+        concurrency: Optional[int] = None,
+        skip: Optional[Container[str]] = None
+    ) -> AsyncIterator[Tuple[str, ClassificationResult]]:
+        """
+        流式分类目录中的图片，每完成一张就产出一个结果
+
+        文件发现是惰性的，结果按完成顺序产出且不在内存中累积，适合数百万文件的目录：
+
+            async for path, result in batch.iter_directory("photos/"):
+                ...
+
+        Args:
+            directory_path: 目录路径
+            concurrency: 覆盖实例的并发数
+            skip: 需要跳过的文件路径集合（例如从上次中断的结果文件中恢复）
+
+        Yields:
+            Tuple[str, ClassificationResult]: (文件路径, 分类结果)
+        """
+        directory = self._validate_directory(directory_path)
+        worker_count = max(1, concurrency or self.concurrency)
+
+        # 有界队列：消费者处理慢时worker会阻塞，内存占用保持平稳
+        queue: asyncio.Queue = asyncio.Queue(maxsize=worker_count * self.batch_size)
+        done = object()
+        active = worker_count
+        file_paths = self.iter_image_files(directory)
+        if skip:
+            file_paths = (file_path for file_path in file_paths if file_path not in skip)
+        pending = self._iter_chunks(file_paths, self.batch_size)
+
+        async def worker() -> None:
+            nonlocal active
+            try:
+                for chunk in pending:
+                    chunk_results = await self._classify_files(chunk)
+                    for file_path, result in zip(chunk, chunk_results):
+                        await queue.put((file_path, result))
+            except Exception as e:
+                await queue.put(e)
+                return
+
+            active -= 1
+            if active == 0:
+                await queue.put(done)
+
+        tasks = [asyncio.create_task(worker()) for _ in range(worker_count)]
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # 消费者提前退出或出错时取消仍在运行的worker
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def iter_image_files(self, directory: Path) -> Iterator[str]:
+        """
+        惰性遍历目录（含子目录）中支持格式的图片文件
+
+        基于 os.scandir 的深度优先遍历，不会预先生成完整的文件列表。
+        """
+        stack = [str(directory)]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file() and self.classifier.is_supported_format(entry.name):
+                                yield entry.path
+                        except OSError:
+                            continue
+            except OSError:
+                # 无权限或在遍历过程中被删除的目录直接跳过
+                continue
+
+    @staticmethod
+    def _iter_indexed(file_paths: Iterator[str], slots: List[Optional[Any]]) -> Iterator[Tuple[int, str]]:
+        """为每个发现的文件分配结果槽位，保证结果按发现顺序排列"""
+        for file_path in file_paths:
+            slots.append(None)
+            yield len(slots) - 1, file_path
+
+    @staticmethod
+    def _iter_chunks(items: Iterator[Any], size: int) -> Iterator[List[Any]]:
+        """把迭代器按 size 分组，每组对应一次模型请求"""
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _validate_directory(directory_path: str) -> Path:
+        """校验目录是否存在"""
+        directory = Path(directory_path)
         if not directory.exists() or not directory.is_dir():
             raise ValueError(f"Invalid directory: {directory_path}")
+        return directory
+
+    async def classify_directory_clustered(
+        self,
+        directory_path: str,
+        max_distance: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ) -> List[Tuple[str, ClassificationResult]]:
+        """
+        先按感知哈希聚类整个目录，每组近似重复图片只把一张代表图片发送给模型
+
+        Args:
+            directory_path: 目录路径
+            max_distance: 汉明距离阈值，不指定则使用 app.dedup.max_distance
+            concurrency: 覆盖实例的并发数
+
+        Returns:
+            List[Tuple[str, ClassificationResult]]: (文件名, 分类结果) 的列表，按文件发现顺序排列
+        """
+        directory = self._validate_directory(directory_path)
+        if max_distance is None:
+            max_distance = config_manager.get_app_config().dedup.max_distance
+        worker_count = max(1, concurrency or self.concurrency)
+
+        file_paths = list(self.iter_image_files(directory))
+        hashes = await self._run_bounded(file_paths, self._hash_file, worker_count)
+
+        # 无法计算哈希的图片各自成组
+        hashed = [index for index, image_hash in enumerate(hashes) if image_hash is not None]
+        assignments = list(range(len(file_paths)))
+        for index, representative in zip(hashed, cluster_hashes([hashes[i] for i in hashed], max_distance)):
+            assignments[index] = hashed[representative]
+
+        representatives = sorted(set(assignments))
+        chunks = list(self._iter_chunks(iter([file_paths[index] for index in representatives]), self.batch_size))
+        chunk_results = await self._run_bounded(chunks, self._classify_files, worker_count)
+        representative_results = [result for results in chunk_results for result in results]
+        results_by_representative = dict(zip(representatives, representative_results))
+
+        return [
+            (file_path, results_by_representative[representative].model_copy())
+            for file_path, representative in zip(file_paths, assignments)
+        ]
+
+    async def classify_directory_bulk(
+        self,
+        directory_path: str,
+        poll_interval: Optional[float] = None
+    ) -> List[Tuple[str, ClassificationResult]]:
+        """
+        通过厂商的离线批处理接口分类整个目录（OpenAI Batch API / Anthropic Message Batches）
+
+        任务可能需要数小时才能完成，适合不要求实时的大批量回填。
+
+        Args:
+            directory_path: 目录路径
+            poll_interval: 轮询间隔（秒），不指定则使用 app.bulk.poll_interval
+
+        Returns:
+            List[Tuple[str, ClassificationResult]]: (文件名, 分类结果) 的列表，按文件发现顺序排列
+        """
+        from .bulk import BulkBatchClassifier
+
+        directory = self._validate_directory(directory_path)
+        bulk = BulkBatchClassifier(self.classifier, poll_interval=poll_interval)
+        return await bulk.classify_files(list(self.iter_image_files(directory)))
+
+    async def _hash_file(self, file_path: str) -> Optional[int]:
+        """读取文件并计算感知哈希"""
+        try:
+            async with aiofiles.open(file_path, 'rb') as f:
+                image_data = await f.read()
+        except OSError:
+            return None
+        return await self.classifier.compute_hash(image_data)
+
+    @staticmethod
+    async def _run_bounded(items: List[Any], func: Callable[[Any], Any], concurrency: int) -> List[Any]:
+        """以有界并发对每个元素执行协程函数，结果按输入顺序返回"""
+        results: List[Any] = [None] * len(items)
+        pending = iter(enumerate(items))
 
-        # 遍历目录中的所有文件
-        for file_path in directory.rglob('*'):
-            if file_path.is_file() and self.classifier.is_supported_format(file_path.name):
-                try:
-                    result = await self.classifier.classify_image_file(str(file_path))
-                    results.append((str(file_path), result))
-                except Exception as e:
-                    # 如果分类失败，创建错误结果
-                    error_result = ClassificationResult(
-                        category="unknown",
-                        confidence=0.0,
-                        reasoning=f"Classification failed: {str(e)}",
-                        raw_response=""
-                    )
-                    results.append((str(file_path), error_result))
-
-        return results
\ No newline at end of file
+        async def worker() -> None:
+            for index, item in pending:
+                results[index] = await func(item)
+
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, len(items)))))
+        return results
+
+    async def _classify_files(self, file_paths: List[str]) -> List[ClassificationResult]:
+        """读取并分类一组文件（一次模型请求），失败时返回错误结果而不是抛出异常"""
+        images = await asyncio.gather(*(self._read_file(file_path) for file_path in file_paths), return_exceptions=True)
+        results: List[Optional[ClassificationResult]] = [
+            self._error_result(image) if isinstance(image, BaseException) else None
+            for image in images
+        ]
+
+        readable = [index for index, result in enumerate(results) if result is None]
+        if readable:
+            try:
+                classified = await self.classifier.classify_images_data([images[index] for index in readable])
+            except Exception as e:
+                classified = [self._error_result(e) for _ in readable]
+            for index, result in zip(readable, classified):
+                results[index] = result
+
+        return results
+
+    @staticmethod
+    async def _read_file(file_path: str) -> bytes:
+        async with aiofiles.open(file_path, 'rb') as f:
+            return await f.read()
+
+    @staticmethod
+    def _error_result(error: BaseException) -> ClassificationResult:
+        # 如果分类失败，创建错误结果
+        info = classify_error(error)
+        return ClassificationResult(
+            category="unknown",
+            confidence=0.0,
+            reasoning=f"Classification failed: {str(error)}",
+            raw_response="",
+            status=STATUS_TRANSIENT_ERROR if info.retryable else STATUS_ERROR,
+            error_type=info.kind
+        )
@@ -0,0 +1,221 @@
+"""感知哈希与近似重复图片索引"""
+
+import io
+from functools import lru_cache
+from typing import Any, Dict, Generic, List, Optional, Tuple, TypeVar
+
+import numpy as np
+from PIL import Image
+
+from ..utils.config import DedupConfig, config_manager
+
+T = TypeVar("T")
+
+HASH_ALGORITHMS = ("ahash", "dhash", "phash")
+
+
+def _load_grayscale(image_data: bytes, width: int, height: int) -> np.ndarray:
+    """解码并缩放为灰度矩阵"""
+    with Image.open(io.BytesIO(image_data)) as image:
+        # JPEG可以直接按缩小的尺寸解码，避免完整解码大图
+        image.draft("L", (width * 4, height * 4))
+        gray = image.convert("L").resize((width, height), Image.Resampling.LANCZOS)
+    return np.asarray(gray, dtype=np.float32)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+@lru_cache(maxsize=8)
+def _dct_matrix(size: int) -> np.ndarray:
+    """DCT-II 变换矩阵"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2.0 / size)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+def average_hash(image_data: bytes, hash_size: int = 8) -> int:
+    """均值哈希：像素是否高于平均亮度"""
+    pixels = _load_grayscale(image_data, hash_size, hash_size)
+    return _bits_to_int(pixels > pixels.mean())
+
+
+def difference_hash(image_data: bytes, hash_size: int = 8) -> int:
+    """差值哈希：相邻像素的亮度梯度方向"""
+    pixels = _load_grayscale(image_data, hash_size + 1, hash_size)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def perceptual_hash(image_data: bytes, hash_size: int = 8) -> int:
+    """DCT感知哈希：低频系数是否高于中位数"""
+    size = hash_size * 4
+    pixels = _load_grayscale(image_data, size, size)
+    dct = _dct_matrix(size)
+    low_freq = (dct @ pixels @ dct.T)[:hash_size, :hash_size]
+    return _bits_to_int(low_freq > np.median(low_freq))
+
+
+_HASH_FUNCTIONS = {
+    "ahash": average_hash,
+    "dhash": difference_hash,
+    "phash": perceptual_hash,
+}
+
+
+def compute_image_hash(image_data: bytes, algorithm: str = "dhash", hash_size: int = 8) -> int:
+    """
+    计算图片的感知哈希
+
+    Args:
+        image_data: 图片二进制数据
+        algorithm: ahash / dhash / phash
+        hash_size: 哈希边长，哈希位数为 hash_size * hash_size
+
+    Returns:
+        int: 感知哈希值
+    """
+    hash_function = _HASH_FUNCTIONS.get(algorithm)
+    if hash_function is None:
+        raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+    return hash_function(image_data, hash_size)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """两个哈希之间的汉明距离"""
+    return (a ^ b).bit_count()
+
+
+class BKTree(Generic[T]):
+    """
+    基于汉明距离的BK树
+
+    利用三角不等式剪枝，查询某个距离阈值内的所有哈希时只需访问一小部分节点。
+    """
+
+    def __init__(self):
+        # 节点格式: [哈希, 值, {距离: 子节点}]
+        self._root: Optional[List[Any]] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, hash_value: int, value: T) -> None:
+        """插入一个哈希及其关联的值，重复哈希会覆盖旧值"""
+        if self._root is None:
+            self._root = [hash_value, value, {}]
+            self._size = 1
+            return
+
+        node = self._root
+        while True:
+            distance = hamming_distance(hash_value, node[0])
+            if distance == 0:
+                node[1] = value
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [hash_value, value, {}]
+                self._size += 1
+                return
+            node = child
+
+    def search(self, hash_value: int, max_distance: int) -> List[Tuple[int, T]]:
+        """查找距离不超过 max_distance 的所有条目，按距离升序返回 (距离, 值)"""
+        if self._root is None:
+            return []
+
+        matches = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(hash_value, node[0])
+            if distance <= max_distance:
+                matches.append((distance, node[1]))
+            low, high = distance - max_distance, distance + max_distance
+            for child_distance, child in node[2].items():
+                if low <= child_distance <= high:
+                    stack.append(child)
+
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def nearest(self, hash_value: int, max_distance: int) -> Optional[Tuple[int, T]]:
+        """查找距离不超过 max_distance 的最近条目"""
+        matches = self.search(hash_value, max_distance)
+        return matches[0] if matches else None
+
+
+class NearDuplicateIndex:
+    """
+    近似重复图片的分类结果索引
+
+    按命名空间（模型 + 分类配置）分别维护BK树，
+    只有相同配置下的结果才会被复用。
+    """
+
+    def __init__(self, max_distance: int = 4):
+        self.max_distance = max_distance
+        self._trees: Dict[str, BKTree] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, namespace: str, hash_value: int) -> Optional[Any]:
+        """查找近似重复图片的结果"""
+        tree = self._trees.get(namespace)
+        match = tree.nearest(hash_value, self.max_distance) if tree is not None else None
+        if match is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return match[1]
+
+    def add(self, namespace: str, hash_value: int, value: Any) -> None:
+        """记录一张已分类图片"""
+        self._trees.setdefault(namespace, BKTree()).add(hash_value, value)
+
+    def stats(self) -> Dict[str, int]:
+        """获取命中统计"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": sum(len(tree) for tree in self._trees.values()),
+        }
+
+
+def cluster_hashes(hashes: List[int], max_distance: int) -> List[int]:
+    """
+    将哈希聚类为近似重复组
+
+    按顺序贪心聚类：每个哈希归入第一个距离不超过阈值的代表元，否则自己成为新的代表元。
+
+    Returns:
+        List[int]: 每个哈希对应的代表元下标
+    """
+    representatives: BKTree[int] = BKTree()
+    assignments = []
+    for index, hash_value in enumerate(hashes):
+        match = representatives.nearest(hash_value, max_distance)
+        if match is None:
+            representatives.add(hash_value, index)
+            assignments.append(index)
+        else:
+            assignments.append(match[1])
+    return assignments
+
+
+_dedup_index: Optional[NearDuplicateIndex] = None
+
+
+def get_dedup_index() -> Optional[NearDuplicateIndex]:
+    """获取全局近似重复索引，未启用时返回None"""
+    global _dedup_index
+    dedup_config: DedupConfig = config_manager.get_app_config().dedup
+    if not dedup_config.enabled:
+        return None
+    if _dedup_index is None:
+        _dedup_index = NearDuplicateIndex(dedup_config.max_distance)
+    return _dedup_index
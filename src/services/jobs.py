@@ -0,0 +1,302 @@
+"""后台分类任务队列"""
+
+import asyncio
+import json
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Set
+
+from ..models import ClassificationResult, STATUS_TRANSIENT_ERROR
+from ..utils.config import JobsConfig, config_manager
+from .classifier import BatchClassifier
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+class JobStore:
+    """任务状态与结果的SQLite持久化"""
+
+    def __init__(self, db_path: str):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, source TEXT NOT NULL, model_type TEXT NOT NULL, "
+                "status TEXT NOT NULL, total INTEGER, completed INTEGER NOT NULL DEFAULT 0, "
+                "error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS job_results ("
+                "job_id TEXT NOT NULL, seq INTEGER NOT NULL, path TEXT NOT NULL, result TEXT NOT NULL, "
+                "PRIMARY KEY (job_id, path))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_job_results_seq ON job_results (job_id, seq)")
+            self._db.commit()
+
+    def create(self, job_id: str, source: str, model_type: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, source, model_type, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, source, model_type, QUEUED, now, now)
+            )
+            self._db.commit()
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0] for column in cursor.description], row))
+
+    def list_ids(self, statuses: tuple) -> List[str]:
+        placeholders = ", ".join("?" for _ in statuses)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at", statuses
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def add_result(self, job_id: str, file_path: str, result: ClassificationResult) -> None:
+        """记录一个已完成文件并更新进度"""
+        with self._lock:
+            # 序号取该任务当前最大序号加一，走 (job_id, seq) 索引，不随结果数增长变慢
+            self._db.execute(
+                "INSERT OR REPLACE INTO job_results (job_id, seq, path, result) "
+                "VALUES (?, (SELECT COALESCE(MAX(seq), -1) + 1 FROM job_results WHERE job_id = ?), ?, ?)",
+                (job_id, job_id, file_path, result.model_dump_json())
+            )
+            self._db.execute(
+                "UPDATE jobs SET completed = completed + 1, updated_at = ? WHERE id = ?",
+                (time.time(), job_id)
+            )
+            self._db.commit()
+
+    def completed_paths(self, job_id: str) -> Set[str]:
+        """已完成的文件路径；临时错误的文件不算完成，续跑时会重新分类"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path FROM job_results WHERE job_id = ? AND json_extract(result, '$.status') IS NOT ?",
+                (job_id, STATUS_TRANSIENT_ERROR)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def results(self, job_id: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, result FROM job_results WHERE job_id = ? ORDER BY seq LIMIT ? OFFSET ?",
+                (job_id, limit, offset)
+            ).fetchall()
+        return [{"path": path, **json.loads(result)} for path, result in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class JobManager:
+    """
+    后台分类任务管理器
+
+    任务基于 BatchClassifier.iter_directory 运行，每完成一个文件就写入SQLite。
+    进程重启后未完成的任务会重新排队，并跳过已经完成的文件。
+    同时运行的任务数由 app.jobs.max_concurrent_jobs 限制。
+    """
+
+    def __init__(self, config: JobsConfig):
+        self.config = config
+        self.store = JobStore(config.db_path)
+        self.work_dir = Path(config.work_dir)
+        self._slots = asyncio.Semaphore(max(1, config.max_concurrent_jobs))
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def start(self) -> None:
+        """恢复上次未完成的任务"""
+        for job_id in await asyncio.to_thread(self.store.list_ids, ACTIVE_STATUSES):
+            await asyncio.to_thread(self.store.update, job_id, status=QUEUED)
+            self._schedule(job_id)
+
+    async def shutdown(self) -> None:
+        """停止所有运行中的任务，状态保持为进行中以便重启后续跑"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self.store.close()
+
+    async def submit_directory(self, directory_path: str, model_type: Optional[str] = None) -> str:
+        """
+        提交目录分类任务
+
+        Args:
+            directory_path: 服务器上的目录路径，必须位于 app.jobs.allowed_directories 之内（为空时拒绝所有目录）
+            model_type: 模型类型，如果不指定则使用配置中的默认模型
+
+        Returns:
+            str: 任务ID
+        """
+        directory = Path(directory_path).resolve()
+        if not directory.is_dir():
+            raise ValueError(f"Invalid directory: {directory_path}")
+        if not any(directory.is_relative_to(Path(allowed).resolve()) for allowed in self.config.allowed_directories):
+            raise ValueError(f"Directory not allowed: {directory_path}")
+
+        return await self._create(str(directory), model_type)
+
+    async def submit_archive(self, archive: BinaryIO, model_type: Optional[str] = None) -> str:
+        """
+        提交zip压缩包分类任务，压缩包会被解压到 app.jobs.work_dir 下
+
+        解压前检查条目数和解压后的总大小（app.jobs.max_archive_entries / max_extracted_size），超出时拒绝。
+
+        Args:
+            archive: zip文件对象
+            model_type: 模型类型，如果不指定则使用配置中的默认模型
+
+        Returns:
+            str: 任务ID
+        """
+        job_id = uuid.uuid4().hex
+        target = self.work_dir / job_id
+        await asyncio.to_thread(self._extract_archive, archive, target)
+        return await self._create(str(target.resolve()), model_type, job_id)
+
+    def get(self, job_id: str, offset: int = 0, limit: int = 100) -> Optional[Dict[str, Any]]:
+        """获取任务状态和一页已完成的结果"""
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        job["results"] = self.store.results(job_id, offset, limit)
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[str]:
+        """取消任务，返回任务最终状态；任务不存在时返回None"""
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            return None
+
+        task = self._tasks.pop(job_id, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if job["status"] in ACTIVE_STATUSES:
+            await asyncio.to_thread(self.store.update, job_id, status=CANCELLED)
+            await self._remove_extracted(job["source"])
+            return CANCELLED
+        return job["status"]
+
+    async def _create(self, source: str, model_type: Optional[str], job_id: Optional[str] = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        model_type = model_type or config_manager.get_app_config().default_model
+        if config_manager.get_model_config(model_type) is None:
+            raise ValueError(f"Model configuration not found: {model_type}")
+
+        await asyncio.to_thread(self.store.create, job_id, source, model_type)
+        self._schedule(job_id)
+        return job_id
+
+    def _schedule(self, job_id: str) -> None:
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+
+        def forget(finished: asyncio.Task) -> None:
+            if self._tasks.get(job_id) is finished:
+                del self._tasks[job_id]
+
+        task.add_done_callback(forget)
+
+    async def _run(self, job_id: str) -> None:
+        async with self._slots:
+            job = await asyncio.to_thread(self.store.get, job_id)
+            if job is None or job["status"] not in ACTIVE_STATUSES:
+                return
+
+            try:
+                batch = BatchClassifier(job["model_type"])
+                directory = Path(job["source"])
+                completed = await asyncio.to_thread(self.store.completed_paths, job_id)
+                total = await asyncio.to_thread(lambda: sum(1 for _ in batch.iter_image_files(directory)))
+                await asyncio.to_thread(
+                    self.store.update, job_id, status=RUNNING, total=total, completed=len(completed)
+                )
+
+                async for file_path, result in batch.iter_directory(job["source"], skip=completed):
+                    await asyncio.to_thread(self.store.add_result, job_id, file_path, result)
+
+                await asyncio.to_thread(self.store.update, job_id, status=COMPLETED)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await asyncio.to_thread(self.store.update, job_id, status=FAILED, error=str(e))
+            await self._remove_extracted(job["source"])
+
+    async def _remove_extracted(self, source: str) -> None:
+        """任务结束后删除从压缩包解压出的目录；目录任务的源目录不受影响"""
+        directory = Path(source)
+        if directory.is_relative_to(self.work_dir.resolve()):
+            await asyncio.to_thread(shutil.rmtree, directory, True)
+
+    def _extract_archive(self, archive: BinaryIO, target: Path) -> None:
+        try:
+            with zipfile.ZipFile(archive) as zip_file:
+                # 按中央目录记录的条目数和解压后大小拒绝压缩炸弹；解压时 zipfile 最多读出 file_size 个字节，
+                # 记录的大小与实际数据不符时CRC校验失败
+                entries = zip_file.infolist()
+                if len(entries) > self.config.max_archive_entries:
+                    raise ValueError(f"Zip archive has too many entries: {len(entries)} > {self.config.max_archive_entries}")
+                extracted_size = sum(entry.file_size for entry in entries)
+                if extracted_size > self.config.max_extracted_size * 1024 * 1024:
+                    raise ValueError(f"Zip archive too large when extracted (max {self.config.max_extracted_size}MB)")
+
+                target.mkdir(parents=True, exist_ok=True)
+                # extractall 会去掉绝对路径和 ..，不会写出目标目录
+                zip_file.extractall(target)
+        except BaseException as e:
+            # 解压失败（格式错误、超出限制、磁盘写入失败）时不留下解压了一半的目录
+            shutil.rmtree(target, ignore_errors=True)
+            if isinstance(e, zipfile.BadZipFile):
+                raise ValueError("Invalid zip archive") from e
+            raise
+
+
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    """获取全局任务管理器"""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager(config_manager.get_app_config().jobs)
+    return _job_manager
+
+
+async def shutdown_job_manager() -> None:
+    """停止全局任务管理器"""
+    global _job_manager
+    if _job_manager is not None:
+        await _job_manager.shutdown()
+        _job_manager = None
@@ -0,0 +1,258 @@
+"""已分类图片的近邻标签索引：内存映射的特征矩阵，批量余弦相似度查询 top-k 近邻"""
+
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..models import ClassificationResult
+from ..utils.config import LabelIndexConfig, config_manager
+from ..utils.executor import get_cpu_executor
+from ..utils.metrics import counter
+from .local_classifier import FEATURE_DIM, LOCAL_TIER
+
+LABEL_INDEX_LOOKUPS = counter(
+    "image_classifier_label_index_lookups_total",
+    "Nearest-neighbour label index lookups (hit / miss)",
+    ("outcome",)
+)
+
+# 近邻索引结果的 metadata.tier，这类结果不会再写入索引
+LABEL_INDEX_TIER = "label_index"
+
+_VECTORS_FILE = "vectors.f32"
+_LABELS_FILE = "labels.i32"
+_VOCAB_FILE = "categories.json"
+
+
+@dataclass
+class LabelMatch:
+    """近邻投票结果"""
+    category: str
+    confidence: float  # 多数标签在 top-k 近邻中的票数占比
+    similarity: float  # 投票近邻的平均余弦相似度
+    votes: int
+
+
+class LabelIndex:
+    """
+    持久化的近邻标签索引（单个结果命名空间）
+
+    特征向量归一化后以 float32 逐行追加到 vectors.f32，标签编号以 int32 追加到 labels.i32，
+    类别名保存在 categories.json。追加只写文件末尾，不重写已有数据；查询时用 np.memmap
+    按块映射特征矩阵，每块做一次 (查询数 x 块行数) 的矩阵乘法并合并各块的 top-k，
+    内存占用只与块大小有关，可以支持数百万行。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dim: int = FEATURE_DIM,
+        top_k: int = 5,
+        min_similarity: float = 0.97,
+        min_votes: int = 3,
+        min_label_confidence: float = 0.8,
+        chunk_rows: int = 65536
+    ):
+        self.path = path
+        self.dim = dim
+        self.top_k = top_k
+        self.min_similarity = min_similarity
+        self.min_votes = min_votes
+        self.min_label_confidence = min_label_confidence
+        self.chunk_rows = chunk_rows
+
+        self._vectors_path = os.path.join(path, _VECTORS_FILE)
+        self._labels_path = os.path.join(path, _LABELS_FILE)
+        self._vocab_path = os.path.join(path, _VOCAB_FILE)
+        self._lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        self.categories: List[str] = []
+        if os.path.exists(self._vocab_path):
+            with open(self._vocab_path, "r", encoding="utf-8") as f:
+                self.categories = json.load(f)
+        self._category_ids = {name: index for index, name in enumerate(self.categories)}
+        self._rows = self._recover()
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def _recover(self) -> int:
+        """按两个文件中较短的一个确定行数，截掉中断写入留下的不完整行"""
+        row_bytes = self.dim * 4
+        vector_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        label_rows = os.path.getsize(self._labels_path) // 4 if os.path.exists(self._labels_path) else 0
+        rows = min(vector_rows, label_rows)
+        for file_path, size in ((self._vectors_path, rows * row_bytes), (self._labels_path, rows * 4)):
+            if os.path.exists(file_path) and os.path.getsize(file_path) != size:
+                with open(file_path, "r+b") as f:
+                    f.truncate(size)
+        return rows
+
+    def _category_id(self, category: str) -> int:
+        """类别编号，新类别追加到词表（词表很小，整体原子替换）"""
+        category_id = self._category_ids.get(category)
+        if category_id is None:
+            category_id = len(self.categories)
+            self.categories.append(category)
+            self._category_ids[category] = category_id
+            temp_path = f"{self._vocab_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.categories, f, ensure_ascii=False)
+            os.replace(temp_path, self._vocab_path)
+        return category_id
+
+    def accepts(self, result: ClassificationResult) -> bool:
+        """只写入成功、置信度足够且来自模型的结果"""
+        return (
+            result.ok
+            and result.confidence >= self.min_label_confidence
+            and result.metadata.get("tier") not in (LOCAL_TIER, LABEL_INDEX_TIER)
+        )
+
+    def append(self, features: np.ndarray, categories: Sequence[str]) -> None:
+        """
+        追加若干行（同步，在线程中调用）
+
+        Args:
+            features: (行数, dim) 特征矩阵，写入前按行归一化
+            categories: 每行的类别名
+        """
+        if not len(categories):
+            return
+        vectors = np.asarray(features, dtype=np.float32).reshape(len(categories), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+        with self._lock:
+            labels = np.array([self._category_id(category) for category in categories], dtype=np.int32)
+            # 先写特征再写标签，中断时多出的特征行会在下次打开时截掉
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.astype(np.float32, copy=False).tobytes())
+            with open(self._labels_path, "ab") as f:
+                f.write(labels.tobytes())
+            self._rows += len(labels)
+
+    def search(self, queries: np.ndarray, k: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量查询余弦相似度最高的 k 个近邻（同步，在线程中调用）
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (相似度, 行号)，形状均为 (查询数, k')，k' = min(k, 行数)，按相似度降序
+        """
+        k = k or self.top_k
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        rows = self._rows
+        k = min(k, rows)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        if k == 0:
+            return best_scores, best_ids
+
+        # 只映射查询开始时已写完的行，查询期间的追加不影响本次结果
+        vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        for start in range(0, rows, self.chunk_rows):
+            chunk = vectors[start:start + self.chunk_rows]
+            scores = queries @ chunk.T
+            if scores.shape[1] > k:
+                top = np.argpartition(scores, -k, axis=1)[:, -k:]
+                scores = np.take_along_axis(scores, top, axis=1)
+            else:
+                top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+            # 与之前各块的 top-k 合并
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_ids = np.concatenate([best_ids, top + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(best_scores, -k, axis=1)[:, -k:]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_ids = np.take_along_axis(best_ids, keep, axis=1)
+        del vectors
+
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_ids, order, axis=1)
+
+    def vote(self, queries: np.ndarray, allowed: Sequence[str]) -> List[Optional[LabelMatch]]:
+        """
+        查询近邻并对相似度达到阈值的近邻做多数投票（同步，在线程中调用）
+
+        Args:
+            queries: (查询数, dim) 特征矩阵
+            allowed: 当前分类配置中的类别，不在其中的标签不参与投票
+
+        Returns:
+            List[Optional[LabelMatch]]: 每个查询的投票结果，票数不足 min_votes 时为None
+        """
+        scores, ids = self.search(queries)
+        matches: List[Optional[LabelMatch]] = [None] * len(scores)
+        if ids.size == 0:
+            return matches
+        labels = np.memmap(self._labels_path, dtype=np.int32, mode="r", shape=(self._rows,))[ids]
+        allowed = set(allowed)
+        for row, (row_scores, row_labels) in enumerate(zip(scores, labels)):
+            close = row_scores >= self.min_similarity
+            if close.sum() < self.min_votes:
+                continue
+            votes: Dict[int, List[float]] = {}
+            for label, score in zip(row_labels[close], row_scores[close]):
+                votes.setdefault(int(label), []).append(float(score))
+            label, label_scores = max(votes.items(), key=lambda item: len(item[1]))
+            category = self.categories[label]
+            if len(label_scores) < self.min_votes or category not in allowed:
+                continue
+            matches[row] = LabelMatch(
+                category=category,
+                confidence=len(label_scores) / int(close.sum()),
+                similarity=sum(label_scores) / len(label_scores),
+                votes=len(label_scores)
+            )
+        return matches
+
+    async def lookup(self, features: List[np.ndarray], allowed: Sequence[str]) -> List[Optional[LabelMatch]]:
+        """在线程池中批量查询（numpy矩阵运算会释放GIL）"""
+        if not features or self._rows == 0:
+            return [None] * len(features)
+        matches = await get_cpu_executor().run_in_thread(self.vote, np.stack(features), list(allowed))
+        for match in matches:
+            LABEL_INDEX_LOOKUPS.labels("hit" if match is not None else "miss").inc()
+        return matches
+
+    async def add(self, features: List[np.ndarray], results: List[ClassificationResult]) -> None:
+        """在线程池中追加模型给出的结果"""
+        rows = [(vector, result.category) for vector, result in zip(features, results) if self.accepts(result)]
+        if rows:
+            await get_cpu_executor().run_in_thread(
+                self.append, np.stack([vector for vector, _ in rows]), [category for _, category in rows]
+            )
+
+    @classmethod
+    def from_config(cls, path: str, index_config: LabelIndexConfig) -> "LabelIndex":
+        return cls(
+            path,
+            top_k=index_config.top_k,
+            min_similarity=index_config.min_similarity,
+            min_votes=index_config.min_votes,
+            min_label_confidence=index_config.min_label_confidence,
+            chunk_rows=index_config.chunk_rows
+        )
+
+
+_label_indexes: Dict[str, LabelIndex] = {}
+
+
+def get_label_index(namespace: str) -> Optional[LabelIndex]:
+    """获取结果命名空间对应的近邻标签索引，未启用时返回None"""
+    index_config: LabelIndexConfig = config_manager.get_app_config().label_index
+    if not index_config.enabled:
+        return None
+    index = _label_indexes.get(namespace)
+    if index is None:
+        # 不同模型和分类配置的结果分目录保存，互不混用
+        directory = hashlib.sha256(namespace.encode("utf-8")).hexdigest()[:16]
+        index = LabelIndex.from_config(os.path.join(index_config.path, directory), index_config)
+        _label_indexes[namespace] = index
+    return index
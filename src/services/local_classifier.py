@@ -0,0 +1,380 @@
+"""本地CPU预分类：用模型已给出的结果训练线性分类头，置信度足够时跳过模型调用"""
+
+import asyncio
+import hashlib
+import io
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from ..models import ClassificationResult
+from ..utils.config import LocalClassifierConfig, config_manager
+from ..utils.executor import get_cpu_executor
+from ..utils.metrics import counter
+
+LOCAL_PREDICTIONS = counter(
+    "image_classifier_local_predictions_total",
+    "Local pre-classifier decisions (accepted / escalated)",
+    ("outcome",)
+)
+
+# 特征提取前把图片缩放到的边长
+FEATURE_IMAGE_SIZE = 64
+# HSV颜色直方图的分桶数（色相 x 饱和度 x 明度）
+HSV_BINS = (8, 3, 3)
+# 梯度方向直方图：空间网格 x 方向数
+GRADIENT_GRID = 2
+GRADIENT_ORIENTATIONS = 9
+# 灰度缩略图边长
+THUMBNAIL_SIZE = 8
+FEATURE_DIM = int(np.prod(HSV_BINS)) + GRADIENT_GRID ** 2 * GRADIENT_ORIENTATIONS + THUMBNAIL_SIZE ** 2 + 6
+
+# 本地预分类结果的 metadata.tier，这类结果不会再作为训练样本
+LOCAL_TIER = "local"
+
+# 留出验证集的比例和最少样本数
+VALIDATION_FRACTION = 0.2
+MIN_VALIDATION_EXAMPLES = 20
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+def extract_features(image_data: bytes) -> np.ndarray:
+    """
+    提取图片的紧凑特征向量（float32，长度 FEATURE_DIM）
+
+    颜色直方图、梯度方向直方图、灰度缩略图和RGB均值/标准差各自归一化后拼接。
+    JPEG 通过 draft 在解码阶段直接缩小，不需要完整解码大图。
+    """
+    with Image.open(io.BytesIO(image_data)) as image:
+        image.draft("RGB", (FEATURE_IMAGE_SIZE * 2, FEATURE_IMAGE_SIZE * 2))
+        image = image.convert("RGB").resize((FEATURE_IMAGE_SIZE, FEATURE_IMAGE_SIZE), Image.BILINEAR)
+    rgb = np.asarray(image, dtype=np.float32) / 255.0
+    hsv = np.asarray(image.convert("HSV"), dtype=np.float32) / 256.0
+
+    # 颜色分布
+    bins = np.array(HSV_BINS)
+    indices = np.minimum((hsv * bins).astype(np.int64), bins - 1)
+    flat = (indices[..., 0] * bins[1] + indices[..., 1]) * bins[2] + indices[..., 2]
+    color = np.bincount(flat.ravel(), minlength=int(np.prod(bins))).astype(np.float32)
+
+    # 纹理与形状：按空间网格统计以梯度幅值加权的方向直方图
+    gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    gx = np.zeros_like(gray)
+    gy = np.zeros_like(gray)
+    gx[:, 1:-1] = gray[:, 2:] - gray[:, :-2]
+    gy[1:-1, :] = gray[2:, :] - gray[:-2, :]
+    magnitude = np.hypot(gx, gy)
+    orientation = np.minimum(
+        ((np.arctan2(gy, gx) % np.pi) / np.pi * GRADIENT_ORIENTATIONS).astype(np.int64), GRADIENT_ORIENTATIONS - 1
+    )
+    cell = FEATURE_IMAGE_SIZE // GRADIENT_GRID
+    cells = (np.arange(FEATURE_IMAGE_SIZE) // cell)
+    cell_index = cells[:, None] * GRADIENT_GRID + cells[None, :]
+    gradient = np.bincount(
+        (cell_index * GRADIENT_ORIENTATIONS + orientation).ravel(),
+        weights=magnitude.ravel(),
+        minlength=GRADIENT_GRID ** 2 * GRADIENT_ORIENTATIONS
+    ).astype(np.float32)
+
+    # 整体构图
+    step = FEATURE_IMAGE_SIZE // THUMBNAIL_SIZE
+    thumbnail = gray.reshape(THUMBNAIL_SIZE, step, THUMBNAIL_SIZE, step).mean(axis=(1, 3)).ravel()
+    thumbnail = thumbnail - thumbnail.mean()
+
+    stats = np.concatenate([rgb.mean(axis=(0, 1)), rgb.std(axis=(0, 1))])
+    return np.concatenate([
+        _normalize(color), _normalize(gradient), _normalize(thumbnail), stats
+    ]).astype(np.float32)
+
+
+async def extract_image_features(image_data: bytes) -> Optional[np.ndarray]:
+    """在CPU执行器中提取特征，无法解码时返回None"""
+    try:
+        return await get_cpu_executor().run(extract_features, image_data)
+    except Exception:
+        return None
+
+
+class SoftmaxHead:
+    """多分类逻辑回归（softmax），输入特征先按训练集的均值和标准差标准化"""
+
+    def __init__(self, classes: List[str], weights: np.ndarray, bias: np.ndarray, mean: np.ndarray, scale: np.ndarray):
+        self.classes = classes
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.scale = scale
+
+    @classmethod
+    def fit(
+        cls,
+        features: np.ndarray,
+        labels: np.ndarray,
+        classes: List[str],
+        epochs: int = 300,
+        learning_rate: float = 0.5,
+        l2: float = 1e-3
+    ) -> "SoftmaxHead":
+        """全批量梯度下降训练，labels 为 classes 中的下标"""
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0) + 1e-6
+        x = (features - mean) / scale
+        targets = np.eye(len(classes), dtype=np.float32)[labels]
+        weights = np.zeros((x.shape[1], len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+
+        for _ in range(epochs):
+            probabilities = cls._softmax(x @ weights + bias)
+            error = (probabilities - targets) / len(x)
+            weights -= learning_rate * (x.T @ error + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+        return cls(classes, weights, bias, mean, scale)
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """每行一张图片，返回各类别的概率"""
+        return self._softmax(((features - self.mean) / self.scale) @ self.weights + self.bias)
+
+
+@dataclass
+class LocalPrediction:
+    """本地预分类的结果"""
+    category: str
+    confidence: float
+
+
+class LocalClassifier:
+    """
+    本地预分类器
+
+    模型返回的高置信度结果连同图片特征作为训练样本保存；样本数达到 min_examples 后训练 SoftmaxHead，
+    之后新图片先在本地打分，最高概率不低于 threshold 时直接返回结果，否则交给模型。
+    训练时留出一部分样本验证，验证集上超过阈值的预测精确率低于 min_precision 时不短路，全部交给模型。
+    """
+
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        threshold: float = 0.9,
+        min_examples: int = 200,
+        min_label_confidence: float = 0.8,
+        min_precision: float = 0.95,
+        retrain_every: int = 100,
+        max_examples: int = 100000
+    ):
+        self.model_path = model_path
+        self.threshold = threshold
+        self.min_examples = min_examples
+        self.min_label_confidence = min_label_confidence
+        self.min_precision = min_precision
+        self.retrain_every = retrain_every
+        self.max_examples = max_examples
+
+        self.features: List[np.ndarray] = []
+        self.labels: List[str] = []
+        self.head: Optional[SoftmaxHead] = None
+        self.validation_precision: Optional[float] = None
+        self.validation_coverage: Optional[float] = None
+        self._since_training = 0
+        self._training: Optional[asyncio.Task] = None
+
+        if model_path and os.path.exists(model_path):
+            self._load(model_path)
+
+    @property
+    def active(self) -> bool:
+        """是否已训练且验证精确率达标"""
+        return (
+            self.head is not None
+            and self.validation_precision is not None
+            and self.validation_precision >= self.min_precision
+        )
+
+    def predict(self, features: np.ndarray, categories: Sequence[str]) -> Optional[LocalPrediction]:
+        """置信度达到阈值且类别仍在当前分类配置中时返回预测，否则返回None（交给模型）"""
+        if not self.active:
+            if self.head is None and len(self.labels) >= self.min_examples:
+                # 从文件加载的样本在第一次使用时于后台训练，不阻塞构造和事件循环
+                self._schedule_training(save=False)
+            return None
+        probabilities = self.head.predict_proba(features[None, :])[0]
+        best = int(np.argmax(probabilities))
+        category = self.head.classes[best]
+        confidence = float(probabilities[best])
+        if confidence < self.threshold or category not in categories:
+            LOCAL_PREDICTIONS.labels("escalated").inc()
+            return None
+        LOCAL_PREDICTIONS.labels("accepted").inc()
+        return LocalPrediction(category, confidence)
+
+    def add_example(self, features: np.ndarray, result: ClassificationResult) -> None:
+        """记录一条模型给出的结果作为训练样本，累计足够的新样本后在后台重新训练"""
+        if not self._append(features, result):
+            return
+
+        self._since_training += 1
+        if len(self.labels) >= self.min_examples and (self.head is None or self._since_training >= self.retrain_every):
+            self._schedule_training()
+
+    def _schedule_training(self, save: bool = True) -> None:
+        """没有正在进行的训练时在后台开始一次训练"""
+        if self._training is None or self._training.done():
+            self._since_training = 0
+            self._training = asyncio.ensure_future(self.retrain(save))
+
+    def _append(self, features: np.ndarray, result: ClassificationResult) -> bool:
+        """只保留成功、置信度足够且来自模型（而不是本地预分类）的结果"""
+        if not result.ok or result.confidence < self.min_label_confidence or result.metadata.get("tier") == LOCAL_TIER:
+            return False
+        self.features.append(features)
+        self.labels.append(result.category)
+        if len(self.labels) > self.max_examples:
+            # 保留最近的样本
+            del self.features[:-self.max_examples]
+            del self.labels[:-self.max_examples]
+        return True
+
+    async def train_from_results(self, results: Iterable[Tuple[str, ClassificationResult]]) -> int:
+        """
+        用已有的模型结果（例如 BatchClassifier 的输出或 load_results 读取的结果文件）训练
+
+        Args:
+            results: (图片文件路径, 分类结果)
+
+        Returns:
+            int: 新增的训练样本数
+        """
+        added = 0
+        for file_path, result in results:
+            if not result.ok:
+                continue
+            try:
+                with open(file_path, "rb") as f:
+                    image_data = f.read()
+            except OSError:
+                continue
+            features = await extract_image_features(image_data)
+            if features is not None and self._append(features, result):
+                added += 1
+        if added and len(self.labels) >= self.min_examples:
+            self._since_training = 0
+            await self.retrain()
+        return added
+
+    async def retrain(self, save: bool = True) -> None:
+        """在线程池中训练并替换分类头（numpy矩阵运算会释放GIL），save 为False时不重新保存样本"""
+        features = np.stack(self.features)
+        labels = list(self.labels)
+        head, precision, coverage = await get_cpu_executor().run_in_thread(
+            self._train, features, labels, self.threshold
+        )
+        self.head, self.validation_precision, self.validation_coverage = head, precision, coverage
+        if save and self.model_path:
+            await get_cpu_executor().run_in_thread(self._save, self.model_path, features, labels)
+
+    @staticmethod
+    def _train(
+        features: np.ndarray, labels: List[str], threshold: float
+    ) -> Tuple[Optional[SoftmaxHead], Optional[float], Optional[float]]:
+        """
+        训练分类头，并在留出的验证集上统计超过阈值的预测的精确率和覆盖率
+
+        Returns:
+            Tuple: (分类头, 精确率, 覆盖率)，只有一个类别时无法训练，返回 (None, None, None)
+        """
+        classes = sorted(set(labels))
+        if len(classes) < 2:
+            return None, None, None
+        class_index = {name: index for index, name in enumerate(classes)}
+        targets = np.array([class_index[label] for label in labels])
+
+        order = np.random.default_rng(0).permutation(len(labels))
+        validation_size = int(len(labels) * VALIDATION_FRACTION)
+        if validation_size < MIN_VALIDATION_EXAMPLES:
+            return None, None, None
+        validation, training = order[:validation_size], order[validation_size:]
+
+        head = SoftmaxHead.fit(features[training], targets[training], classes)
+        probabilities = head.predict_proba(features[validation])
+        confident = probabilities.max(axis=1) >= threshold
+        coverage = float(confident.mean())
+        if not confident.any():
+            return head, 0.0, coverage
+        correct = probabilities.argmax(axis=1)[confident] == targets[validation][confident]
+        return head, float(correct.mean()), coverage
+
+    @staticmethod
+    def _save(path: str, features: np.ndarray, labels: List[str]) -> None:
+        """保存训练样本（写临时文件后替换，避免中断时损坏）"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.tmp.npz"
+        np.savez_compressed(temp_path, features=features, labels=np.array(labels))
+        os.replace(temp_path, path)
+
+    def _load(self, path: str) -> None:
+        """加载保存的训练样本，分类头在第一次 predict 时于后台训练"""
+        with np.load(path) as data:
+            features = data["features"]
+            labels = [str(label) for label in data["labels"]]
+        if features.ndim != 2 or features.shape[1] != FEATURE_DIM:
+            # 特征定义变化后旧样本不再可用
+            return
+        self.features = list(features)
+        self.labels = labels
+
+    def stats(self) -> Dict[str, object]:
+        counts: Dict[str, int] = {}
+        for label in self.labels:
+            counts[label] = counts.get(label, 0) + 1
+        return {
+            "examples": len(self.labels),
+            "examples_per_category": counts,
+            "active": self.active,
+            "threshold": self.threshold,
+            "validation_precision": self.validation_precision,
+            "validation_coverage": self.validation_coverage,
+        }
+
+    @classmethod
+    def from_config(cls, local_config: LocalClassifierConfig) -> "LocalClassifier":
+        return cls(
+            model_path=local_config.model_path,
+            threshold=local_config.threshold,
+            min_examples=local_config.min_examples,
+            min_label_confidence=local_config.min_label_confidence,
+            min_precision=local_config.min_precision,
+            retrain_every=local_config.retrain_every,
+            max_examples=local_config.max_examples
+        )
+
+
+_local_classifiers: Dict[str, LocalClassifier] = {}
+
+
+def get_local_classifier(namespace: str) -> Optional[LocalClassifier]:
+    """获取结果命名空间对应的本地预分类器，未启用时返回None"""
+    local_config: LocalClassifierConfig = config_manager.get_app_config().local_classifier
+    if not local_config.enabled:
+        return None
+    local_classifier = _local_classifiers.get(namespace)
+    if local_classifier is None:
+        # 不同模型和分类配置的训练样本分文件保存，互不混用
+        model_path = local_config.model_path
+        if model_path:
+            root, extension = os.path.splitext(model_path)
+            model_path = f"{root}-{hashlib.sha256(namespace.encode('utf-8')).hexdigest()[:16]}{extension}"
+        local_classifier = LocalClassifier.from_config(local_config.model_copy(update={"model_path": model_path}))
+        _local_classifiers[namespace] = local_classifier
+    return local_classifier
@@ -0,0 +1,126 @@
+"""上传前的图片预处理（缩放与重新编码）"""
+
+import io
+from dataclasses import dataclass
+from typing import FrozenSet
+
+from PIL import Image, ImageOps
+
+from ..utils.config import PreprocessConfig
+from ..utils.image_probe import MEDIA_TYPES
+
+# 各厂商都接受、可以原样上传的格式；GIF 只对声明支持的厂商原样上传，BMP等格式总是重新编码
+PASSTHROUGH_FORMATS = frozenset(["JPEG", "PNG", "WEBP"])
+
+
+@dataclass
+class PreprocessedImage:
+    """预处理后的图片"""
+    data: bytes
+    media_type: str
+    original_size: int
+    width: int
+    height: int
+    transformed: bool
+
+    @property
+    def processed_size(self) -> int:
+        return len(self.data)
+
+
+def verify_image(image_data: bytes) -> bool:
+    """用Pillow完整校验图片数据是否有效（较慢，日常校验使用 probe_image 只读文件头）"""
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            image.verify()
+        return True
+    except Exception:
+        return False
+
+
+def _flatten_alpha(image: Image.Image, background: str) -> Image.Image:
+    """把带透明通道的图片合成到纯色背景上"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        canvas = Image.new("RGB", rgba.size, background)
+        canvas.paste(rgba, mask=rgba.getchannel("A"))
+        return canvas
+    return image.convert("RGB") if image.mode != "RGB" else image
+
+
+def preprocess_image(
+    image_data: bytes,
+    config: PreprocessConfig,
+    passthrough_formats: FrozenSet[str] = PASSTHROUGH_FORMATS
+) -> PreprocessedImage:
+    """
+    缩放并重新编码图片，供所有模型共用
+
+    多模态模型会在服务端把图片降采样，上传原图只会增加请求体积和延迟。
+    已经足够小的图片原样返回。
+
+    Args:
+        image_data: 原始图片二进制数据
+        config: 预处理配置
+        passthrough_formats: 目标厂商接受、可以原样上传的格式（Pillow格式名），其他格式总是重新编码
+
+    Returns:
+        PreprocessedImage: 预处理结果
+    """
+    original_size = len(image_data)
+    with Image.open(io.BytesIO(image_data)) as image:
+        source_format = image.format or "JPEG"
+        width, height = image.size
+        long_edge = max(width, height)
+        orientation = image.getexif().get(0x0112, 1)
+
+        needs_resize = long_edge > config.max_long_edge
+        if (
+            not needs_resize
+            and orientation == 1
+            and original_size <= config.passthrough_max_bytes
+            and source_format in passthrough_formats
+        ):
+            return PreprocessedImage(
+                data=image_data,
+                media_type=MEDIA_TYPES[source_format],
+                original_size=original_size,
+                width=width,
+                height=height,
+                transformed=False
+            )
+
+        # JPEG可以直接按缩小的尺寸解码
+        if needs_resize:
+            scale = config.max_long_edge / long_edge
+            image.draft("RGB", (int(width * scale), int(height * scale)))
+
+        processed = ImageOps.exif_transpose(image)
+        processed = _flatten_alpha(processed, config.background_color)
+        if max(processed.size) > config.max_long_edge:
+            processed.thumbnail((config.max_long_edge, config.max_long_edge), Image.Resampling.LANCZOS)
+
+        output_format = config.output_format.upper()
+        buffer = io.BytesIO()
+        processed.save(buffer, format=output_format, quality=config.quality)
+        data = buffer.getvalue()
+
+    # 重新编码反而变大且无需缩放时，保留原图
+    if not needs_resize and orientation == 1 and len(data) >= original_size and source_format in passthrough_formats:
+        return PreprocessedImage(
+            data=image_data,
+            media_type=MEDIA_TYPES[source_format],
+            original_size=original_size,
+            width=width,
+            height=height,
+            transformed=False
+        )
+
+    return PreprocessedImage(
+        data=data,
+        media_type=MEDIA_TYPES.get(output_format, "image/jpeg"),
+        original_size=original_size,
+        width=processed.width,
+        height=processed.height,
+        transformed=True
+    )
@@ -0,0 +1,67 @@
+"""分类器注册表"""
+
+from typing import Dict, Optional
+
+from ..models import ModelFactory
+from ..utils.config import config_manager
+from .classifier import ImageClassifier
+
+
+class ClassifierRegistry:
+    """
+    按模型类型缓存 ImageClassifier 实例
+
+    请求路径上只需一次字典查找；配置重新加载后（config_manager.version 变化）自动重建。
+    """
+
+    def __init__(self):
+        self._classifiers: Dict[str, ImageClassifier] = {}
+        self._config_version = config_manager.version
+
+    def get(self, model_type: Optional[str] = None) -> ImageClassifier:
+        """
+        获取分类器
+
+        Args:
+            model_type: 模型类型，如果不指定则使用配置中的默认模型
+
+        Returns:
+            ImageClassifier: 分类器实例
+        """
+        if self._config_version != config_manager.version:
+            self.clear()
+
+        key = model_type or config_manager.get_app_config().default_model
+        classifier = self._classifiers.get(key)
+        if classifier is None:
+            classifier = ImageClassifier(key)
+            self._classifiers[key] = classifier
+        return classifier
+
+    def warm_up(self) -> Dict[str, str]:
+        """
+        预先创建所有已配置模型的分类器和SDK客户端
+
+        Returns:
+            Dict[str, str]: 模型类型 -> "ready" 或失败原因
+        """
+        status = {}
+        for model_type in ModelFactory.get_available_models():
+            if config_manager.get_model_config(model_type) is None:
+                continue
+            try:
+                self.get(model_type).model.warm_up()
+                status[model_type] = "ready"
+            except Exception as e:
+                # SDK未安装或API密钥未配置的模型不影响启动
+                status[model_type] = str(e)
+        return status
+
+    def clear(self) -> None:
+        """清空已缓存的分类器"""
+        self._classifiers.clear()
+        self._config_version = config_manager.version
+
+
+# 全局分类器注册表
+classifier_registry = ClassifierRegistry()
@@ -0,0 +1,180 @@
+"""分类结果的增量输出"""
+
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Set
+
+from ..models import ClassificationResult, STATUS_TRANSIENT_ERROR
+
+
+class ResultSink:
+    """
+    增量结果写入器基类
+
+    每写入一条结果就刷新到磁盘，进程中途崩溃时已完成的结果不会丢失。
+    可以直接作为 BatchClassifier.classify_directory 的 on_result 回调使用。
+    """
+
+    def __init__(self, output_path: str, append: bool = True):
+        self.output_path = Path(output_path)
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self._resuming = append and self.output_path.exists() and self.output_path.stat().st_size > 0
+        self._file = open(self.output_path, "a" if append else "w", encoding="utf-8", newline="")
+        self.count = 0
+
+    def write(self, file_path: str, result: ClassificationResult) -> None:
+        """写入一条结果"""
+        self._write_record(self._to_record(file_path, result))
+        self._file.flush()
+        self.count += 1
+
+    def __call__(self, file_path: str, result: ClassificationResult) -> None:
+        self.write(file_path, result)
+
+    def _write_record(self, record: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    @staticmethod
+    def _to_record(file_path: str, result: ClassificationResult) -> Dict[str, Any]:
+        return {"path": file_path, **result.model_dump()}
+
+    def close(self) -> None:
+        """关闭输出文件"""
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self) -> "ResultSink":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class JSONLResultSink(ResultSink):
+    """JSON Lines格式的结果写入器，每行一条结果"""
+
+    def __init__(self, output_path: str, append: bool = True):
+        super().__init__(output_path, append)
+        if self._resuming:
+            # 上次崩溃可能留下没有换行的残缺行，先补上换行避免与新记录粘连
+            with open(self.output_path, "rb") as f:
+                f.seek(-1, 2)
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+
+    def _write_record(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    @staticmethod
+    def load_completed(output_path: str) -> Set[str]:
+        """读取已有结果文件中已完成的文件路径，用于断点续跑；临时错误的文件不算完成，续跑时会重新分类"""
+        completed: Set[str] = set()
+        path = Path(output_path)
+        if not path.exists():
+            return completed
+
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    file_path = record["path"]
+                except (ValueError, KeyError):
+                    # 崩溃时可能留下写了一半的最后一行
+                    continue
+                # 同一文件可能出现多次（重跑后追加），以最后一条为准
+                if record.get("status") == STATUS_TRANSIENT_ERROR:
+                    completed.discard(file_path)
+                else:
+                    completed.add(file_path)
+        return completed
+
+
+class CSVResultSink(ResultSink):
+    """CSV格式的结果写入器"""
+
+    def __init__(self, output_path: str, append: bool = True):
+        super().__init__(output_path, append)
+        self._fieldnames = ["path", *ClassificationResult.model_fields]
+        self._writer = csv.DictWriter(self._file, fieldnames=self._fieldnames, extrasaction="ignore")
+        if self._resuming:
+            # 上次崩溃可能留下写了一半的最后一行，截掉它，否则新记录会接在残缺行后面（引号未闭合时还会被并进同一个字段）
+            complete_size = self._complete_size(self.output_path)
+            if complete_size < self.output_path.stat().st_size:
+                os.truncate(self.output_path, complete_size)
+            self._resuming = complete_size > 0
+        if not self._resuming:
+            self._writer.writeheader()
+
+    @staticmethod
+    def _complete_size(output_path: Path) -> int:
+        """最后一条完整记录（以写入器的行结束符结尾、引号已闭合）结束处的字节数"""
+        with open(output_path, "rb") as f:
+            data = f.read()
+
+        consumed = 0
+
+        def lines():
+            nonlocal consumed
+            for line in data.splitlines(keepends=True):
+                consumed += len(line)
+                yield line.decode("utf-8", errors="replace")
+
+        complete_size = 0
+        try:
+            for _ in csv.reader(lines(), strict=True):
+                if data.endswith(b"\r\n", 0, consumed):
+                    complete_size = consumed
+        except csv.Error:
+            # 文件在引号内结束
+            pass
+        return complete_size
+
+    def _write_record(self, record: Dict[str, Any]) -> None:
+        # 嵌套字段序列化为JSON字符串
+        self._writer.writerow({
+            key: json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+            for key, value in record.items()
+        })
+
+    @staticmethod
+    def load_completed(output_path: str) -> Set[str]:
+        """读取已有结果文件中已完成的文件路径，用于断点续跑；临时错误的文件不算完成，续跑时会重新分类"""
+        completed: Set[str] = set()
+        path = Path(output_path)
+        if not path.exists():
+            return completed
+
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                if not row.get("path"):
+                    continue
+                # 同一文件可能出现多次（重跑后追加），以最后一条为准
+                if row.get("status") == STATUS_TRANSIENT_ERROR:
+                    completed.discard(row["path"])
+                else:
+                    completed.add(row["path"])
+        return completed
+
+
+def open_result_sink(output_path: str, append: bool = True) -> ResultSink:
+    """根据文件扩展名（.jsonl / .csv）创建结果写入器"""
+    suffix = Path(output_path).suffix.lower()
+    if suffix in (".jsonl", ".ndjson"):
+        return JSONLResultSink(output_path, append)
+    elif suffix == ".csv":
+        return CSVResultSink(output_path, append)
+    else:
+        raise ValueError(f"Unsupported result file format: {suffix}")
+
+
+def load_completed_paths(output_path: str) -> Set[str]:
+    """读取已有结果文件中已完成的文件路径，文件格式由扩展名决定"""
+    suffix = Path(output_path).suffix.lower()
+    if suffix in (".jsonl", ".ndjson"):
+        return JSONLResultSink.load_completed(output_path)
+    elif suffix == ".csv":
+        return CSVResultSink.load_completed(output_path)
+    else:
+        raise ValueError(f"Unsupported result file format: {suffix}")
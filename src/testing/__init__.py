@@ -0,0 +1,18 @@
+"""测试辅助工具"""
+
+from .fake_batch_server import FakeBatchServer
+from .benchmark import (
+    BenchmarkResult, bench_batch_classifier, bench_http, configure_mock_model, generate_corpus, run_benchmarks,
+    write_report
+)
+
+__all__ = [
+    "FakeBatchServer",
+    "BenchmarkResult",
+    "bench_batch_classifier",
+    "bench_http",
+    "configure_mock_model",
+    "generate_corpus",
+    "run_benchmarks",
+    "write_report"
+]
\ No newline at end of file
@@ -0,0 +1,310 @@
+"""离线压测：生成图片语料，驱动 /classify、/classify_batch 和 BatchClassifier 并统计性能"""
+
+import asyncio
+import json
+import math
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+from ..models import ModelFactory
+from ..services import BatchClassifier, ImageClassifier, classifier_registry
+from ..utils.config import ModelConfig, config_manager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 可以压测的目标
+TARGETS = ("classify", "classify_batch", "batch_classifier")
+
+
+@dataclass
+class BenchmarkResult:
+    """一次压测的统计结果，latencies 为每个请求（BatchClassifier 为每次模型请求）的耗时"""
+    name: str
+    requests: int
+    images: int
+    errors: int
+    wall_seconds: float
+    cpu_seconds: float
+    peak_rss_mb: Optional[float]
+    latencies: List[float] = field(default_factory=list, repr=False)
+
+    @property
+    def throughput(self) -> float:
+        """每秒完成的图片数"""
+        return self.images / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+    def percentile(self, q: float) -> Optional[float]:
+        """延迟分位数（最近秩法），没有样本时返回None"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "requests": self.requests,
+            "images": self.images,
+            "errors": self.errors,
+            "wall_seconds": round(self.wall_seconds, 4),
+            "throughput": round(self.throughput, 2),
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "cpu_seconds": round(self.cpu_seconds, 4),
+            "peak_rss_mb": self.peak_rss_mb,
+        }
+
+    def format(self) -> str:
+        def ms(value: Optional[float]) -> str:
+            return f"{value * 1000:8.1f}" if value is not None else "       -"
+
+        rss = f"{self.peak_rss_mb:8.1f}" if self.peak_rss_mb is not None else "       -"
+        return (
+            f"{self.name:<18} {self.images:>6} {self.errors:>6} {self.throughput:>9.1f} "
+            f"{ms(self.percentile(0.5))} {ms(self.percentile(0.95))} {ms(self.percentile(0.99))} "
+            f"{self.cpu_seconds:>8.2f} {rss}"
+        )
+
+    @staticmethod
+    def header() -> str:
+        return (
+            f"{'target':<18} {'images':>6} {'errors':>6} {'images/s':>9} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'cpu s':>8} {'rss MB':>8}"
+        )
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """进程的峰值常驻内存（MB），不支持的平台返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位，macOS 以字节为单位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class _Measurement:
+    """记录墙钟时间和CPU时间，用于一次压测的整体开销"""
+
+    def __enter__(self) -> "_Measurement":
+        self.wall_started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.wall_seconds = time.perf_counter() - self.wall_started
+        self.cpu_seconds = time.process_time() - self.cpu_started
+
+
+def generate_corpus(
+    directory: str,
+    count: int = 200,
+    size: Sequence[int] = (1024, 768),
+    seed: int = 0,
+    image_format: str = "JPEG"
+) -> List[str]:
+    """
+    生成可复现的测试图片
+
+    每张图片由随机的低分辨率色块放大得到，既接近真实照片的压缩率，
+    感知哈希又互不相同，不会被近似去重合并。
+
+    Returns:
+        List[str]: 图片文件路径
+    """
+    output = Path(directory)
+    output.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    extension = "jpg" if image_format.upper() == "JPEG" else image_format.lower()
+
+    paths = []
+    for index in range(count):
+        blocks = rng.integers(0, 256, size=(12, 16, 3), dtype=np.uint8)
+        image = Image.fromarray(blocks).resize(tuple(size), Image.BILINEAR)
+        path = output / f"bench_{index:05d}.{extension}"
+        image.save(path, format=image_format)
+        paths.append(str(path))
+    return paths
+
+
+def configure_mock_model(name: str = "mock", **mock_options: Any) -> str:
+    """
+    注册（或覆盖）一个 type: mock 的模型配置，并清空已缓存的模型和分类器
+
+    mock_options 对应 MockConfig 的字段，例如 latency=0.05, error_rate=0.01。
+
+    Returns:
+        str: 模型配置名
+    """
+    config = config_manager.get_model_config(name) or ModelConfig()
+    config_manager.config.models[name] = config.model_copy(update={
+        "type": "mock",
+        "mock": config.mock.model_copy(update=mock_options)
+    })
+    ModelFactory.clear()
+    classifier_registry.clear()
+    return name
+
+
+def _disable_cache(classifier: ImageClassifier) -> None:
+    """关闭结果缓存、近似去重、近邻标签索引和本地预分类，保证每张图片都经过完整的处理流程"""
+    classifier.cache = None
+    classifier.dedup_index = None
+    classifier.label_index = None
+    classifier.local_classifier = None
+
+
+async def bench_batch_classifier(
+    model_type: str,
+    directory: str,
+    concurrency: Optional[int] = None,
+    use_cache: bool = False
+) -> BenchmarkResult:
+    """压测 BatchClassifier.iter_directory，延迟按每次模型请求（provider_batch_size 张图片）统计"""
+    batch = BatchClassifier(model_type, concurrency)
+    if not use_cache:
+        _disable_cache(batch.classifier)
+
+    latencies: List[float] = []
+    classify_files = batch._classify_files
+
+    async def timed_classify_files(file_paths: List[str]):
+        started = time.perf_counter()
+        try:
+            return await classify_files(file_paths)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    batch._classify_files = timed_classify_files
+
+    images = errors = 0
+    with _Measurement() as measurement:
+        async for _, result in batch.iter_directory(directory):
+            images += 1
+            errors += not result.ok
+
+    return BenchmarkResult(
+        name="batch_classifier",
+        requests=len(latencies),
+        images=images,
+        errors=errors,
+        wall_seconds=measurement.wall_seconds,
+        cpu_seconds=measurement.cpu_seconds,
+        peak_rss_mb=_peak_rss_mb(),
+        latencies=latencies
+    )
+
+
+async def bench_http(
+    target: str,
+    file_paths: Sequence[str],
+    model_type: str,
+    concurrency: int = 8,
+    batch_size: int = 8,
+    base_url: Optional[str] = None,
+    use_cache: bool = False
+) -> BenchmarkResult:
+    """
+    压测 /classify（每个请求一张图片）或 /classify_batch（每个请求 batch_size 张图片）
+
+    base_url 为空时在进程内通过ASGI调用应用（含 lifespan），不经过网络，结果可复现；
+    此时CPU时间和峰值内存包含服务端。指定 base_url 时压测已启动的服务，只统计客户端开销。
+    """
+    import httpx
+
+    if target not in ("classify", "classify_batch"):
+        raise ValueError(f"Unsupported HTTP target: {target}")
+
+    # 预先读取所有图片，避免把磁盘读取计入请求延迟
+    payloads = [(Path(path).name, Path(path).read_bytes()) for path in file_paths]
+    if target == "classify":
+        groups = [[payload] for payload in payloads]
+    else:
+        groups = [payloads[start:start + batch_size] for start in range(0, len(payloads), batch_size)]
+
+    latencies: List[float] = []
+    counts = {"images": 0, "errors": 0}
+    pending = iter(groups)
+
+    async def worker(client: "httpx.AsyncClient") -> None:
+        for group in pending:
+            files = [("file" if target == "classify" else "files", (name, data, "image/jpeg")) for name, data in group]
+            started = time.perf_counter()
+            response = await client.post(f"/{target}", files=files, data={"model": model_type})
+            latencies.append(time.perf_counter() - started)
+
+            counts["images"] += len(group)
+            if response.status_code != 200:
+                counts["errors"] += len(group)
+                continue
+            body = response.json()
+            outcomes = [body] if target == "classify" else body["results"] + body["errors"]
+            counts["errors"] += sum(1 for outcome in outcomes if "error" in outcome or outcome.get("status") != "ok")
+
+    async def run(client: "httpx.AsyncClient") -> _Measurement:
+        # 只统计请求阶段，不含应用启动和关闭
+        with _Measurement() as measurement:
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        return measurement
+
+    timeout = httpx.Timeout(None)
+    if base_url is not None:
+        async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+            measurement = await run(client)
+    else:
+        from ..app.main import app, lifespan
+
+        async with lifespan(app):
+            if not use_cache:
+                _disable_cache(classifier_registry.get(model_type))
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=timeout) as client:
+                measurement = await run(client)
+
+    return BenchmarkResult(
+        name=target,
+        requests=len(latencies),
+        images=counts["images"],
+        errors=counts["errors"],
+        wall_seconds=measurement.wall_seconds,
+        cpu_seconds=measurement.cpu_seconds,
+        peak_rss_mb=_peak_rss_mb(),
+        latencies=latencies
+    )
+
+
+async def run_benchmarks(
+    directory: str,
+    model_type: str = "mock",
+    targets: Sequence[str] = TARGETS,
+    concurrency: int = 8,
+    batch_size: int = 8,
+    base_url: Optional[str] = None,
+    use_cache: bool = False
+) -> List[BenchmarkResult]:
+    """依次压测各目标，使用同一份图片语料"""
+    file_paths = sorted(str(path) for path in Path(directory).iterdir() if path.is_file())
+    results = []
+    for target in targets:
+        if target == "batch_classifier":
+            results.append(await bench_batch_classifier(model_type, directory, concurrency, use_cache))
+        else:
+            results.append(await bench_http(
+                target, file_paths, model_type, concurrency, batch_size, base_url, use_cache
+            ))
+    return results
+
+
+def write_report(results: Sequence[BenchmarkResult], path: str) -> None:
+    """把压测结果写入JSON文件，便于和上一次的基线对比"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([result.to_dict() for result in results], f, ensure_ascii=False, indent=2)
@@ -0,0 +1,221 @@
+"""模拟OpenAI Batch API和Anthropic Message Batches的本地服务，用于离线批处理测试"""
+
+import json
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+# 根据请求体生成模型响应文本
+Responder = Callable[[Dict[str, Any]], str]
+
+
+def _default_responder(body: Dict[str, Any]) -> str:
+    return "Category: other\nConfidence: 0.5\nReasoning: fake batch response"
+
+
+class FakeBatchServer:
+    """
+    本地批处理模拟服务
+
+    批处理任务在被查询 polls_until_done 次后完成，每个请求的响应由 responder 生成。
+    OpenAI客户端使用 openai_base_url，Anthropic客户端使用 anthropic_base_url：
+
+        async with FakeBatchServer() as server:
+            config = {"api_key": "test", "model": "gpt-4o", "base_url": server.openai_base_url}
+    """
+
+    def __init__(self, responder: Optional[Responder] = None, polls_until_done: int = 1):
+        self.responder = responder or _default_responder
+        self.polls_until_done = polls_until_done
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.submitted_requests: List[Dict[str, Any]] = []
+
+        self._app = web.Application(client_max_size=1024 ** 3)
+        self._app.add_routes([
+            web.post("/v1/files", self._openai_upload_file),
+            web.get("/v1/files/{file_id}/content", self._openai_file_content),
+            web.post("/v1/batches", self._openai_create_batch),
+            web.get("/v1/batches/{batch_id}", self._openai_get_batch),
+            web.post("/v1/messages/batches", self._anthropic_create_batch),
+            web.get("/v1/messages/batches/{batch_id}", self._anthropic_get_batch),
+            web.get("/v1/messages/batches/{batch_id}/results", self._anthropic_results),
+        ])
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    @property
+    def openai_base_url(self) -> str:
+        return f"{self.base_url}/v1"
+
+    @property
+    def anthropic_base_url(self) -> str:
+        return self.base_url
+
+    async def start(self) -> None:
+        """在随机端口上启动服务"""
+        self._runner = web.AppRunner(self._app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeBatchServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.stop()
+
+    def _new_batch(self, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        self.submitted_requests.extend(requests)
+        batch = {"id": f"batch_{uuid.uuid4().hex}", "requests": requests, "polls": 0, "created_at": int(time.time())}
+        self.batches[batch["id"]] = batch
+        return batch
+
+    def _poll(self, batch: Dict[str, Any]) -> bool:
+        batch["polls"] += 1
+        return batch["polls"] >= self.polls_until_done
+
+    # OpenAI
+
+    async def _openai_upload_file(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        upload = form["file"]
+        file_id = f"file-{uuid.uuid4().hex}"
+        self.files[file_id] = upload.file.read()
+        return web.json_response({
+            "id": file_id,
+            "object": "file",
+            "bytes": len(self.files[file_id]),
+            "created_at": int(time.time()),
+            "filename": upload.filename,
+            "purpose": form.get("purpose", "batch"),
+            "status": "processed"
+        })
+
+    async def _openai_file_content(self, request: web.Request) -> web.Response:
+        content = self.files.get(request.match_info["file_id"])
+        if content is None:
+            return web.json_response({"error": {"message": "File not found"}}, status=404)
+        return web.Response(body=content, content_type="application/octet-stream")
+
+    async def _openai_create_batch(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        lines = self.files[body["input_file_id"]].decode("utf-8").splitlines()
+        batch = self._new_batch([json.loads(line) for line in lines if line.strip()])
+        batch.update(input_file_id=body["input_file_id"], endpoint=body["endpoint"])
+        return web.json_response(self._openai_batch_body(batch, "validating"))
+
+    async def _openai_get_batch(self, request: web.Request) -> web.Response:
+        batch = self.batches.get(request.match_info["batch_id"])
+        if batch is None:
+            return web.json_response({"error": {"message": "Batch not found"}}, status=404)
+        if not self._poll(batch):
+            return web.json_response(self._openai_batch_body(batch, "in_progress"))
+
+        if "output_file_id" not in batch:
+            output = "\n".join(
+                json.dumps({
+                    "id": f"batch_req_{index}",
+                    "custom_id": entry["custom_id"],
+                    "response": {
+                        "status_code": 200,
+                        "body": {
+                            "object": "chat.completion",
+                            "choices": [{
+                                "index": 0,
+                                "message": {"role": "assistant", "content": self.responder(entry["body"])},
+                                "finish_reason": "stop"
+                            }]
+                        }
+                    },
+                    "error": None
+                })
+                for index, entry in enumerate(batch["requests"])
+            )
+            batch["output_file_id"] = f"file-{uuid.uuid4().hex}"
+            self.files[batch["output_file_id"]] = output.encode("utf-8")
+        return web.json_response(self._openai_batch_body(batch, "completed"))
+
+    @staticmethod
+    def _openai_batch_body(batch: Dict[str, Any], status: str) -> Dict[str, Any]:
+        return {
+            "id": batch["id"],
+            "object": "batch",
+            "endpoint": batch["endpoint"],
+            "input_file_id": batch["input_file_id"],
+            "completion_window": "24h",
+            "status": status,
+            "output_file_id": batch.get("output_file_id"),
+            "error_file_id": None,
+            "created_at": batch["created_at"],
+            "request_counts": {"total": len(batch["requests"]), "completed": 0, "failed": 0}
+        }
+
+    # Anthropic
+
+    async def _anthropic_create_batch(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        batch = self._new_batch(body["requests"])
+        return web.json_response(self._anthropic_batch_body(batch, "in_progress"))
+
+    async def _anthropic_get_batch(self, request: web.Request) -> web.Response:
+        batch = self.batches.get(request.match_info["batch_id"])
+        if batch is None:
+            return web.json_response({"type": "error", "error": {"message": "Batch not found"}}, status=404)
+        status = "ended" if self._poll(batch) else "in_progress"
+        return web.json_response(self._anthropic_batch_body(batch, status))
+
+    async def _anthropic_results(self, request: web.Request) -> web.Response:
+        batch = self.batches[request.match_info["batch_id"]]
+        lines = "\n".join(
+            json.dumps({
+                "custom_id": entry["custom_id"],
+                "result": {
+                    "type": "succeeded",
+                    "message": {
+                        "id": f"msg_{index}",
+                        "type": "message",
+                        "role": "assistant",
+                        "model": entry["params"]["model"],
+                        "content": [{"type": "text", "text": self.responder(entry["params"])}],
+                        "stop_reason": "end_turn",
+                        "stop_sequence": None,
+                        "usage": {"input_tokens": 0, "output_tokens": 0}
+                    }
+                }
+            })
+            for index, entry in enumerate(batch["requests"])
+        )
+        return web.Response(text=lines, content_type="application/binary")
+
+    def _anthropic_batch_body(self, batch: Dict[str, Any], status: str) -> Dict[str, Any]:
+        ended = status == "ended"
+        count = len(batch["requests"])
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": status,
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0
+            },
+            "created_at": "2024-01-01T00:00:00Z",
+            "expires_at": "2024-01-02T00:00:00Z",
+            "ended_at": "2024-01-01T01:00:00Z" if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{self.base_url}/v1/messages/batches/{batch['id']}/results" if ended else None
+        }
@@ -1,6 +1,9 @@
 """工具模块"""
 
-from .config import config_manager, Config, ConfigManager, ImageCategory, ModelConfig, AppConfig
+from .executor import CPUExecutor, get_cpu_executor, run_cpu, encode_base64, shutdown_cpu_executor
+from .http_client import get_http_client, http_timeout, close_http_clients
+from .image_probe import ImageInfo, probe_image, media_type_of
+from .config import config_manager, Config, ConfigManager, ImageCategory, ModelConfig, RouterConfig, HttpClientConfig, AppConfig, CacheConfig, DedupConfig, PreprocessConfig, JobsConfig, BulkConfig, AdaptiveConcurrencyConfig, MockConfig, LocalClassifierConfig, LabelIndexConfig
 
 __all__ = [
     "config_manager",
@@ -8,5 +11,27 @@ __all__ = [
     "ConfigManager",
     "ImageCategory",
     "ModelConfig",
-    "AppConfig"
+    "RouterConfig",
+    "HttpClientConfig",
+    "AdaptiveConcurrencyConfig",
+    "MockConfig",
+    "AppConfig",
+    "CacheConfig",
+    "DedupConfig",
+    "PreprocessConfig",
+    "JobsConfig",
+    "BulkConfig",
+    "LocalClassifierConfig",
+    "LabelIndexConfig",
+    "CPUExecutor",
+    "get_cpu_executor",
+    "run_cpu",
+    "encode_base64",
+    "shutdown_cpu_executor",
+    "get_http_client",
+    "http_timeout",
+    "close_http_clients",
+    "ImageInfo",
+    "probe_image",
+    "media_type_of"
 ]
\ No newline at end of file
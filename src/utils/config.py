@@ -15,12 +15,141 @@ class ImageCategory(BaseModel):
     description: str
 
 
+class AdaptiveConcurrencyConfig(BaseModel):
+    """按厂商延迟和错误自适应调整并发数（AIMD）"""
+    enabled: bool = False
+    initial_limit: int = 4  # 初始并发上限
+    min_limit: int = 1
+    max_limit: int = 64
+    backoff_ratio: float = 0.5  # 限流、超时、5xx时上限乘以该比例
+    latency_tolerance: float = 2.0  # 短期延迟超过基线的倍数时缩减上限
+
+
+class MockConfig(BaseModel):
+    """模拟模型（type: mock）的延迟、错误和限流行为"""
+    latency_distribution: str = "lognormal"  # constant / uniform / exponential / lognormal
+    latency: float = 0.5  # 单次请求延迟的中位数（秒），constant 时为固定值
+    latency_sigma: float = 0.5  # lognormal 的形状参数，越大长尾越重
+    latency_per_image: float = 0.05  # 多图请求中每多一张图片增加的延迟（秒）
+    error_rate: float = 0.0  # 随机失败的概率
+    error_status: int = 500  # 随机失败时返回的HTTP状态码
+    requests_per_minute: Optional[int] = None  # 厂商侧限流，超出时返回429
+    capacity: Optional[int] = None  # 厂商侧并发容量，超出时返回429
+    seed: Optional[int] = None  # 随机种子，固定后延迟和错误序列可复现
+
+
+class RouterConfig(BaseModel):
+    """多厂商路由（type: router）的厂商顺序、故障转移和对冲策略"""
+    providers: List[str] = []  # 按优先级排列的模型配置名
+    latency_budget: Optional[float] = None  # 厂商超过该时间（秒）未返回时启用下一个厂商
+    hedge: bool = False  # 厂商超过其p95延迟未返回时向下一个厂商发送对冲请求
+    hedge_quantile: float = 0.95  # 对冲阈值使用的延迟分位数
+    hedge_min_delay: float = 1.0  # 对冲等待的下限（秒），延迟样本不足时也使用该值
+    max_error_rate: float = 0.5  # 错误率超过该值的厂商排到后面
+
+
+class HttpClientConfig(BaseModel):
+    """厂商SDK使用的HTTP连接池，连接池配置相同的模型共用同一个连接池"""
+    max_connections: int = 256  # 连接池最大连接数，高并发时默认的100会先于厂商成为瓶颈
+    max_keepalive_connections: int = 64  # 空闲时保留的长连接数
+    keepalive_expiry: float = 60.0  # 空闲长连接的保留时间（秒）
+    http2: bool = True  # 使用HTTP/2在少量连接上多路复用（需要安装h2，未安装时使用HTTP/1.1）
+    connect_timeout: float = 10.0  # 建立连接的超时（秒）
+    pool_timeout: float = 30.0  # 连接池满时等待空闲连接的超时（秒）
+
+
 class ModelConfig(BaseModel):
     """模型配置"""
-    api_key: str
-    model: str
+    api_key: str = ""
+    model: str = ""
+    type: Optional[str] = None  # 模型实现，默认与配置名相同
     base_url: Optional[str] = None
     max_tokens: int = 300
+    prompt_caching: bool = True  # Anthropic：为静态分类说明添加 cache_control（OpenAI按前缀自动缓存）
+    # 客户端限流，未设置的维度不限制
+    requests_per_minute: Optional[int] = None  # 每分钟请求数
+    tokens_per_minute: Optional[int] = None  # 每分钟token数（输入 + 输出）
+    max_concurrent: Optional[int] = None  # 同时在途的请求数
+    adaptive_concurrency: AdaptiveConcurrencyConfig = AdaptiveConcurrencyConfig()
+    # 超时与重试
+    timeout: float = 60.0  # 单次请求超时（秒）
+    max_retries: int = 3  # 限流、超时、5xx等临时错误的最大重试次数
+    retry_base_delay: float = 1.0  # 指数退避的初始等待（秒）
+    retry_max_delay: float = 30.0  # 指数退避的最大等待（秒）
+    retry_max_retry_after: float = 60.0  # 按服务端 Retry-After 等待的上限（秒）
+    retry_budget: float = 120.0  # 一次调用所有重试等待的合计上限（秒），Retry-After 超过剩余预算时直接失败
+    http: HttpClientConfig = HttpClientConfig()  # OpenAI / Anthropic 的HTTP连接池
+    # 多厂商路由（type: router）
+    router: RouterConfig = RouterConfig()
+    # 模拟模型（type: mock）
+    mock: MockConfig = MockConfig()
+
+
+class CacheConfig(BaseModel):
+    """结果缓存配置"""
+    enabled: bool = True
+    max_entries: int = 10000  # 内存层最大条目数
+    ttl_seconds: float = 0  # 条目有效期（秒），0表示永不过期
+    persistent_path: Optional[str] = None  # SQLite持久化文件路径，为空则只使用内存缓存
+
+
+class DedupConfig(BaseModel):
+    """感知哈希近似去重配置"""
+    enabled: bool = True
+    algorithm: str = "dhash"  # ahash / dhash / phash
+    hash_size: int = 8  # 哈希边长，哈希位数为 hash_size²
+    max_distance: int = 4  # 汉明距离不超过该值视为同一张图片
+
+
+class PreprocessConfig(BaseModel):
+    """上传前图片预处理配置"""
+    enabled: bool = True
+    max_long_edge: int = 1568  # 长边超过该值时等比缩小（像素）
+    output_format: str = "JPEG"  # 重新编码的格式
+    quality: int = 85  # 重新编码质量
+    passthrough_max_bytes: int = 512 * 1024  # 尺寸合规且不超过该大小的图片原样上传
+    background_color: str = "white"  # 透明通道合成的背景色
+
+
+class JobsConfig(BaseModel):
+    """后台分类任务配置"""
+    db_path: str = "jobs/jobs.sqlite"  # 任务状态与结果的SQLite文件
+    work_dir: str = "jobs/archives"  # 上传的zip压缩包解压目录
+    max_concurrent_jobs: int = 2  # 同时运行的任务数
+    allowed_directories: List[str] = []  # 允许提交的服务器目录，为空时拒绝所有目录（只能上传zip压缩包）
+    max_archive_entries: int = 100000  # zip压缩包的最大条目数
+    max_extracted_size: int = 4096  # zip压缩包解压后的最大总大小（MB）
+
+
+class BulkConfig(BaseModel):
+    """离线批处理（厂商Batch API）配置"""
+    poll_interval: float = 60.0  # 轮询批处理状态的间隔（秒）
+    max_requests_per_batch: int = 10000  # 每个批处理任务的最大请求数
+    max_bytes_per_batch: Optional[int] = None  # 每个批处理请求文件的最大字节数，为空时使用厂商上限（OpenAI 200MB，Anthropic 256MB）
+    work_dir: str = "jobs/bulk"  # 请求文件和已提交批处理ID的保存目录，中断后对同一批文件重新运行会继续轮询
+
+
+class LocalClassifierConfig(BaseModel):
+    """本地CPU预分类配置"""
+    enabled: bool = False
+    threshold: float = 0.9  # 本地预测的概率不低于该值时直接返回，不调用模型
+    min_examples: int = 200  # 积累的模型结果达到该数量后开始训练
+    min_label_confidence: float = 0.8  # 置信度低于该值的模型结果不作为训练样本
+    min_precision: float = 0.95  # 验证集上超过阈值的预测精确率低于该值时不短路
+    retrain_every: int = 100  # 每新增多少个样本重新训练一次
+    max_examples: int = 100000  # 最多保留的训练样本数（保留最近的）
+    model_path: Optional[str] = "cache/local_classifier.npz"  # 训练样本持久化文件（按命名空间加后缀），为空则只保存在内存中
+
+
+class LabelIndexConfig(BaseModel):
+    """已分类图片的近邻标签索引配置"""
+    enabled: bool = False
+    path: str = "cache/label_index"  # 索引目录，每个结果命名空间一个子目录
+    top_k: int = 5  # 每张图片查询的近邻数
+    min_similarity: float = 0.97  # 余弦相似度不低于该值的近邻才参与投票
+    min_votes: int = 3  # 多数标签至少需要的票数
+    min_label_confidence: float = 0.8  # 置信度低于该值的模型结果不写入索引
+    chunk_rows: int = 65536  # 查询时每次映射并计算的行数，决定查询的内存占用
 
 
 class AppConfig(BaseModel):
@@ -28,6 +157,21 @@ class AppConfig(BaseModel):
     default_model: str = "openai"
     supported_formats: List[str] = ["jpg", "jpeg", "png", "gif", "bmp", "webp"]
     max_file_size: int = 10  # MB
+    strict_image_validation: bool = False  # 除文件头外再用Pillow完整校验每张图片（较慢）
+    max_concurrency: int = 4  # 批量分类时的默认并发数
+    model_concurrency: Dict[str, int] = {}  # 按模型覆盖并发数
+    provider_batch_size: int = 1  # 每次模型请求打包的图片数，1表示每张图片单独请求
+    cache: CacheConfig = CacheConfig()
+    dedup: DedupConfig = DedupConfig()
+    preprocess: PreprocessConfig = PreprocessConfig()
+    jobs: JobsConfig = JobsConfig()
+    bulk: BulkConfig = BulkConfig()
+    local_classifier: LocalClassifierConfig = LocalClassifierConfig()
+    label_index: LabelIndexConfig = LabelIndexConfig()
+    cpu_executor: str = "thread"  # 图片CPU工作的执行方式: process / thread / inline
+    cpu_workers: Optional[int] = None  # 执行池大小，默认为CPU核数
+    # 管理接口（POST /config/reload）的令牌，请求需带 Authorization: Bearer <token>；为空时只接受本机请求
+    admin_token: Optional[str] = None
 
 
 class Config(BaseModel):
@@ -46,6 +190,8 @@ class ConfigManager:
         load_dotenv()
         self.config_path = Path(config_path)
         self._config: Optional[Config] = None
+        # 每次加载配置递增，依赖配置的缓存据此判断是否失效
+        self.version = 0
         self.load_config()
 
     def load_config(self) -> None:
@@ -60,6 +206,7 @@ class ConfigManager:
         config_data = self._substitute_env_vars(config_data)
 
         self._config = Config(**config_data)
+        self.version += 1
 
     def _substitute_env_vars(self, data: Any) -> Any:
         """递归替换配置中的环境变量"""
@@ -94,6 +241,12 @@ class ConfigManager:
         """获取应用配置"""
         return self.config.app
 
+    def get_concurrency_limit(self, model_type: str) -> int:
+        """获取指定模型的批量分类并发数（固定值，启用自适应并发时见 ImageClassifier.get_concurrency_limit）"""
+        app_config = self.get_app_config()
+        limit = app_config.model_concurrency.get(model_type, app_config.max_concurrency)
+        return max(1, limit)
+
     def reload(self) -> None:
         """重新加载配置"""
         self.load_config()
@@ -0,0 +1,104 @@
+"""CPU密集型图片处理的卸载执行器"""
+
+import asyncio
+import base64
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
+
+from .config import config_manager
+from .metrics import STAGE_SECONDS
+
+T = TypeVar("T")
+
+# 小于该大小的base64编码直接在事件循环中完成，切换线程的开销反而更大
+INLINE_BASE64_MAX_BYTES = 64 * 1024
+
+_BASE64_STAGE = STAGE_SECONDS.labels("base64_encode")
+
+
+class CPUExecutor:
+    """
+    图片CPU工作（校验、解码、缩放、哈希、编码）的执行器
+
+    解码和缩放在持有GIL的Python/C代码中进行，放在事件循环里会阻塞所有请求。
+    mode 为 process 时使用进程池绕开GIL，thread 时使用线程池，inline 时直接执行（调试用）。
+    hashlib、zlib 等会释放GIL的操作始终使用线程池，避免跨进程复制大块数据。
+    """
+
+    MODES = ("process", "thread", "inline")
+
+    def __init__(self, mode: str = "thread", max_workers: Optional[int] = None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported executor mode: {mode}")
+
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool: Optional[Executor] = None
+        self._thread_pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="image-cpu")
+
+        if mode == "process":
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        elif mode == "thread":
+            self._pool = self._thread_pool
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """在配置的池中执行函数，进程模式下函数和参数必须可以被pickle"""
+        if self._pool is None:
+            return func(*args)
+        if self.mode == "process":
+            # memoryview 无法pickle，跨进程时必须转成bytes
+            args = tuple(bytes(arg) if isinstance(arg, memoryview) else arg for arg in args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, partial(func, *args))
+
+    async def run_in_thread(self, func: Callable[..., T], *args: Any) -> T:
+        """在线程池中执行会释放GIL的函数"""
+        if self.mode == "inline":
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._thread_pool, partial(func, *args))
+
+    def shutdown(self) -> None:
+        """关闭线程池和进程池"""
+        if self._pool is not None and self._pool is not self._thread_pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._thread_pool.shutdown(wait=False, cancel_futures=True)
+
+
+_cpu_executor: Optional[CPUExecutor] = None
+
+
+def get_cpu_executor() -> CPUExecutor:
+    """获取全局CPU执行器，按 app.cpu_executor / app.cpu_workers 创建"""
+    global _cpu_executor
+    if _cpu_executor is None:
+        app_config = config_manager.get_app_config()
+        _cpu_executor = CPUExecutor(app_config.cpu_executor, app_config.cpu_workers)
+    return _cpu_executor
+
+
+def shutdown_cpu_executor() -> None:
+    """关闭全局CPU执行器"""
+    global _cpu_executor
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown()
+        _cpu_executor = None
+
+
+async def run_cpu(func: Callable[..., T], *args: Any) -> T:
+    """在全局CPU执行器中运行图片处理函数"""
+    return await get_cpu_executor().run(func, *args)
+
+
+def _b64encode_text(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+async def encode_base64(data: bytes) -> str:
+    """base64编码图片数据，较大的数据在线程池中编码"""
+    with _BASE64_STAGE.time():
+        if len(data) <= INLINE_BASE64_MAX_BYTES:
+            return _b64encode_text(data)
+        return await get_cpu_executor().run_in_thread(_b64encode_text, data)
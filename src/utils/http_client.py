@@ -0,0 +1,98 @@
+"""厂商SDK共享的HTTP连接池"""
+
+from typing import Any, Awaitable, Callable, Dict, Tuple, Union
+
+from .config import HttpClientConfig
+
+# 新版 openai / anthropic SDK 基于 httpx2（只接受 httpx2 的客户端），旧版基于 httpx，两者接口相同
+try:
+    import httpx2 as httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    try:
+        import httpx
+        HTTPX_AVAILABLE = True
+    except ImportError:
+        HTTPX_AVAILABLE = False
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+_clients: Dict[Tuple[int, int, float, bool], "httpx.AsyncClient"] = {}
+# 不使用共享连接池、由模型自己创建的客户端（如Gemini的gRPC通道）：id(client) -> 关闭函数
+_owned_closers: Dict[int, Callable[[], Awaitable[Any]]] = {}
+
+
+def _as_config(http_config: Union[HttpClientConfig, Dict[str, Any], None]) -> HttpClientConfig:
+    if isinstance(http_config, HttpClientConfig):
+        return http_config
+    return HttpClientConfig(**(http_config or {}))
+
+
+def http_timeout(http_config: Union[HttpClientConfig, Dict[str, Any], None], timeout: float) -> "httpx.Timeout":
+    """SDK请求使用的超时：读写沿用模型的 timeout，建立连接和等待连接池分别设置"""
+    http_config = _as_config(http_config)
+    return httpx.Timeout(timeout, connect=http_config.connect_timeout, pool=http_config.pool_timeout)
+
+
+def get_http_client(http_config: Union[HttpClientConfig, Dict[str, Any], None] = None) -> "httpx.AsyncClient":
+    """
+    获取共享的 httpx.AsyncClient
+
+    连接池参数相同的模型（包括不同厂商）共用同一个客户端，长连接和HTTP/2连接在所有请求间复用；
+    超时由SDK按请求传入，不影响复用。
+
+    Args:
+        http_config: HttpClientConfig 或其字典形式，为空时使用默认值
+    """
+    if not HTTPX_AVAILABLE:
+        raise ImportError("httpx library not installed. Install with: pip install httpx")
+
+    http_config = _as_config(http_config)
+    http2 = http_config.http2 and HTTP2_AVAILABLE
+    key = (
+        http_config.max_connections,
+        http_config.max_keepalive_connections,
+        http_config.keepalive_expiry,
+        http2,
+    )
+    client = _clients.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=http_config.max_connections,
+                max_keepalive_connections=http_config.max_keepalive_connections,
+                keepalive_expiry=http_config.keepalive_expiry
+            ),
+            timeout=httpx.Timeout(None, connect=http_config.connect_timeout, pool=http_config.pool_timeout),
+            follow_redirects=True
+        )
+        _clients[key] = client
+    return client
+
+
+def register_client_closer(client: Any, close: Callable[[], Awaitable[Any]]) -> None:
+    """登记模型自己创建的客户端，应用关闭时由 close_http_clients 一并关闭"""
+    _owned_closers[id(client)] = close
+
+
+def unregister_client_closer(client: Any) -> None:
+    """客户端已经由模型自己关闭时取消登记"""
+    _owned_closers.pop(id(client), None)
+
+
+async def close_http_clients() -> None:
+    """关闭所有共享的连接池和登记的客户端（应用关闭时调用）"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+    closers = list(_owned_closers.values())
+    _owned_closers.clear()
+    for close in closers:
+        await close()
@@ -0,0 +1,176 @@
+"""只读取文件头的图片格式与尺寸识别，不解码像素"""
+
+import struct
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+# Pillow格式名 -> MIME类型
+MEDIA_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+    "BMP": "image/bmp",
+}
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG的SOF标记（不含 DHT 0xC4、JPG 0xC8、DAC 0xCC）
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# 不带长度字段的JPEG标记：TEM、RST0-7、SOI
+_JPEG_STANDALONE_MARKERS = frozenset([0x01, *range(0xD0, 0xD9)])
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    """文件头识别结果"""
+    format: Optional[str]  # Pillow格式名（JPEG / PNG / GIF / WEBP / BMP），无法识别时为None
+    width: int = 0
+    height: int = 0
+    valid: bool = False  # 格式可识别、头部完整且尺寸有效
+    truncated: bool = False  # 数据在文件头读完之前就结束（截断的上传），可以直接拒绝
+
+    @property
+    def media_type(self) -> Optional[str]:
+        return MEDIA_TYPES.get(self.format) if self.format else None
+
+
+def sniff_format(data: bytes) -> Optional[str]:
+    """按魔数识别图片格式，只看前12个字节"""
+    head = bytes(data[:12])
+    if head.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if head.startswith(_PNG_SIGNATURE):
+        return "PNG"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    if head[:2] == b"BM":
+        return "BMP"
+    return None
+
+
+class _Truncated(Exception):
+    """文件头读完之前数据就结束"""
+
+
+def _require(data: bytes, length: int) -> None:
+    if len(data) < length:
+        raise _Truncated()
+
+
+def _png_size(data: bytes) -> Optional[Tuple[int, int]]:
+    # 签名之后的第一个块必须是IHDR
+    _require(data, 33)
+    if data[12:16] != b"IHDR":
+        return None
+    # 末尾不是IEND块时可能被截断，也可能在IEND之后附加了数据，交给Pillow完整校验
+    if b"IEND" not in bytes(data[-12:]):
+        return None
+    return struct.unpack(">II", data[16:24])
+
+
+def _gif_size(data: bytes) -> Optional[Tuple[int, int]]:
+    _require(data, 13)
+    return struct.unpack("<HH", data[6:10])
+
+
+def _bmp_size(data: bytes) -> Optional[Tuple[int, int]]:
+    _require(data, 26)
+    header_size = struct.unpack("<I", data[14:18])[0]
+    if header_size == 12:
+        return struct.unpack("<HH", data[18:22])
+    width, height = struct.unpack("<ii", data[18:26])
+    # 高度为负表示自上而下存储
+    return width, abs(height)
+
+
+def _webp_size(data: bytes) -> Optional[Tuple[int, int]]:
+    _require(data, 30)
+    chunk = bytes(data[12:16])
+    if chunk == b"VP8 ":
+        # 有损：关键帧起始码之后是14位宽高
+        if data[23:26] != b"\x9d\x01\x2a":
+            return None
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        # 无损：签名0x2f之后依次是14位的 宽-1 和 高-1
+        if data[20] != 0x2F:
+            return None
+        bits = int.from_bytes(data[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        # 扩展格式：24位的 画布宽-1 和 画布高-1
+        return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    return None
+
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    # 逐段跳过APPn等标记段，直到帧头（SOF）；只读取段头，不扫描压缩数据。
+    # 段之间有非标准填充等无法按段头解析的情况返回None，交给Pillow完整校验
+    position = 2
+    while True:
+        _require(data, position + 4)
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker == 0xFF:
+            # 填充字节
+            position += 1
+            continue
+        if marker in _JPEG_STANDALONE_MARKERS:
+            position += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            # 在帧头之前出现EOI或扫描数据
+            return None
+        segment_length = struct.unpack(">H", data[position + 2:position + 4])[0]
+        if marker in _JPEG_SOF_MARKERS:
+            _require(data, position + 9)
+            height, width = struct.unpack(">HH", data[position + 5:position + 9])
+            return width, height
+        position += 2 + segment_length
+
+
+_SIZE_READERS = {
+    "JPEG": _jpeg_size,
+    "PNG": _png_size,
+    "GIF": _gif_size,
+    "WEBP": _webp_size,
+    "BMP": _bmp_size,
+}
+
+
+def probe_image(data: bytes) -> ImageInfo:
+    """
+    只读取文件头识别图片的格式和尺寸，耗时为微秒级
+
+    JPEG 逐段读取段头直到帧头，PNG 额外检查末尾的IEND块；不解码像素。文件头读完之前数据就结束时
+    truncated 为True；格式可识别但文件头无法解析（valid 为False）或像素数据损坏的图片需要用 verify_image 完整校验。
+
+    Args:
+        data: 图片二进制数据（bytes 或 memoryview）
+
+    Returns:
+        ImageInfo: 格式、尺寸和头部是否有效
+    """
+    image_format = sniff_format(data)
+    if image_format is None:
+        return ImageInfo(None)
+    try:
+        size = _SIZE_READERS[image_format](data)
+    except _Truncated:
+        return ImageInfo(image_format, truncated=True)
+    except (struct.error, IndexError, ValueError):
+        size = None
+    if size is None:
+        return ImageInfo(image_format)
+    width, height = size
+    return ImageInfo(image_format, width, height, valid=width > 0 and height > 0)
+
+
+def media_type_of(data: bytes, default: str = "image/jpeg") -> str:
+    """按魔数得到图片的MIME类型，无法识别时返回 default"""
+    image_format = sniff_format(data)
+    return MEDIA_TYPES.get(image_format, default) if image_format else default
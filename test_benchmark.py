@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+性能回归压测（需要 pytest-benchmark，使用模拟模型，不调用任何API）
+
+    pytest test_benchmark.py --benchmark-autosave
+    pytest test_benchmark.py --benchmark-compare --benchmark-compare-fail=mean:10%
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+# 添加src目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from src.testing.benchmark import TARGETS, configure_mock_model, generate_corpus, run_benchmarks
+
+CORPUS_SIZE = 64
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("corpus")
+    generate_corpus(str(directory), CORPUS_SIZE, (1024, 768))
+    # 固定延迟，使结果只反映本服务自身的开销
+    configure_mock_model("mock", latency=0.02, latency_distribution="constant", error_rate=0.0, seed=0)
+    return str(directory)
+
+
+@pytest.mark.parametrize("target", TARGETS)
+def test_throughput(benchmark, corpus, target):
+    results = benchmark.pedantic(
+        lambda: asyncio.run(run_benchmarks(corpus, targets=[target])), rounds=3, iterations=1
+    )
+    result = results[0]
+    benchmark.extra_info.update(result.to_dict())
+    assert result.images == CORPUS_SIZE and result.errors == 0
\ No newline at end of file
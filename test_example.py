@@ -1,15 +1,71 @@
 #!/usr/bin/env python3
 """测试脚本示例"""
 
+import email.utils
+import io
+import os
+import shutil
 import sys
 import asyncio
+import tempfile
+import time
+import zipfile
 from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+import numpy as np
+from fastapi import HTTPException
+from PIL import Image
+from starlette.requests import Request
 
 # 添加src目录到Python路径
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
-from src.services import ImageClassifier
-from src.utils.config import config_manager
+from src.app.main import _require_admin
+from src.models import (
+    AnthropicModel, BaseLLMModel, ClassificationResult, GoogleModel, ModelFactory, OpenAIModel, RateLimiter, RetryPolicy,
+    RouterModel, STATUS_TRANSIENT_ERROR, classify_error, get_category_matcher, parse_classification
+)
+from src.services import (
+    ImageClassifier, BatchClassifier, BulkBatchClassifier, JobManager, LabelIndex, LocalClassifier, NearDuplicateIndex,
+    ResultCache, close_result_cache, get_result_cache, open_result_sink, load_completed_paths
+)
+from src.services.jobs import JobStore
+from src.services.preprocess import preprocess_image
+from src.testing import FakeBatchServer, bench_batch_classifier, bench_http, configure_mock_model, generate_corpus
+from src.utils.metrics import registry
+from src.utils.config import JobsConfig, ModelConfig, RouterConfig, config_manager
+from src.utils.http_client import _owned_closers as owned_closers, close_http_clients, get_http_client
+from src.utils.image_probe import probe_image
+
+
+class _StubModel(BaseLLMModel):
+    """不调用API的桩模型，记录同时在途的请求数"""
+
+    supports_multi_image = True
+
+    def __init__(self, delay: float = 0.01):
+        super().__init__({"model": "stub", "api_key": ""})
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+        self.batch_calls = 0
+
+    async def _request(self, image_data, categories):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        return "Category: cat", None
+
+    async def _request_batch(self, images, categories):
+        # 模拟一次多图请求，返回按图片编号分段的响应
+        self.batch_calls += 1
+        await asyncio.sleep(self.delay)
+        return "\n\n".join(f"Image {number}:\nCategory: cat" for number in range(1, len(images) + 1)), None
 
 
 async def test_config():
@@ -23,6 +79,25 @@ async def test_config():
 
         app_config = config_manager.get_app_config()
         print(f"✅ 应用配置: 默认模型={app_config.default_model}")
+
+        # 管理接口：未配置令牌时只接受本机请求，配置后校验 Bearer 令牌
+        def admin_allowed(host: str, token: Optional[str] = None) -> bool:
+            headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+            try:
+                _require_admin(Request({"type": "http", "client": (host, 50000), "headers": headers}))
+                return True
+            except HTTPException:
+                return False
+
+        original_token = app_config.admin_token
+        try:
+            app_config.admin_token = None
+            assert admin_allowed("127.0.0.1") and not admin_allowed("10.0.0.5")
+            app_config.admin_token = "secret"
+            assert admin_allowed("10.0.0.5", "secret")
+            assert not admin_allowed("127.0.0.1") and not admin_allowed("127.0.0.1", "wrong")
+        finally:
+            app_config.admin_token = original_token
         return True
     except Exception as e:
         print(f"❌ 配置加载失败: {e}")
@@ -50,6 +125,1003 @@ async def test_classifier():
         return False
 
 
+async def test_batch_classifier():
+    """测试批量分类的并发与结果顺序（使用桩模型，不调用API）"""
+    print("\n📁 测试批量分类...")
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for i in range(6):
+                Image.new("RGB", (8, 8), (i * 40, 0, 0)).save(Path(tmp_dir) / f"{i}.png")
+
+            batch = BatchClassifier("openai", concurrency=3)
+            batch.batch_size = 1
+            batch.classifier.model = _StubModel()
+            batch.classifier.cache = None
+            batch.classifier.dedup_index = None
+            streamed = []
+            results = await batch.classify_directory(tmp_dir, on_result=lambda path, _: streamed.append(path))
+
+            expected_order = list(batch.iter_image_files(Path(tmp_dir)))
+            assert [path for path, _ in results] == expected_order
+            assert len(streamed) == len(results) == 6
+            assert batch.classifier.model.max_in_flight == 3
+
+            # 多图打包：6张图片每次请求4张，共2次请求
+            batch.batch_size = 4
+            batch.classifier.model = _StubModel()
+            results = await batch.classify_directory(tmp_dir)
+            assert [path for path, _ in results] == expected_order
+            assert batch.classifier.model.batch_calls == 2 and batch.classifier.model.calls == 0
+        print(f"✅ 并发批量分类成功: {len(results)} 张图片")
+        return True
+    except Exception as e:
+        print(f"❌ 批量分类测试失败: {e}")
+        return False
+
+
+async def test_streaming_batch():
+    """测试流式批量分类与增量结果输出（使用桩模型，不调用API）"""
+    print("\n🌊 测试流式批量分类...")
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            image_dir = Path(tmp_dir) / "images" / "nested"
+            image_dir.mkdir(parents=True)
+            for i in range(5):
+                Image.new("RGB", (8, 8), (0, i * 40, 0)).save(image_dir / f"{i}.jpg")
+
+            batch = BatchClassifier("openai", concurrency=2)
+            batch.classifier.model = _StubModel()
+            batch.classifier.cache = None
+            batch.classifier.dedup_index = None
+            output_path = str(Path(tmp_dir) / "results.jsonl")
+
+            # 先处理两张后中断，再从结果文件续跑
+            with open_result_sink(output_path) as sink:
+                async for path, result in batch.iter_directory(str(Path(tmp_dir) / "images")):
+                    sink.write(path, result)
+                    if sink.count == 2:
+                        break
+
+            completed = load_completed_paths(output_path)
+            with open_result_sink(output_path) as sink:
+                async for path, result in batch.iter_directory(str(Path(tmp_dir) / "images"), skip=completed):
+                    sink.write(path, result)
+
+            assert len(load_completed_paths(output_path)) == 5
+
+            # CSV结果文件末尾有崩溃留下的残缺行（引号未闭合）时，续跑先截掉残缺行
+            csv_path = Path(tmp_dir) / "results.csv"
+            ok = ClassificationResult(category="cat", confidence=0.9, reasoning="line one\r\nline two", raw_response="")
+            with open_result_sink(str(csv_path)) as sink:
+                sink.write("a.jpg", ok)
+            complete = csv_path.read_bytes()
+            with open(csv_path, "ab") as f:
+                f.write(b'b.jpg,cat,0.9,"torn\r\n')
+            with open_result_sink(str(csv_path)) as sink:
+                assert csv_path.read_bytes() == complete
+                sink.write("c.jpg", ok)
+            assert load_completed_paths(str(csv_path)) == {"a.jpg", "c.jpg"}
+            assert csv_path.read_bytes().count(b"path,") == 1
+        print("✅ 流式分类与断点续跑成功")
+        return True
+    except Exception as e:
+        print(f"❌ 流式批量分类测试失败: {e}")
+        return False
+
+
+async def test_result_cache():
+    """测试结果缓存的命中与持久化（使用桩模型，不调用API）"""
+    print("\n💾 测试结果缓存...")
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            buffer = io.BytesIO()
+            Image.new("RGB", (8, 8), (255, 0, 0)).save(buffer, format="PNG")
+            image_data = buffer.getvalue()
+            db_path = str(Path(tmp_dir) / "cache.sqlite")
+
+            classifier = ImageClassifier("openai")
+            classifier.model = _StubModel()
+            classifier.cache = ResultCache(max_entries=10, persistent_path=db_path)
+            await classifier.classify_image_data(image_data)
+            await classifier.classify_image_data(image_data)
+            assert classifier.model.calls == 1
+            assert classifier.cache.stats()["hits"] == 1
+            classifier.cache.close()
+
+            # 新的缓存实例（模拟重启）从持久化层命中
+            classifier.cache = ResultCache(max_entries=10, persistent_path=db_path)
+            result = await classifier.classify_image_data(image_data)
+            assert classifier.model.calls == 1 and result.category == "cat"
+            assert classifier.cache.stats()["persistent_hits"] == 1
+            classifier.cache.close()
+
+        # 全局缓存在缓存配置变化后重建，关闭后重置
+        app_config = config_manager.get_app_config()
+        original = app_config.cache
+        try:
+            app_config.cache = original.model_copy(update={"enabled": True})
+            config_manager.version += 1
+            shared = get_result_cache()
+            assert shared is not None and get_result_cache() is shared
+            app_config.cache = app_config.cache.model_copy(update={"max_entries": 7})
+            config_manager.version += 1
+            rebuilt = get_result_cache()
+            assert rebuilt is not shared and rebuilt.max_entries == 7
+            close_result_cache()
+            assert get_result_cache() is not rebuilt
+        finally:
+            app_config.cache = original
+            config_manager.version += 1
+            close_result_cache()
+        print("✅ 结果缓存命中与持久化正常")
+        return True
+    except Exception as e:
+        print(f"❌ 结果缓存测试失败: {e}")
+        return False
+
+
+def _make_test_image(seed: int, size: int = 64, image_format: str = "PNG") -> bytes:
+    """生成内容随种子变化的测试图片"""
+    base = Image.effect_mandelbrot((64, 64), (-2.0 + seed, -1.5, 1.0 + seed, 1.5), 64 + seed * 30).convert("RGB")
+    buffer = io.BytesIO()
+    base.resize((size, size)).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+async def test_near_duplicate_dedup():
+    """测试感知哈希近似去重（使用桩模型，不调用API）"""
+    print("\n🔍 测试近似重复去重...")
+    try:
+        classifier = ImageClassifier("openai")
+        classifier.model = _StubModel()
+        classifier.cache = None
+        classifier.dedup_index = NearDuplicateIndex(max_distance=4)
+
+        await classifier.classify_image_data(_make_test_image(0))
+        # 缩放并重新编码为JPEG的同一张图片
+        await classifier.classify_image_data(_make_test_image(0, size=48, image_format="JPEG"))
+        assert classifier.model.calls == 1, classifier.model.calls
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, seed, size in [("a.png", 0, 64), ("a_small.png", 0, 40), ("a_large.png", 0, 96), ("b.png", 1, 64)]:
+                (Path(tmp_dir) / name).write_bytes(_make_test_image(seed, size))
+
+            batch = BatchClassifier("openai")
+            batch.batch_size = 1
+            batch.classifier.model = _StubModel()
+            batch.classifier.cache = None
+            batch.classifier.dedup_index = None
+            results = await batch.classify_directory_clustered(tmp_dir)
+            assert len(results) == 4
+            assert batch.classifier.model.calls == 2, batch.classifier.model.calls
+        print("✅ 近似重复图片复用结果，聚类后只调用模型2次")
+        return True
+    except Exception as e:
+        print(f"❌ 近似去重测试失败: {e!r}")
+        return False
+
+
+async def test_preprocess():
+    """测试上传前的缩放与重新编码（使用桩模型，不调用API）"""
+    print("\n🗜️  测试图片预处理...")
+    try:
+        large = Image.effect_noise((3000, 2000), 64).convert("RGBA")
+        buffer = io.BytesIO()
+        large.save(buffer, format="PNG")
+        image_data = buffer.getvalue()
+
+        classifier = ImageClassifier("openai")
+        classifier.model = _StubModel()
+        classifier.cache = None
+        classifier.dedup_index = None
+        result = await classifier.classify_image_data(image_data)
+
+        metadata = result.metadata
+        assert metadata["preprocessed"] and metadata["media_type"] == "image/jpeg"
+        assert max(metadata["width"], metadata["height"]) <= config_manager.get_app_config().preprocess.max_long_edge
+        assert metadata["upload_bytes"] < metadata["original_bytes"]
+
+        # 小的BMP也要重新编码；GIF只对接受GIF的厂商原样上传
+        small_bmp = await classifier.classify_image_data(_make_test_image(1, size=32, image_format="BMP"))
+        assert small_bmp.metadata["preprocessed"] and small_bmp.metadata["media_type"] == "image/jpeg", small_bmp.metadata
+        gif = _make_test_image(1, size=32, image_format="GIF")
+        preprocess_config = config_manager.get_app_config().preprocess
+        assert preprocess_image(gif, preprocess_config).transformed
+        assert not preprocess_image(gif, preprocess_config, frozenset(["JPEG", "PNG", "WEBP", "GIF"])).transformed
+        print(f"✅ 上传体积 {metadata['original_bytes']} -> {metadata['upload_bytes']} 字节，BMP重新编码")
+        return True
+    except Exception as e:
+        print(f"❌ 图片预处理测试失败: {e!r}")
+        return False
+
+
+async def test_job_resume():
+    """测试后台任务中断后从断点续跑（使用桩模型，不调用API）"""
+    print("\n🗂️  测试后台任务续跑...")
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            image_dir = Path(tmp_dir) / "images"
+            image_dir.mkdir()
+            for i in range(6):
+                (image_dir / f"{i}.png").write_bytes(_make_test_image(i % 3, 32 + i))
+
+            stub = _StubModel(delay=0.05)
+            ModelFactory._models["openai"] = stub
+            jobs_config = JobsConfig(
+                db_path=str(Path(tmp_dir) / "jobs.sqlite"), work_dir=str(Path(tmp_dir) / "work"), max_archive_entries=3
+            )
+
+            # 未配置 allowed_directories 时拒绝所有目录；条目数超限的压缩包不解压
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, "w") as zip_file:
+                for i in range(4):
+                    zip_file.writestr(f"{i}.png", _make_test_image(i, 32))
+            archive.seek(0)
+            manager = JobManager(jobs_config)
+            for submit in (
+                lambda: manager.submit_directory(str(image_dir), "openai"),
+                lambda: manager.submit_archive(archive, "openai"),
+            ):
+                try:
+                    await submit()
+                    raise AssertionError("submission was not rejected")
+                except ValueError:
+                    pass
+            assert not Path(jobs_config.work_dir).exists()
+
+            # 解压中途写入失败（目录与文件同名）时删除解压了一半的目录
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, "w") as zip_file:
+                zip_file.writestr("a", b"file")
+                zip_file.writestr("a/b.png", _make_test_image(0, 32))
+            archive.seek(0)
+            try:
+                await manager.submit_archive(archive, "openai")
+                raise AssertionError("broken archive was not rejected")
+            except OSError:
+                pass
+            assert not any(Path(jobs_config.work_dir).iterdir())
+
+            # 压缩包任务完成或取消后删除解压目录
+            def small_archive() -> io.BytesIO:
+                archive = io.BytesIO()
+                with zipfile.ZipFile(archive, "w") as zip_file:
+                    for i in range(3):
+                        zip_file.writestr(f"{i}.png", _make_test_image(i, 40 + i))
+                archive.seek(0)
+                return archive
+
+            archive_job = await manager.submit_archive(small_archive(), "openai")
+            while manager.store.get(archive_job)["status"] != "completed":
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            assert not (Path(jobs_config.work_dir) / archive_job).exists()
+            archive_job = await manager.submit_archive(small_archive(), "openai")
+            assert await manager.cancel(archive_job) == "cancelled"
+            assert not (Path(jobs_config.work_dir) / archive_job).exists()
+            await manager.shutdown()
+
+            # 处理一部分后停机
+            jobs_config.allowed_directories = [tmp_dir]
+            manager = JobManager(jobs_config)
+            job_id = await manager.submit_directory(str(image_dir), "openai")
+            while manager.store.get(job_id)["completed"] < 2:
+                await asyncio.sleep(0.01)
+            await manager.shutdown()
+
+            # 重启后继续，已完成的文件不再调用模型
+            calls_before_restart = stub.calls
+            manager = JobManager(jobs_config)
+            await manager.start()
+            while manager.store.get(job_id)["status"] != "completed":
+                await asyncio.sleep(0.01)
+            job = manager.get(job_id)
+            await manager.shutdown()
+
+            assert job["completed"] == job["total"] == 6 and len(job["results"]) == 6
+            assert stub.calls - calls_before_restart < 6
+
+            # 临时错误的文件不算完成，续跑时重新分类
+            store = JobStore(jobs_config.db_path)
+            transient = ClassificationResult(
+                category="unknown", confidence=0.0, reasoning="", raw_response="", status=STATUS_TRANSIENT_ERROR
+            )
+            store.add_result(job_id, job["results"][0]["path"], transient)
+            assert job["results"][0]["path"] not in store.completed_paths(job_id)
+            assert len(store.completed_paths(job_id)) == 5
+            store.close()
+        print(f"✅ 任务重启后续跑完成: {job['completed']}/{job['total']}")
+        return True
+    except Exception as e:
+        print(f"❌ 后台任务测试失败: {e!r}")
+        return False
+    finally:
+        ModelFactory._models.pop("openai", None)
+
+
+async def test_bulk_batch():
+    """测试离线批处理模式（使用本地模拟的Batch API服务）"""
+    print("\n📦 测试离线批处理...")
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for i in range(5):
+                Path(tmp_dir, f"{i}.png").write_bytes(_make_test_image(i, 32 + i))
+
+            async with FakeBatchServer(lambda body: "Category: landscape, mountain forest", polls_until_done=2) as server:
+                for model_type, model_class, base_url in (
+                    ("openai", OpenAIModel, server.openai_base_url),
+                    ("anthropic", AnthropicModel, server.anthropic_base_url),
+                ):
+                    model_config = config_manager.get_model_config(model_type).dict()
+                    ModelFactory._models[model_type] = model_class({**model_config, "base_url": base_url})
+                    batch = BatchClassifier(model_type)
+                    batch.classifier.cache = None
+                    batch.classifier.dedup_index = None
+
+                    results = await batch.classify_directory_bulk(tmp_dir, poll_interval=0)
+                    assert [path for path, _ in results] == list(batch.iter_image_files(Path(tmp_dir)))
+                    assert all(result.category == "landscape" for _, result in results), results
+
+                # 每张图片对应一个批处理请求
+                assert len(server.submitted_requests) == 10
+
+                # 字节数上限很小时每个请求单独成批；轮询中断后重新运行只轮询已提交的批处理，不重复提交
+                state_dir = str(Path(tmp_dir, "bulk_state"))
+                bulk = BulkBatchClassifier(batch.classifier, poll_interval=0, max_bytes_per_batch=1, work_dir=state_dir)
+                file_paths = list(batch.iter_image_files(Path(tmp_dir)))
+                batch_count = len(server.batches)
+
+                async def interrupted(batch_id):
+                    raise ConnectionError("polling interrupted")
+
+                bulk.classifier.model.is_batch_done = interrupted
+                try:
+                    await bulk.classify_files(file_paths)
+                    raise AssertionError("polling was not interrupted")
+                except ConnectionError:
+                    pass
+                finally:
+                    del bulk.classifier.model.is_batch_done
+                assert len(server.batches) == batch_count + 5, len(server.batches)
+                # 请求文件提交后删除，只剩状态文件
+                assert len(os.listdir(state_dir)) == 1, os.listdir(state_dir)
+
+                results = await bulk.classify_files(file_paths)
+                assert len(server.batches) == batch_count + 5, len(server.batches)
+                assert all(result.category == "landscape" for _, result in results), results
+                assert not os.listdir(state_dir)
+        print("✅ OpenAI / Anthropic 批处理结果均已映射回文件，按大小拆分并可在中断后继续轮询")
+        return True
+    except Exception as e:
+        print(f"❌ 离线批处理测试失败: {e!r}")
+        return False
+    finally:
+        ModelFactory._models.pop("openai", None)
+        ModelFactory._models.pop("anthropic", None)
+
+
+async def test_rate_limiter():
+    """测试令牌桶限流的匀速放行和并发上限"""
+    print("\n🚦 测试客户端限流...")
+    try:
+        limiter = RateLimiter(requests_per_minute=3000, tokens_per_minute=60000, max_concurrent=2)
+        # 清空桶，之后的请求按每秒50个匀速放行
+        limiter.request_bucket.tokens = 0
+        in_flight = max_in_flight = 0
+
+        async def call() -> None:
+            nonlocal in_flight, max_in_flight
+            async with limiter.acquire(100) as permit:
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+                permit.record_usage(50)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*(call() for _ in range(10)))
+        elapsed = loop.time() - started
+
+        assert max_in_flight <= 2, max_in_flight
+        assert elapsed >= 0.18, elapsed
+        # 实际用量少于预估时退还差额
+        assert limiter.token_bucket.tokens > 60000 - 10 * 100
+        print(f"✅ 10个请求用时 {elapsed:.2f}s，最大并发 {max_in_flight}")
+        return True
+    except Exception as e:
+        print(f"❌ 限流测试失败: {e!r}")
+        return False
+
+
+class _FlakyError(Exception):
+    """模拟带HTTP状态码的SDK异常"""
+
+    def __init__(self, status_code: int, headers: Optional[Dict[str, str]] = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        if headers is not None:
+            self.response = SimpleNamespace(headers=headers)
+
+
+async def test_retry():
+    """测试临时错误重试与错误状态"""
+    print("\n🔁 测试重试与错误分类...")
+    try:
+        class FlakyModel(_StubModel):
+            def __init__(self, failures):
+                super().__init__(delay=0)
+                self.retry_policy.base_delay = 0.001
+                self.failures = list(failures)
+
+            async def _request(self, image_data, categories):
+                if self.failures:
+                    self.calls += 1
+                    raise _FlakyError(self.failures.pop(0))
+                return await super()._request(image_data, categories)
+
+        categories = {"cat": ["cat"], "dog": ["dog"]}
+
+        # 503和429重试后成功
+        model = FlakyModel([503, 429])
+        result = await model.classify_image(b"", categories)
+        assert result.ok and result.category == "cat" and model.calls == 3, result
+
+        # 鉴权错误不重试
+        model = FlakyModel([401, 401])
+        result = await model.classify_image(b"", categories)
+        assert result.status == "error" and result.error_type == "auth" and model.calls == 1, result
+
+        # 重试耗尽后标记为临时错误
+        model = FlakyModel([500] * 10)
+        result = await model.classify_image(b"", categories)
+        assert result.status == "transient_error" and model.calls == model.retry_policy.max_retries + 1, result
+
+        # 多图请求重试耗尽时不再逐张重发，所有图片直接返回临时错误
+        class FlakyBatchModel(FlakyModel):
+            async def _request_batch(self, images, categories):
+                self.batch_calls += 1
+                raise _FlakyError(500)
+
+        model = FlakyBatchModel([])
+        results = await model.classify_images([b"", b""], categories)
+        assert all(result.status == "transient_error" for result in results), results
+        assert model.calls == 0 and model.batch_calls == model.retry_policy.max_retries + 1, model.calls
+
+        # 过长的 Retry-After（秒数或HTTP日期）不超过上限，超过剩余等待预算时不重试
+        policy = RetryPolicy(max_retry_after=60.0, budget=1000.0)
+        assert policy.delay(0, classify_error(_FlakyError(429, {"retry-after": "90"}))) == 60.0
+        far = email.utils.formatdate(time.time() + 3600, usegmt=True)
+        assert policy.delay(0, classify_error(_FlakyError(503, {"retry-after": far}))) is None
+        assert policy.delay(0, classify_error(_FlakyError(429, {"retry-after": "90"})), waited=950.0) is None
+        model = FlakyModel([])
+
+        async def rate_limited(image_data, categories):
+            model.calls += 1
+            raise _FlakyError(429, {"retry-after": "3600"})
+
+        model._request = rate_limited
+        started = time.perf_counter()
+        result = await model.classify_image(b"", categories)
+        assert result.status == "transient_error" and model.calls == 1, result
+        assert time.perf_counter() - started < 1
+        print(f"✅ 临时错误重试成功，鉴权错误直接失败，重试耗尽后状态为 {result.status}")
+        return True
+    except Exception as e:
+        print(f"❌ 重试测试失败: {e!r}")
+        return False
+
+
+async def test_router():
+    """测试多厂商路由的故障转移和对冲请求（使用本地桩模型）"""
+    print("\n🔀 测试多厂商路由...")
+    try:
+        class DownModel(_StubModel):
+            async def _request(self, image_data, categories):
+                self.calls += 1
+                raise _FlakyError(401)
+
+        categories = {"cat": ["cat"], "dog": ["dog"]}
+
+        # 主厂商失败时切换到次选厂商，连续失败后熔断并排到最后
+        down, backup = DownModel(delay=0), _StubModel(delay=0)
+        router = RouterModel({}, {"primary": down, "backup": backup})
+        for _ in range(3):
+            result = await router.classify_image(b"", categories)
+            assert result.ok and result.metadata["provider"] == "backup", result
+        assert router.ranked_providers() == ["backup", "primary"]
+        await router.classify_image(b"", categories)
+        assert down.calls == 3 and backup.calls == 4
+
+        # 主厂商很慢时，超过对冲阈值后向次选厂商发送对冲请求，先返回者胜出
+        slow, fast = _StubModel(delay=1.0), _StubModel(delay=0.01)
+        router = RouterModel({"hedge": True, "hedge_min_delay": 0.05}, {"slow": slow, "fast": fast})
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await router.classify_image(b"", categories)
+        elapsed = loop.time() - started
+        assert result.metadata["provider"] == "fast" and elapsed < 0.5, (result, elapsed)
+        # 被取消的慢请求不计入统计
+        assert router.get_stats()["slow"]["requests"] == 0
+
+        # 多图请求整体路由
+        results = await router.classify_images([b"", b""], categories)
+        assert all(r.metadata["provider"] == "fast" for r in results)
+
+        # 对冲请求失败时立即启用下一个厂商，不等下一个对冲阈值
+        slow, down, fast = _StubModel(delay=2.0), DownModel(delay=0), _StubModel(delay=0.01)
+        router = RouterModel({"hedge": True, "hedge_min_delay": 0.2}, {"slow": slow, "down": down, "fast": fast})
+        started = loop.time()
+        result = await router.classify_image(b"", categories)
+        failover_elapsed = loop.time() - started
+        assert result.metadata["provider"] == "fast" and failover_elapsed < 0.35, (result, failover_elapsed)
+
+        # 多图请求只把失败的图片转给下一个厂商
+        class PartialModel(_StubModel):
+            def __init__(self, fail_last: bool):
+                super().__init__(delay=0)
+                self.fail_last = fail_last
+                self.batch_sizes = []
+
+            async def classify_images(self, images, categories):
+                self.batch_sizes.append(len(images))
+                results = await super().classify_images(images, categories)
+                if self.fail_last:
+                    results[-1] = self._error_result(_FlakyError(500))
+                return results
+
+        partial, backup = PartialModel(fail_last=True), PartialModel(fail_last=False)
+        router = RouterModel({}, {"partial": partial, "backup": backup})
+        results = await router.classify_images([b"", b"", b""], categories)
+        assert [r.metadata["provider"] for r in results] == ["partial", "partial", "backup"], results
+        assert all(r.ok for r in results) and partial.batch_sizes == [3] and backup.batch_sizes == [1]
+
+        # 厂商配置变化后路由重新创建，使用新的厂商实例
+        models = config_manager.config.models
+        models["router-provider"] = ModelConfig(type="mock", model="mock-a")
+        router_config = {"type": "router", "router": {"providers": ["router-provider"]}}
+        try:
+            first = ModelFactory.get_model("router-test", router_config)
+            assert ModelFactory.get_model("router-test", router_config) is first
+            models["router-provider"] = ModelConfig(type="mock", model="mock-b")
+            second = ModelFactory.get_model("router-test", router_config)
+            assert second is not first and second.providers["router-provider"].model_name == "mock-b"
+        finally:
+            del models["router-provider"]
+            for name in ("router-provider", "router-test"):
+                ModelFactory._models.pop(name, None)
+                ModelFactory._fingerprints.pop(name, None)
+
+        # 路由配置在模型配置的 router 字段中，不占用厂商模型的配置项
+        assert "providers" not in ModelConfig.model_fields and RouterConfig().hedge_quantile == 0.95
+        print(f"✅ 故障转移到次选厂商，对冲请求用时 {elapsed:.2f}s")
+        return True
+    except Exception as e:
+        print(f"❌ 路由测试失败: {e!r}")
+        return False
+
+
+async def test_adaptive_concurrency():
+    """测试自适应并发在容量受限的厂商上收敛"""
+    print("\n📈 测试自适应并发...")
+    try:
+        capacity = 6
+
+        class LimitedModel(_StubModel):
+            """同时超过 capacity 个请求时返回429的桩厂商"""
+
+            def __init__(self):
+                BaseLLMModel.__init__(self, {
+                    "model": "stub",
+                    "api_key": "",
+                    "retry_base_delay": 0.001,
+                    "adaptive_concurrency": {"enabled": True, "initial_limit": 1, "max_limit": 32}
+                })
+                self.delay = 0.01
+                self.in_flight = self.max_in_flight = self.calls = self.batch_calls = self.rejected = 0
+
+            async def _request(self, image_data, categories):
+                if self.in_flight >= capacity:
+                    self.rejected += 1
+                    raise _FlakyError(429)
+                return await super()._request(image_data, categories)
+
+        model = LimitedModel()
+        pending = iter(range(400))
+
+        async def worker():
+            for _ in pending:
+                await model.classify_image(b"", {"cat": ["cat"]})
+
+        await asyncio.gather(*(worker() for _ in range(32)))
+        stats = model.concurrency_limiter.snapshot()
+
+        assert len(stats["history"]) > 1 and max(point["limit"] for point in stats["history"]) > 1
+        assert model.max_in_flight <= capacity + 1 and stats["limit"] <= 32
+        print(f"✅ 并发上限 1 -> {stats['limit']}（峰值在途 {model.max_in_flight}，429 {model.rejected} 次）")
+        return True
+    except Exception as e:
+        print(f"❌ 自适应并发测试失败: {e!r}")
+        return False
+
+
+async def test_metrics():
+    """测试分阶段耗时和厂商请求指标的导出"""
+    print("\n📊 测试指标导出...")
+    try:
+        class FailingOnceModel(_StubModel):
+            provider_name = "MetricsStub"
+
+            def __init__(self):
+                super().__init__(delay=0)
+                self.retry_policy.base_delay = 0.001
+                self.failed = False
+
+            async def _request(self, image_data, categories):
+                if not self.failed:
+                    self.failed = True
+                    raise _FlakyError(503)
+                return await super()._request(image_data, categories)
+
+        await FailingOnceModel().classify_image(b"", {"cat": ["cat"]})
+        text = registry.render()
+
+        expected = [
+            'image_classifier_stage_seconds_count{stage="provider_call"}',
+            'image_classifier_stage_seconds_count{stage="parse_response"}',
+            'image_classifier_provider_requests_total{provider="metricsstub",outcome="ok"} 1',
+            'image_classifier_provider_requests_total{provider="metricsstub",outcome="server_error"} 1',
+            'image_classifier_provider_retries_total{provider="metricsstub",error_type="server_error"} 1',
+            'image_classifier_provider_requests_in_flight{provider="metricsstub"} 0',
+        ]
+        missing = [line for line in expected if line not in text]
+        assert not missing, missing
+        print(f"✅ 导出 {len(text.splitlines())} 行指标")
+        return True
+    except Exception as e:
+        print(f"❌ 指标测试失败: {e!r}")
+        return False
+
+
+async def test_mock_benchmark():
+    """测试模拟模型和离线压测工具"""
+    print("\n🏁 测试模拟模型压测...")
+    try:
+        model_type = configure_mock_model("mock", latency=0.01, latency_distribution="constant", seed=0)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = generate_corpus(temp_dir, 12, (320, 240))
+            batch_result = await bench_batch_classifier(model_type, temp_dir, concurrency=4)
+            http_result = await bench_http("classify_batch", paths, model_type, concurrency=2, batch_size=4)
+
+        for result in (batch_result, http_result):
+            assert result.images == 12 and result.errors == 0, result
+            assert result.throughput > 0 and result.percentile(0.99) >= result.percentile(0.5) >= 0.01
+        assert http_result.requests == 3
+        print(f"✅ BatchClassifier {batch_result.throughput:.0f} 张/秒，/classify_batch {http_result.throughput:.0f} 张/秒")
+        return True
+    except Exception as e:
+        print(f"❌ 压测工具测试失败: {e!r}")
+        return False
+
+
+async def test_response_parsing():
+    """测试结构化响应解析和关键词兜底"""
+    print("\n🔎 测试响应解析...")
+    try:
+        categories = {"cat": ["cat", "kitten", "猫"], "dog": ["dog", "puppy"], "software": ["software"]}
+        cases = [
+            ("Category: cat\nReason: a kitten on a sofa", "cat", 1.0),
+            ("**Category:** Dog\nConfidence: 85%", "dog", 0.85),
+            ('{"category": "software", "confidence": 0.7}', "software", 0.7),
+            ("分类：猫", "cat", 0.8),
+            ("Category: other", "unknown", 0.0),
+            ("The Category is unclear, maybe a catalog page", "unknown", 0.0),
+            ("A small puppy next to a dog bowl", "dog", 0.5),
+            ('{"category": "cat", "confidence": 0.5}', "cat", 0.5),
+            ('{"category": "cat", "confidence": "0.5%"}', "cat", 0.005),
+            ('{"category": "cat", "confidence": 85}', "cat", 0.85),
+            ('{"category": "cat", "confidence": 850}', "cat", 1.0),
+        ]
+        for response, category, confidence in cases:
+            parsed, parsed_confidence, _ = parse_classification(response, categories)
+            assert (parsed, parsed_confidence) == (category, confidence), (response, parsed, parsed_confidence)
+
+        # 分类配置不变时复用预编译的匹配器
+        assert get_category_matcher(dict(categories)) is get_category_matcher(categories)
+        print(f"✅ {len(cases)} 种响应格式解析正确")
+        return True
+    except Exception as e:
+        print(f"❌ 响应解析测试失败: {e!r}")
+        return False
+
+
+async def test_prompt_caching():
+    """测试提示词按分类配置缓存，且静态部分位于请求最前面"""
+    print("\n🧩 测试提示词缓存...")
+    try:
+        categories = {"cat": ["cat", "kitten"], "dog": ["dog", "puppy"]}
+        image = _make_test_image(1)
+
+        openai_model = OpenAIModel({"api_key": "test", "model": "gpt-4o"})
+        first = await openai_model._build_request(image, categories)
+        second = await openai_model._build_request(_make_test_image(2), dict(categories))
+        assert first["messages"][0] == second["messages"][0] and first["messages"][0]["role"] == "system"
+        # 同一分类配置复用同一个提示词对象
+        assert openai_model._build_system_prompt(categories) is openai_model._build_system_prompt(dict(categories))
+
+        anthropic_model = AnthropicModel({"api_key": "test", "model": "claude-3-5-sonnet-latest"})
+        request = await anthropic_model._build_request(image, categories)
+        assert request["system"][0]["cache_control"] == {"type": "ephemeral"}
+        assert "- cat: cat, kitten" in request["system"][0]["text"]
+
+        # 分类器按配置版本保存分类配置，提示词和匹配器构建一次后随之复用
+        classifier = ImageClassifier("openai")
+        category_keywords, _ = classifier.get_categories()
+        assert classifier.get_categories()[0] is category_keywords
+        prompt = openai_model._build_system_prompt(category_keywords)
+        matcher = get_category_matcher(category_keywords)
+        assert category_keywords.derived == {"system_prompt": prompt, "matcher": matcher}
+        assert get_category_matcher(category_keywords) is matcher
+        print("✅ 静态分类说明作为可缓存前缀，按分类配置复用")
+        return True
+    except Exception as e:
+        print(f"❌ 提示词缓存测试失败: {e!r}")
+        return False
+
+
+class _ColorStubModel(_StubModel):
+    """按图片主色返回分类的桩模型：偏红为cat，偏蓝为dog"""
+
+    supports_multi_image = False
+
+    async def _request(self, image_data, categories):
+        self.calls += 1
+        red, _, blue = Image.open(io.BytesIO(image_data)).convert("RGB").resize((1, 1)).getpixel((0, 0))
+        return f"Category: {'cat' if red > blue else 'dog'}", None
+
+
+def _make_color_image(seed: int, red: bool) -> bytes:
+    """生成带随机噪声的偏红或偏蓝图片"""
+    noise = Image.effect_noise((32, 32), 40 + seed % 20).convert("L")
+    strong, weak = Image.new("L", (32, 32), 200), Image.new("L", (32, 32), 40)
+    channels = (strong, noise, weak) if red else (weak, noise, strong)
+    buffer = io.BytesIO()
+    Image.merge("RGB", channels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def test_local_classifier():
+    """测试本地预分类：用模型结果训练后，置信的图片不再调用模型"""
+    print("\n🏠 测试本地预分类...")
+    model_dir = None
+    try:
+        classifier = ImageClassifier("openai")
+        classifier.model = _ColorStubModel(delay=0)
+        classifier.cache = ResultCache()
+        classifier.dedup_index = None
+        model_dir = tempfile.mkdtemp()
+        model_path = str(Path(model_dir) / "local.npz")
+        classifier.local_classifier = LocalClassifier(model_path=model_path, min_examples=120, retrain_every=1000)
+
+        training = [_make_color_image(seed, red=seed % 2 == 0) for seed in range(120)]
+        await classifier.classify_images_data(training)
+        assert classifier.model.calls == 120, classifier.model.calls
+        # 样本数达到 min_examples 后在后台训练
+        await classifier.local_classifier._training
+        assert classifier.local_classifier.active, classifier.local_classifier.stats()
+
+        fresh = [_make_color_image(seed, red=seed % 2 == 0) for seed in range(1000, 1020)]
+        results = await classifier.classify_images_data(fresh)
+        local = [result for result in results if result.metadata.get("tier") == "local"]
+        assert len(local) >= 15, len(local)
+        assert all(result.category == ("cat" if index % 2 == 0 else "dog") for index, result in enumerate(results))
+        # 只缓存模型结果，本地结果不写入结果缓存
+        assert classifier.cache.stats()["memory_entries"] == 120 + len(fresh) - len(local), classifier.cache.stats()
+
+        # 从文件加载样本时不在构造函数中训练，第一次预测时在后台训练
+        reloaded = LocalClassifier(model_path=model_path, min_examples=120)
+        assert len(reloaded.labels) == 120 and reloaded.head is None
+        assert reloaded.predict(classifier.local_classifier.features[0], ["cat", "dog"]) is None
+        await reloaded._training
+        assert reloaded.active, reloaded.stats()
+        print(f"✅ {len(local)}/{len(fresh)} 张图片由本地预分类直接返回，模型调用 {classifier.model.calls - 120} 次")
+        return True
+    except Exception as e:
+        print(f"❌ 本地预分类测试失败: {e!r}")
+        return False
+    finally:
+        if model_dir is not None:
+            shutil.rmtree(model_dir, ignore_errors=True)
+
+
+async def test_label_index():
+    """测试近邻标签索引：分块top-k与暴力计算一致，可追加和重新打开，相似图片复用多数标签"""
+    print("\n🧭 测试近邻标签索引...")
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # 分块大小不整除行数，覆盖跨块合并
+            index = LabelIndex(str(Path(tmp_dir) / "vectors"), dim=16, top_k=4, chunk_rows=7)
+            vectors = np.random.default_rng(0).normal(size=(50, 16)).astype(np.float32)
+            index.append(vectors[:30], ["a"] * 30)
+            index.append(vectors[30:], ["b"] * 20)
+            scores, ids = index.search(vectors[:3])
+            normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            expected = np.argsort(-(normalized[:3] @ normalized.T), axis=1)[:, :4]
+            assert (ids == expected).all(), (ids, expected)
+
+            # 中断写入留下的半行在重新打开时截掉
+            with open(Path(tmp_dir) / "vectors" / "vectors.f32", "ab") as f:
+                f.write(b"\0" * 10)
+            reopened = LabelIndex(str(Path(tmp_dir) / "vectors"), dim=16, top_k=4, chunk_rows=7)
+            assert len(reopened) == 50 and reopened.categories == ["a", "b"]
+
+            classifier = ImageClassifier("openai")
+            classifier.model = _ColorStubModel(delay=0)
+            classifier.cache = None
+            classifier.dedup_index = None
+            classifier.local_classifier = None
+            classifier.label_index = LabelIndex(str(Path(tmp_dir) / "images"), min_similarity=0.6)
+
+            await classifier.classify_images_data([_make_color_image(seed, red=seed % 2 == 0) for seed in range(20)])
+            assert classifier.model.calls == 20 and len(classifier.label_index) == 20
+
+            results = await classifier.classify_images_data(
+                [_make_color_image(seed, red=seed % 2 == 0) for seed in range(100, 110)]
+            )
+            hits = [result for result in results if result.metadata.get("tier") == "label_index"]
+            assert len(hits) >= 8, len(hits)
+            assert all(result.category == ("cat" if index % 2 == 0 else "dog") for index, result in enumerate(results))
+            # 近邻索引给出的结果不再写回索引
+            assert len(classifier.label_index) == 20 + len(results) - len(hits)
+        print(f"✅ 分块top-k与暴力计算一致，{len(hits)}/{len(results)} 张图片复用近邻多数标签")
+        return True
+    except Exception as e:
+        print(f"❌ 近邻标签索引测试失败: {e!r}")
+        return False
+
+
+async def test_http_pool():
+    """测试厂商SDK共享调优的连接池，模型配置变化后重新创建实例"""
+    print("\n🔌 测试HTTP连接池...")
+    try:
+        pool = {"max_connections": 512, "max_keepalive_connections": 128}
+        openai_model = OpenAIModel({"api_key": "test", "model": "gpt-4o", "http": pool})
+        anthropic_model = AnthropicModel({"api_key": "test", "model": "claude-3-5-sonnet-latest", "http": pool})
+        client = get_http_client(pool)
+        assert openai_model.client._client is client and anthropic_model.client._client is client
+
+        model_config = {"api_key": "test", "model": "gpt-4o", "http": pool}
+        first = ModelFactory.get_model("pool-test", {**model_config, "type": "openai"})
+        assert ModelFactory.get_model("pool-test", {**model_config, "type": "openai"}) is first
+        changed = ModelFactory.get_model("pool-test", {**model_config, "type": "openai", "timeout": 5.0})
+        assert changed is not first and changed.client._client is client
+
+        await close_http_clients()
+        assert client.is_closed and get_http_client(pool) is not client
+        print("✅ OpenAI / Anthropic 共用同一个连接池，配置变化后重新创建模型")
+        return True
+    except Exception as e:
+        print(f"❌ HTTP连接池测试失败: {e!r}")
+        return False
+    finally:
+        ModelFactory._models.pop("pool-test", None)
+        await close_http_clients()
+
+
+class _FakeGeminiClient:
+    """记录请求的Gemini异步客户端"""
+
+    def __init__(self):
+        self.requests = []
+
+    async def generate_content(self, request, timeout=None):
+        import google.ai.generativelanguage as glm
+        self.requests.append(request)
+        return glm.GenerateContentResponse(
+            candidates=[{"content": {"parts": [{"text": "Category: dog"}]}}],
+            usage_metadata={"total_token_count": 42}
+        )
+
+
+async def test_google_model():
+    """测试Gemini适配器按实例创建客户端，并直接发送图片字节"""
+    print("\n🔷 测试Google适配器...")
+    try:
+        try:
+            first = GoogleModel({"api_key": "key-a", "model": "gemini-2.0-flash"})
+            second = GoogleModel({"api_key": "key-b", "model": "gemini-1.5-pro"})
+        except ImportError:
+            print("⚠️  未安装Google SDK，跳过")
+            return True
+
+        # 两个配置各自持有客户端，互不覆盖
+        assert first._get_client() is not second._get_client()
+        assert first._client_options["api_key"] == "key-a" and second._client_options["api_key"] == "key-b"
+
+        fake = _FakeGeminiClient()
+        first._client = fake
+        image = _make_test_image(1, image_format="JPEG")
+        result = await first.classify_image(image, {"cat": ["cat"], "dog": ["dog"]})
+        assert result.category == "dog", result
+
+        request = fake.requests[0]
+        blob = request.contents[0].parts[1].inline_data
+        assert blob.data == image and blob.mime_type == "image/jpeg"
+        assert request.model == "models/gemini-2.0-flash" and "- dog: dog" in request.system_instruction.parts[0].text
+
+        # Gemini不接受的GIF / BMP 重新编码为PNG后发送
+        for image_format in ("GIF", "BMP"):
+            await first.classify_image(_make_test_image(2, image_format=image_format), {"cat": ["cat"], "dog": ["dog"]})
+            blob = fake.requests[-1].contents[0].parts[1].inline_data
+            assert blob.mime_type == "image/png" and blob.data.startswith(b"\x89PNG"), (image_format, blob.mime_type)
+
+        # 预热时创建客户端并登记到关闭流程；事件循环变化后旧客户端被替换并取消登记
+        third = GoogleModel({"api_key": "key-c", "model": "gemini-2.0-flash"})
+        third.warm_up()
+        warmed = third._client
+        assert warmed is not None and id(warmed) in owned_closers
+        finished_loop = asyncio.new_event_loop()
+        finished_loop.close()
+        third._client_loop = finished_loop
+        replaced = third._get_client()
+        assert replaced is not warmed and id(warmed) not in owned_closers and id(replaced) in owned_closers
+        await close_http_clients()
+        assert not owned_closers
+        print("✅ 每个配置独立的客户端，JPEG原样发送，GIF / BMP 转为PNG，客户端随应用关闭")
+        return True
+    except Exception as e:
+        print(f"❌ Google适配器测试失败: {e!r}")
+        return False
+
+
+async def test_image_probe():
+    """测试只读文件头的格式与尺寸识别"""
+    print("\n🔬 测试图片文件头识别...")
+    try:
+        base = Image.effect_mandelbrot((37, 23), (-2.0, -1.5, 1.0, 1.5), 64).convert("RGB")
+        cases = [("JPEG", {}), ("PNG", {}), ("GIF", {}), ("BMP", {}), ("WEBP", {}), ("WEBP", {"lossless": True})]
+        for image_format, options in cases:
+            buffer = io.BytesIO()
+            base.save(buffer, format=image_format, **options)
+            data = buffer.getvalue()
+            info = probe_image(memoryview(data))
+            assert (info.format, info.width, info.height, info.valid) == (image_format, 37, 23, True), (image_format, info)
+            assert info.media_type == f"image/{image_format.lower()}"
+
+        png = _make_test_image(0)
+        assert not probe_image(png[: len(png) // 2]).valid  # 截断的上传
+        assert not probe_image(b"not an image").valid
+
+        # 上传给厂商的MIME类型与实际格式一致
+        request = await OpenAIModel({"api_key": "test", "model": "gpt-4o"})._build_request(png, {"cat": ["cat"]})
+        assert request["messages"][1]["content"][1]["image_url"]["url"].startswith("data:image/png;base64,")
+
+        classifier = ImageClassifier("openai")
+        classifier.model = _StubModel(delay=0)
+        classifier.cache = None
+        classifier.dedup_index = None
+        invalid = await classifier.classify_image_data(png[: len(png) // 2])
+        assert invalid.error_type == "invalid_image", invalid
+        assert probe_image(png[:20]).truncated
+
+        # 文件头无法按规范解析但Pillow可以打开的图片不直接拒绝：IEND之后有附加数据的PNG、段之间有填充的JPEG
+        trailing = png + b"trailing data" * 4
+        assert not probe_image(trailing).valid and not probe_image(trailing).truncated
+        assert (await classifier.classify_image_data(trailing)).status == "ok"
+        buffer = io.BytesIO()
+        base.save(buffer, format="JPEG")
+        jpeg = buffer.getvalue()
+        app0_end = 4 + int.from_bytes(jpeg[4:6], "big")
+        padded = jpeg[:app0_end] + b"\x00\x00" + jpeg[app0_end:]
+        assert not probe_image(padded).valid and not probe_image(padded).truncated
+        assert (await classifier.classify_image_data(padded)).status == "ok"
+        print(f"✅ {len(cases)} 种格式的尺寸识别正确，截断和非图片数据被拒绝，非标准文件头回退到完整校验")
+        return True
+    except Exception as e:
+        print(f"❌ 图片文件头识别测试失败: {e!r}")
+        return False
+
+
 async def main():
     """主测试函数"""
     print("🧪 图片分类器测试")
@@ -58,6 +1130,26 @@ async def main():
     tests = [
         test_config,
         test_classifier,
+        test_batch_classifier,
+        test_streaming_batch,
+        test_result_cache,
+        test_near_duplicate_dedup,
+        test_preprocess,
+        test_job_resume,
+        test_bulk_batch,
+        test_rate_limiter,
+        test_retry,
+        test_router,
+        test_adaptive_concurrency,
+        test_metrics,
+        test_mock_benchmark,
+        test_response_parsing,
+        test_prompt_caching,
+        test_local_classifier,
+        test_label_index,
+        test_http_pool,
+        test_google_model,
+        test_image_probe,
     ]
 
     passed = 0